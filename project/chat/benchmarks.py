@@ -0,0 +1,94 @@
+import asyncio
+import statistics
+import time
+from importlib.util import find_spec
+
+from django.test.utils import override_settings
+
+from . import frames, history
+from .consumers import EventChatConsumer
+
+GROUP_SIZES = (10, 100, 1000, 2000)
+# a room no real event uses
+EVENT_ID = -1
+MESSAGE = {
+    "username": "fanout-benchmark",
+    "message": "Meet at the north entrance at 7, and bring a jacket!",
+    "timestamp": "2026-01-01T19:00:00+00:00",
+}
+
+
+class Recipient(EventChatConsumer):
+    """
+    A consumer in the benchmark room whose frames go nowhere.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.event_id = EVENT_ID
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        pass
+
+
+def backends():
+    """
+    The CHAT_JSON_BACKEND values that can run here.
+    """
+    return ["json", "orjson"] if find_spec("orjson") else ["json"]
+
+
+async def _deliver(recipients, repeat, preserialized):
+    timings = []
+    for message_id in range(1, repeat + 1):
+        started = time.perf_counter()
+        # what the sender puts through group_send, then what every
+        # consumer in the room does with it
+        message = {**MESSAGE, "id": message_id}
+        if preserialized:
+            event = {
+                "type": "chat.message",
+                "id": message_id,
+                "frame": frames.message_frame(message),
+            }
+        else:
+            event = {"type": "chat.message", **message}
+        for recipient in recipients:
+            await recipient.chat_message(event)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def fanout_cost(group_size, repeat=20, preserialized=True):
+    """
+    Median ms to deliver one message to `group_size` consumers in one
+    process: serialized once by the sender, or (`preserialized` False)
+    once per recipient, as chat_message used to.
+    """
+    recipients = [Recipient() for _ in range(group_size)]
+    # a live room's window, which each new message is added to
+    history._rooms[EVENT_ID] = history.RoomHistory()
+    try:
+        return asyncio.run(_deliver(recipients, repeat, preserialized))
+    finally:
+        history._rooms.pop(EVENT_ID, None)
+
+
+def fanout_costs(group_sizes=GROUP_SIZES, repeat=20):
+    """
+    Return, for each group size, the per-message cost in ms of the old
+    per-recipient serialization and of serializing once with each
+    available backend.
+    """
+    results = []
+    for size in group_sizes:
+        with override_settings(CHAT_JSON_BACKEND="json"):
+            row = {
+                "group_size": size,
+                "per_recipient": fanout_cost(size, repeat, False),
+            }
+        for backend in backends():
+            with override_settings(CHAT_JSON_BACKEND=backend):
+                row[backend] = fanout_cost(size, repeat, True)
+        results.append(row)
+    return results
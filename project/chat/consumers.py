@@ -1,12 +1,17 @@
 import json
 import logging
+from urllib.parse import parse_qs
 
 logger = logging.getLogger(__name__)
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.utils import timezone
 
+from . import frames, history
+from .writebehind import WRITE_THROUGH, get_buffer
+
 
 class EventChatConsumer(AsyncWebsocketConsumer):
     """
@@ -41,17 +46,46 @@ class EventChatConsumer(AsyncWebsocketConsumer):
 
         # send recent messages
         try:
-            recent = await self._get_recent_messages(self.event_id, limit=50)
-            await self.send(
-                text_data=json.dumps({"type": "history", "messages": recent})
-            )
+            recent = await history.join(self.event_id)
+            self.in_history = True
+            last_id = self._last_id()
+            if last_id is None:
+                reply = {"type": "history", "messages": recent}
+            else:
+                # a reconnect: just what was missed while away
+                messages, gap = history.since(recent, last_id)
+                reply = {
+                    "type": "history",
+                    "after_id": last_id,
+                    "messages": messages,
+                    "gap": gap,
+                }
+            await self.send(text_data=frames.dumps(reply))
         except Exception:
             logger.exception("Failed to load recent chat messages")
 
+    def _last_id(self):
+        """
+        The id of the last message a reconnecting client saw, from the
+        `last_id` query parameter.
+        """
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            return int(query["last_id"][0])
+        except (KeyError, ValueError):
+            return None
+
     async def disconnect(self, close_code):
         """
         Disconnect from the WebSocket and remove from the group.
         """
+        if getattr(self, "in_history", False):
+            history.leave(self.event_id)
+        # don't leave this user's messages waiting on the timer
+        try:
+            await get_buffer().flush()
+        except Exception:
+            logger.exception("Failed to flush chat messages")
         try:
             await self.channel_layer.group_discard(
                 self.group_name, self.channel_name
@@ -66,6 +100,9 @@ class EventChatConsumer(AsyncWebsocketConsumer):
         if text_data is None:
             return
         data = json.loads(text_data)
+        if data.get("type") == "history":
+            await self._send_history_page(data)
+            return
         message = (data.get("message") or "").strip()
         if not message:
             return
@@ -73,12 +110,18 @@ class EventChatConsumer(AsyncWebsocketConsumer):
         user = self.scope.get("user")
         saved_meta = None
         try:
-            saved_meta = await self._save_message(self.event_id, user, message)
+            if settings.CHAT_WRITE_MODE == WRITE_THROUGH:
+                saved_meta = await self._save_message(
+                    self.event_id, user, message
+                )
+            else:
+                saved_meta = await self._buffer_message(
+                    self.event_id, user, message
+                )
         except Exception:
             logger.exception("Failed to save message")
 
         payload = {
-            "type": "chat.message",
             "message": message,
             "username": (
                 getattr(user, "username", "anon")
@@ -90,25 +133,68 @@ class EventChatConsumer(AsyncWebsocketConsumer):
             payload.update(saved_meta)
         else:
             payload["timestamp"] = timezone.now().isoformat()
+        message = self._serialize(payload)
 
-        await self.channel_layer.group_send(self.group_name, payload)
+        try:
+            await history.record(self.event_id, message)
+        except Exception:
+            logger.exception("Failed to record chat history")
+        # serialized once here rather than by every consumer in the room
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                "type": "chat.message",
+                "id": message["id"],
+                "frame": frames.message_frame(message),
+            },
+        )
 
-    async def chat_message(self, event):
+    async def _send_history_page(self, data):
         """
-        Handle a chat message event.
+        Send a page of messages older than `before_id`.
         """
+        try:
+            before_id = int(data["before_id"])
+            limit = int(data.get("limit") or history.HISTORY_LIMIT)
+        except (KeyError, TypeError, ValueError):
+            return
+        try:
+            messages, has_more = await database_sync_to_async(
+                history.load_page
+            )(self.event_id, before_id, limit)
+        except Exception:
+            logger.exception("Failed to load chat history page")
+            return
         await self.send(
-            text_data=json.dumps(
+            text_data=frames.dumps(
                 {
-                    "type": "message",
-                    "message": event.get("message"),
-                    "username": event.get("username"),
-                    "timestamp": event.get("timestamp"),
-                    "id": event.get("id"),
+                    "type": "history",
+                    "before_id": before_id,
+                    "messages": messages,
+                    "has_more": has_more,
                 }
             )
         )
 
+    async def chat_message(self, event):
+        """
+        Handle a chat message event.
+        """
+        frame = event.get("frame")
+        if frame is None:
+            # sent by a process still on the per-recipient format
+            frame = frames.message_frame(self._serialize(event))
+        history.seen(self.event_id, event.get("id"), frame)
+        await self.send(text_data=frame)
+
+    def _serialize(self, event):
+        return {
+            "username": event.get("username"),
+            "message": event.get("message"),
+            "timestamp": event.get("timestamp"),
+            "id": event.get("id"),
+        }
+
     @database_sync_to_async
     def _user_is_allowed(self, user, event_id):
         """
@@ -155,30 +241,12 @@ class EventChatConsumer(AsyncWebsocketConsumer):
 
         return meta
 
-    @database_sync_to_async
-    def _get_recent_messages(self, event_id, limit=50):
+    async def _buffer_message(self, event_id, user, message_text):
         """
-        Retrieve recent chat messages for the given event.
+        Queue a chat message for a batched write and return metadata
+        about it, assigned up front.
         """
-        from .models import ChatMessage
-
-        qs = ChatMessage.objects.filter(event_id=event_id)
-
-        qs = qs.order_by("-pk")[:limit]
-        out = []
-        for m in reversed(list(qs)):
-            u = getattr(m, "user", "anon")
-            username = getattr(u, "username", str(u))
-            content = m.content
-            val = m.sent_at
-            ts = val.isoformat() if val else None
-
-            out.append(
-                {
-                    "username": username,
-                    "message": content,
-                    "timestamp": ts,
-                    "id": getattr(m, "pk", None),
-                }
-            )
-        return out
+        if not (user and getattr(user, "is_authenticated", False)):
+            return None
+        msg = await get_buffer().add(event_id, user.pk, message_text)
+        return {"id": msg.pk, "timestamp": msg.sent_at.isoformat()}
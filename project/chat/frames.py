@@ -0,0 +1,28 @@
+import json
+from functools import cache
+
+from django.conf import settings
+
+
+@cache
+def _encoder(backend):
+    if backend == "orjson":
+        import orjson
+
+        return lambda data: orjson.dumps(data).decode()
+    return json.dumps
+
+
+def dumps(data):
+    """
+    Serialize an outbound WebSocket frame with the CHAT_JSON_BACKEND
+    encoder.
+    """
+    return _encoder(settings.CHAT_JSON_BACKEND)(data)
+
+
+def message_frame(message):
+    """
+    The frame every client in a room is sent for a chat message.
+    """
+    return dumps({"type": "message", **message})
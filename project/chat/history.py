@@ -0,0 +1,160 @@
+import json
+from collections import deque
+
+from channels.db import database_sync_to_async
+from django.core.cache import cache
+
+# messages sent to a client when it joins a room
+HISTORY_LIMIT = 50
+# most messages a client can ask for in one scrollback page
+HISTORY_PAGE_MAX = 100
+# shared copies outlive quiet spells, not abandoned rooms
+HISTORY_TTL = 60 * 60
+
+# event id -> RoomHistory, for rooms this process has someone in
+_rooms = {}
+
+
+def history_key(event_id):
+    return f"chat:history:{event_id}"
+
+
+def serialize(message_id, username, content, sent_at):
+    return {
+        "username": username,
+        "message": content,
+        "timestamp": sent_at.isoformat() if sent_at else None,
+        "id": message_id,
+    }
+
+
+def load_history(event_id, limit=HISTORY_LIMIT, before_id=None):
+    """
+    Return the room's last `limit` stored messages, oldest first, in one
+    query; with `before_id`, the last ones older than that message.
+    """
+    from .models import ChatMessage
+
+    messages = ChatMessage.objects.filter(event_id=event_id)
+    if before_id is not None:
+        messages = messages.filter(pk__lt=before_id)
+    # a backwards range scan of chatmessage_event_id_idx
+    rows = messages.order_by("-pk").values_list(
+        "pk", "user__username", "content", "sent_at"
+    )[:limit]
+    return [serialize(*row) for row in reversed(rows)]
+
+
+def load_page(event_id, before_id, limit=HISTORY_LIMIT):
+    """
+    Return (messages, has_more) for a scrollback page of up to `limit`
+    (capped at HISTORY_PAGE_MAX) messages before `before_id`.
+    """
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    messages = load_history(event_id, limit + 1, before_id)
+    return messages[-limit:], len(messages) > limit
+
+
+class RoomHistory:
+    """
+    Ring buffer of a room's most recent serialized messages.
+
+    It is only kept while a consumer in this process is in the room: the
+    group delivers every message to that consumer, so the buffer never
+    misses one. Messages are told apart by id, as the sender and every
+    listener in the process report the same message.
+    """
+
+    def __init__(self, messages=()):
+        self.messages = deque(maxlen=HISTORY_LIMIT)
+        self.ids = set()
+        self.listeners = 0
+        for message in messages:
+            self.add(message)
+
+    def add(self, message):
+        if message["id"] in self.ids:
+            return
+        if len(self.messages) == self.messages.maxlen:
+            self.ids.discard(self.messages[0]["id"])
+        self.messages.append(message)
+        self.ids.add(message["id"])
+
+
+async def join(event_id):
+    """
+    Count a listener in the room and return its recent messages, from
+    this process, then the shared cache, then the database.
+
+    Call after joining the room's group, so nothing sent in between is
+    lost.
+    """
+    room = _rooms.get(event_id)
+    if room is None:
+        key = history_key(event_id)
+        messages = await cache.aget(key)
+        if messages is None:
+            messages = await database_sync_to_async(load_history)(event_id)
+            await cache.aadd(key, messages, HISTORY_TTL)
+        # another consumer may have got here while we waited
+        room = _rooms.setdefault(event_id, RoomHistory(messages))
+    room.listeners += 1
+    return list(room.messages)
+
+
+def leave(event_id):
+    """
+    Count a listener out, dropping the room's buffer with the last one.
+    """
+    room = _rooms.get(event_id)
+    if room is None:
+        return
+    room.listeners -= 1
+    if room.listeners <= 0:
+        del _rooms[event_id]
+
+
+def seen(event_id, message_id, frame):
+    """
+    Add a message delivered to a listener in the room, from the frame
+    it was sent in. Only the first listener to see it parses it.
+    """
+    room = _rooms.get(event_id)
+    if room is None or message_id is None or message_id in room.ids:
+        return
+    message = json.loads(frame)
+    del message["type"]
+    room.add(message)
+
+
+async def record(event_id, message):
+    """
+    Add a message sent from this process, and share the updated window
+    with other processes.
+    """
+    room = _rooms.get(event_id)
+    if room is None or message["id"] is None:
+        return
+    room.add(message)
+    await cache.aset(history_key(event_id), list(room.messages), HISTORY_TTL)
+
+
+def since(messages, last_id):
+    """
+    Return (delta, gap): the messages after `last_id` in a room's window
+    and False, or the whole window and True when `last_id` isn't in it,
+    meaning more were missed than the window holds.
+    """
+    # by position, not id: ids from different processes' blocks don't
+    # arrive in order
+    for index, message in enumerate(messages):
+        if message["id"] == last_id:
+            return messages[index + 1 :], False
+    return messages, True
+
+
+def reset():
+    """
+    Drop the in-process buffers.
+    """
+    _rooms.clear()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from chat.benchmarks import GROUP_SIZES, backends, fanout_costs
+
+
+class Command(BaseCommand):
+    help = (
+        "Time delivering one chat message to every consumer in a room, "
+        "per group size: serialized per recipient vs. once by the sender."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=list(GROUP_SIZES)
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        names = backends()
+        self.stdout.write(
+            f"{'group size':>10} {'per recipient':>14} "
+            + " ".join(f"{'once, ' + name:>14}" for name in names)
+            + f" {'us/recipient':>13}"
+        )
+        for row in fanout_costs(options["sizes"], options["repeat"]):
+            best = min(row[name] for name in names)
+            self.stdout.write(
+                f"{row['group_size']:>10} {row['per_recipient']:>11.3f} ms "
+                + " ".join(f"{row[name]:>11.3f} ms" for name in names)
+                + f" {best * 1000 / row['group_size']:>13.2f}"
+            )
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.7 on 2026-10-18 05:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0003_initial"),
+        ("events", "0010_attendee_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chatmessage",
+            index=models.Index(
+                fields=["event", "id"], name="chatmessage_event_id_idx"
+            ),
+        ),
+    ]
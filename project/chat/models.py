@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
@@ -15,12 +16,56 @@ class ChatMessage(models.Model):
         "users.CustomUser", on_delete=models.CASCADE, related_name="messages"
     )
     content = models.TextField()
-    sent_at = models.DateTimeField(auto_now_add=True)
+    # a default rather than auto_now_add, so messages buffered for
+    # writing (see chat.writebehind) keep the time they were sent
+    sent_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["sent_at"]
+        indexes = [
+            # latest messages per room (ORDER BY id DESC scans it
+            # backwards)
+            models.Index(
+                fields=["event", "id"], name="chatmessage_event_id_idx"
+            ),
+        ]
 
     def __str__(self):
         return (
             f"Msg #{self.pk} on event {self.event_id} by user {self.user_id}"
         )
+
+
+class ArchivedChatMessage(models.Model):
+    """
+    A message from an archived event's chat, moved here with the event
+    by the archive_events command.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    event = models.ForeignKey(
+        "events.ArchivedEvent",
+        on_delete=models.CASCADE,
+        related_name="messages",
+    )
+    user = models.ForeignKey(
+        "users.CustomUser",
+        on_delete=models.CASCADE,
+        related_name="archived_messages",
+    )
+    content = models.TextField()
+    sent_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["sent_at"]
+        indexes = [
+            models.Index(
+                fields=["event", "id"], name="archivedmessage_event_id_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"Msg #{self.pk} on archived event {self.event_id} by user "
+            f"{self.user_id}"
+        )
@@ -1,9 +1,37 @@
+import asyncio
+import json
+from unittest import mock, skipUnless
+
+from asgiref.testing import ApplicationCommunicator
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from events.archive import archive_events
 from events.models import Event, EventAttendee
 
+from chat import frames, history
+from chat.benchmarks import fanout_costs
+from chat.models import ChatMessage
+from chat.routing import websocket_urlpatterns
+from chat.writebehind import (
+    MessageBuffer,
+    get_buffer,
+    reserve_ids,
+    write_messages,
+)
+
 
 class ChatTests(TestCase):
     def test_chat_page_requires_login_as_host_or_attendee(self):
@@ -49,3 +77,468 @@ class ChatTests(TestCase):
         )
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+
+class ArchivedChatTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.fan = User.objects.create_user(
+            username="fan", email="fan@example.com", password="pass12345"
+        )
+        self.event = Event.objects.create(
+            host=self.host,
+            title="Old event",
+            description="Desc",
+            start_time=timezone.now() - timezone.timedelta(days=60),
+            end_time=timezone.now() - timezone.timedelta(days=59),
+        )
+        EventAttendee.objects.create(
+            event=self.event, user=self.fan, status="going"
+        )
+        ChatMessage.objects.create(
+            event=self.event, user=self.fan, content="Thanks all"
+        )
+        archive_events(timezone.now())
+
+    def test_transcript_for_participants_only(self):
+        url = reverse("chat:room", kwargs={"event_id": self.event.pk})
+        self.client.force_login(self.fan)
+        response = self.client.get(url)
+        self.assertContains(response, "Thanks all")
+        self.assertContains(response, "read only")
+
+        stranger = get_user_model().objects.create_user(
+            username="stranger", email="s@example.com", password="pass12345"
+        )
+        self.client.force_login(stranger)
+        response = self.client.get(url)
+        self.assertContains(response, "Access Restricted")
+        self.assertNotContains(response, "Thanks all")
+
+    def test_index_lists_past_chats_when_asked(self):
+        self.client.force_login(self.host)
+        response = self.client.get(reverse("chat:index"))
+        self.assertNotContains(response, "Old event")
+        response = self.client.get(reverse("chat:index"), {"past": "1"})
+        self.assertContains(response, "Old event")
+
+
+class ChatSocket:
+    """
+    Drive the chat consumer over its ASGI interface as `user`.
+    """
+
+    def __init__(self, user, event_id, query_string=b""):
+        self.communicator = ApplicationCommunicator(
+            URLRouter(websocket_urlpatterns),
+            {
+                "type": "websocket",
+                "path": f"/ws/chat/event/{event_id}/",
+                "headers": [],
+                "query_string": query_string,
+                "subprotocols": [],
+                "user": user,
+            },
+        )
+
+    async def connect(self):
+        await self.communicator.send_input({"type": "websocket.connect"})
+        return await self.communicator.receive_output(timeout=5)
+
+    async def send(self, data):
+        await self.communicator.send_input(
+            {"type": "websocket.receive", "text": json.dumps(data)}
+        )
+
+    async def receive(self):
+        output = await self.communicator.receive_output(timeout=5)
+        return json.loads(output["text"])
+
+    async def disconnect(self):
+        await self.communicator.send_input(
+            {"type": "websocket.disconnect", "code": 1000}
+        )
+        await self.communicator.wait(timeout=5)
+
+
+@override_settings(
+    CHANNEL_LAYERS={
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+)
+class WriteBehindTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        history.reset()
+        self.host = get_user_model().objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.event = Event.objects.create(
+            host=self.host,
+            title="Busy event",
+            description="Desc",
+            start_time=timezone.now() + timezone.timedelta(days=1),
+            end_time=timezone.now() + timezone.timedelta(days=2),
+        )
+
+    async def chat(self, text):
+        socket = ChatSocket(self.host, self.event.pk)
+        self.assertEqual((await socket.connect())["type"], "websocket.accept")
+        self.assertEqual((await socket.receive())["type"], "history")
+        await socket.send({"message": text})
+        return socket, await socket.receive()
+
+    async def count(self):
+        return await database_sync_to_async(ChatMessage.objects.count)()
+
+    async def test_broadcasts_before_writing(self):
+        socket, sent = await self.chat("Hello")
+        self.assertEqual(sent["message"], "Hello")
+        self.assertEqual(await self.count(), 0)
+
+        # disconnecting writes out what's buffered
+        await socket.disconnect()
+        stored = await database_sync_to_async(ChatMessage.objects.get)()
+        self.assertEqual(stored.pk, sent["id"])
+        self.assertEqual(stored.sent_at.isoformat(), sent["timestamp"])
+        self.assertEqual(len(get_buffer()), 0)
+
+    @override_settings(CHAT_WRITE_MODE="write-through")
+    async def test_write_through_stores_before_broadcast(self):
+        socket, _ = await self.chat("Hello")
+        self.assertEqual(await self.count(), 1)
+        await socket.disconnect()
+
+    async def test_flushes_on_size_and_time(self):
+        buffer = MessageBuffer(flush_size=3, flush_interval=0.05)
+        for i in range(3):
+            await buffer.add(self.event.pk, self.host.pk, f"Message {i}")
+        self.assertEqual(await self.count(), 3)
+
+        await buffer.add(self.event.pk, self.host.pk, "Later")
+        self.assertEqual(await self.count(), 3)
+        await asyncio.sleep(0.2)
+        self.assertEqual(await self.count(), 4)
+
+    async def test_quiet_buffers_do_not_hand_out_old_ids(self):
+        quiet, busy = MessageBuffer(), MessageBuffer()
+        await quiet.add(self.event.pk, self.host.pk, "First")
+        for i in range(100):
+            last = await busy.add(self.event.pk, self.host.pk, f"Busy {i}")
+        with mock.patch("chat.writebehind.ID_MAX_AGE", 0):
+            latest = await quiet.add(self.event.pk, self.host.pk, "Latest")
+        self.assertGreater(latest.pk, last.pk)
+        await quiet.flush()
+        await busy.flush()
+
+    def test_reserved_ids_are_not_reused(self):
+        ids = reserve_ids(5)
+        self.assertEqual(len(set(ids)), 5)
+        message = ChatMessage.objects.create(
+            event=self.event, user=self.host, content="Created"
+        )
+        self.assertGreater(message.pk, max(ids))
+
+    def test_bad_rows_do_not_sink_the_batch(self):
+        first, second = reserve_ids(2)
+        write_messages(
+            [
+                ChatMessage(
+                    id=first, event=self.event, user=self.host, content="Ok"
+                ),
+                ChatMessage(
+                    id=second, event_id=0, user=self.host, content="Orphan"
+                ),
+            ]
+        )
+        self.assertEqual(
+            list(ChatMessage.objects.values_list("pk", flat=True)), [first]
+        )
+
+
+@override_settings(
+    CHANNEL_LAYERS={
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+)
+class HistoryTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        history.reset()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.guest = User.objects.create_user(
+            username="guest", email="guest@example.com", password="pass12345"
+        )
+        self.event = Event.objects.create(
+            host=self.host,
+            title="Busy event",
+            description="Desc",
+            start_time=timezone.now() + timezone.timedelta(days=1),
+            end_time=timezone.now() + timezone.timedelta(days=2),
+        )
+        EventAttendee.objects.create(
+            event=self.event, user=self.guest, status="going"
+        )
+
+    async def join(self, user, query_string=b""):
+        socket = ChatSocket(user, self.event.pk, query_string)
+        await socket.connect()
+        return socket, (await socket.receive())["messages"]
+
+    def test_history_loads_in_one_query(self):
+        for i in range(60):
+            ChatMessage.objects.create(
+                event=self.event,
+                user=(self.host, self.guest)[i % 2],
+                content=f"Message {i}",
+            )
+        with self.assertNumQueries(1):
+            messages = history.load_history(self.event.pk)
+        self.assertEqual(len(messages), history.HISTORY_LIMIT)
+        self.assertEqual(messages[-1]["message"], "Message 59")
+        self.assertEqual(messages[-1]["username"], "guest")
+
+    async def test_joiners_see_messages_before_they_are_stored(self):
+        host, messages = await self.join(self.host)
+        self.assertEqual(messages, [])
+        await host.send({"message": "Hello"})
+        sent = await host.receive()
+
+        # still buffered for writing, but in the room's window
+        guest, messages = await self.join(self.guest)
+        self.assertEqual(
+            [(m["id"], m["message"]) for m in messages],
+            [(sent["id"], "Hello")],
+        )
+        # and shared with other processes
+        shared = await cache.aget(history.history_key(self.event.pk))
+        self.assertEqual([m["id"] for m in shared], [sent["id"]])
+
+        await guest.disconnect()
+        await host.disconnect()
+        self.assertNotIn(self.event.pk, history._rooms)
+
+    async def test_window_is_bounded(self):
+        host, _ = await self.join(self.host)
+        for i in range(history.HISTORY_LIMIT + 5):
+            await host.send({"message": f"Message {i}"})
+            await host.receive()
+        _, messages = await self.join(self.guest)
+        self.assertEqual(len(messages), history.HISTORY_LIMIT)
+        self.assertEqual(messages[0]["message"], "Message 5")
+        self.assertEqual(
+            len({m["id"] for m in messages}), history.HISTORY_LIMIT
+        )
+        await host.disconnect()
+
+    async def test_reconnect_gets_only_what_was_missed(self):
+        host, _ = await self.join(self.host)
+        guest, _ = await self.join(self.guest)
+        sent = []
+        for text in ("One", "Two", "Three"):
+            await host.send({"message": text})
+            sent.append(await host.receive())
+            await guest.receive()
+        await guest.disconnect()
+
+        guest, messages = await self.join(
+            self.guest, f"last_id={sent[0]['id']}".encode()
+        )
+        self.assertEqual([m["message"] for m in messages], ["Two", "Three"])
+
+        # caught up: nothing to send
+        await guest.disconnect()
+        guest = ChatSocket(
+            self.guest, self.event.pk, f"last_id={sent[2]['id']}".encode()
+        )
+        await guest.connect()
+        reply = await guest.receive()
+        self.assertEqual(reply["after_id"], sent[2]["id"])
+        self.assertEqual(reply["messages"], [])
+        self.assertFalse(reply["gap"])
+        await guest.disconnect()
+        await host.disconnect()
+
+    async def test_reconnect_after_too_long_is_a_gap(self):
+        host, _ = await self.join(self.host)
+        await host.send({"message": "First"})
+        first = await host.receive()
+        for i in range(history.HISTORY_LIMIT):
+            await host.send({"message": f"Message {i}"})
+            await host.receive()
+
+        guest = ChatSocket(
+            self.guest, self.event.pk, f"last_id={first['id']}".encode()
+        )
+        await guest.connect()
+        reply = await guest.receive()
+        self.assertTrue(reply["gap"])
+        self.assertEqual(len(reply["messages"]), history.HISTORY_LIMIT)
+        self.assertEqual(reply["messages"][0]["message"], "Message 0")
+        await guest.disconnect()
+        await host.disconnect()
+
+    async def test_scrolls_back_in_pages(self):
+        await database_sync_to_async(ChatMessage.objects.bulk_create)(
+            ChatMessage(event=self.event, user=self.guest, content=f"M{i}")
+            for i in range(120)
+        )
+        host, messages = await self.join(self.host)
+        self.assertEqual(messages[0]["message"], "M70")
+
+        await host.send(
+            {"type": "history", "before_id": messages[0]["id"], "limit": 30}
+        )
+        page = await host.receive()
+        self.assertEqual(page["type"], "history")
+        self.assertEqual(page["before_id"], messages[0]["id"])
+        self.assertEqual(
+            [m["message"] for m in page["messages"]],
+            [f"M{i}" for i in range(40, 70)],
+        )
+        self.assertTrue(page["has_more"])
+
+        # the limit is capped, and the last page says it's the last
+        await host.send(
+            {
+                "type": "history",
+                "before_id": page["messages"][0]["id"],
+                "limit": 10_000,
+            }
+        )
+        page = await host.receive()
+        self.assertEqual(len(page["messages"]), 40)
+        self.assertFalse(page["has_more"])
+        await host.disconnect()
+
+    def test_pages_are_capped_and_take_one_query(self):
+        ChatMessage.objects.bulk_create(
+            ChatMessage(event=self.event, user=self.guest, content=f"M{i}")
+            for i in range(150)
+        )
+        last = ChatMessage.objects.latest("pk")
+        with self.assertNumQueries(1):
+            messages, has_more = history.load_page(
+                self.event.pk, last.pk, 10_000
+            )
+        self.assertEqual(len(messages), history.HISTORY_PAGE_MAX)
+        self.assertTrue(has_more)
+        self.assertLess(messages[-1]["id"], last.pk)
+
+    async def test_broadcast_is_serialized_once(self):
+        host, _ = await self.join(self.host)
+        guest, _ = await self.join(self.guest)
+        with mock.patch(
+            "chat.frames.message_frame", wraps=frames.message_frame
+        ) as message_frame:
+            await host.send({"message": "Hello"})
+            received = [await host.receive(), await guest.receive()]
+        self.assertEqual(message_frame.call_count, 1)
+        self.assertEqual(received[0], received[1])
+        self.assertEqual(received[0]["message"], "Hello")
+        # the window is filled from the frame
+        _, messages = await self.join(self.guest)
+        self.assertEqual(messages[-1]["id"], received[0]["id"])
+        self.assertNotIn("type", messages[-1])
+        await guest.disconnect()
+        await host.disconnect()
+
+    async def test_per_recipient_events_are_still_delivered(self):
+        guest, _ = await self.join(self.guest)
+        await get_channel_layer().group_send(
+            f"event_chat_{self.event.pk}",
+            {
+                "type": "chat.message",
+                "message": "Old format",
+                "username": "host",
+                "timestamp": None,
+                "id": 1,
+            },
+        )
+        received = await guest.receive()
+        self.assertEqual(received["type"], "message")
+        self.assertEqual(received["message"], "Old format")
+        await guest.disconnect()
+
+    async def test_falls_back_to_the_database(self):
+        await database_sync_to_async(ChatMessage.objects.create)(
+            event=self.event, user=self.guest, content="Stored"
+        )
+        _, messages = await self.join(self.host)
+        self.assertEqual([m["message"] for m in messages], ["Stored"])
+
+
+class FanoutBenchmarkTests(SimpleTestCase):
+    def test_measures_each_group_size_and_backend(self):
+        results = fanout_costs([1, 5], repeat=2)
+        self.assertEqual([row["group_size"] for row in results], [1, 5])
+        for row in results:
+            self.assertGreater(row["per_recipient"], 0)
+            self.assertGreater(row["json"], 0)
+
+    def test_backends_agree(self):
+        frame = {"type": "message", "message": "Caf\u00e9 \u2615", "id": 7}
+        with override_settings(CHAT_JSON_BACKEND="orjson"):
+            self.assertEqual(json.loads(frames.dumps(frame)), frame)
+
+
+@skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+class ChatIndexPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        start = timezone.now() + timezone.timedelta(days=1)
+        cls.events = Event.objects.bulk_create(
+            Event(
+                host=cls.user,
+                title=f"Event {i}",
+                description="Desc",
+                start_time=start,
+                end_time=start + timezone.timedelta(days=1),
+            )
+            for i in range(50)
+        )
+        # interleaved, as rooms are busy at the same time
+        ChatMessage.objects.bulk_create(
+            ChatMessage(event=event, user=cls.user, content=f"Message {i}")
+            for i in range(100)
+            for event in cls.events
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE chat_chatmessage")
+
+    def test_recent_messages_use_event_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(
+                ChatMessage.objects.filter(event=self.events[7]).order_by(
+                    "-pk"
+                )[:50]
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {queries[-1]['sql']}")
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertIn("chatmessage_event_id_idx", plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_scrollback_pages_use_event_index(self):
+        before_id = (
+            ChatMessage.objects.filter(event=self.events[7])
+            .order_by("-pk")[60]
+            .pk
+        )
+        with CaptureQueriesContext(connection) as queries:
+            history.load_page(self.events[7].pk, before_id, 50)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {queries[-1]['sql']}")
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertIn("chatmessage_event_id_idx", plan)
+        self.assertNotIn("Sort", plan)
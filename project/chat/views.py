@@ -1,7 +1,8 @@
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
 from django.shortcuts import get_object_or_404, render
-from events.models import Event, EventAttendee
+from events.archive import PAST_EVENTS_LIMIT, archived_events_for
+from events.models import ArchivedEvent, Event, EventAttendee
 
 
 def index(request):
@@ -10,10 +11,15 @@ def index(request):
     Displays a list of events the user is hosting or attending.
     """
     user = request.user if request.user.is_authenticated else None
+    # archived events' transcripts only when asked for
+    show_past = request.GET.get("past") == "1"
+    past_events = None
 
     if not user:
         events = Event.objects.none()
     else:
+        if show_past:
+            past_events = archived_events_for(user)[:PAST_EVENTS_LIMIT]
         events = (
             Event.objects.filter(
                 Q(host=user)
@@ -24,7 +30,11 @@ def index(request):
             .order_by("start_time")
         )
 
-    return render(request, "chat/home.html", {"events": events})
+    return render(
+        request,
+        "chat/home.html",
+        {"events": events, "show_past": show_past, "past_events": past_events},
+    )
 
 
 @login_required
@@ -33,9 +43,13 @@ def chat_room(request, event_id):
     View for the chat room of a specific event.
     Only accessible to the event host or attendees with 'going' status.
     """
-    event = get_object_or_404(
-        Event.objects.select_related("host", "location"), pk=event_id
+    event = (
+        Event.objects.select_related("host", "location")
+        .filter(pk=event_id)
+        .first()
     )
+    if event is None:
+        return archived_chat_room(request, event_id)
 
     is_host = request.user.pk == event.host_id
     is_attendee_going = EventAttendee.objects.filter(
@@ -46,3 +60,29 @@ def chat_room(request, event_id):
         return render(request, "chat/forbidden.html", {"event": event})
 
     return render(request, "chat/room.html", {"event": event})
+
+
+def archived_chat_room(request, event_id):
+    """
+    Read-only transcript of an archived event's chat, for the same
+    people who could use the room.
+    """
+    event = get_object_or_404(
+        ArchivedEvent.objects.select_related("host", "location").defer(
+            "search_vector"
+        ),
+        pk=event_id,
+    )
+    took_part = (
+        request.user.pk == event.host_id
+        or event.attendees.filter(user=request.user, status="going").exists()
+    )
+    if not took_part:
+        return render(request, "chat/forbidden.html", {"event": event})
+
+    chat_messages = event.messages.select_related("user").order_by("id")
+    return render(
+        request,
+        "chat/archived_room.html",
+        {"event": event, "chat_messages": chat_messages},
+    )
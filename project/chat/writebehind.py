@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+
+from channels.db import database_sync_to_async
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# ChatMessage is imported where used: this module is loaded by the ASGI
+# entry point before Django is set up
+
+WRITE_BEHIND = "write-behind"
+WRITE_THROUGH = "write-through"
+
+# flush once this many messages are waiting, or this long after the
+# first one arrived, whichever comes first
+FLUSH_SIZE = 50
+FLUSH_INTERVAL = 0.5
+# ids reserved from the database per round trip
+ID_BLOCK_SIZE = 32
+# unused ids older than this are thrown away, so every id is reserved
+# close to when its message is sent and ids from different processes
+# stay in the order the messages were sent (to within about this long)
+ID_MAX_AGE = FLUSH_INTERVAL
+# if the database stays down, stop holding messages past this many
+MAX_PENDING = 10_000
+
+
+def reserve_ids(count):
+    """
+    Reserve `count` ChatMessage ids from the table's id sequence without
+    inserting rows, so messages can be given their id before they are
+    written.
+    """
+    from .models import ChatMessage
+
+    table = ChatMessage._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                "FROM generate_series(1, %s)",
+                [table, count],
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+        # SQLite AUTOINCREMENT keeps its high-water mark in
+        # sqlite_sequence, which may not have a row for the table yet
+        with transaction.atomic():
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) "
+                "SELECT %s, 0 WHERE NOT EXISTS "
+                "(SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                [table, table],
+            )
+            cursor.execute(
+                "UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s "
+                "RETURNING seq",
+                [count, table],
+            )
+            last = cursor.fetchone()[0]
+        return list(range(last - count + 1, last + 1))
+
+
+def write_messages(messages):
+    """
+    Insert a batch of messages that already have their ids. If the batch
+    is rejected (e.g. an event was deleted meanwhile), the rows are
+    inserted one by one and only the offending ones are dropped.
+    """
+    from .models import ChatMessage
+
+    try:
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create(messages)
+        return
+    except IntegrityError:
+        pass
+    for message in messages:
+        try:
+            with transaction.atomic():
+                message.save(force_insert=True)
+        except IntegrityError:
+            logger.warning("Dropped chat message %s", message.pk)
+
+
+class MessageBuffer:
+    """
+    Per-process write-behind buffer for chat messages.
+
+    add() gives a message its id and timestamp straight away, so it can
+    be broadcast at once; the messages are then written together with
+    bulk_create() when FLUSH_SIZE are waiting, FLUSH_INTERVAL after the
+    first, or when flush() is called.
+    """
+
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._ids = deque()
+        self._ids_reserved_at = 0.0
+        self._id_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def _next_id(self):
+        async with self._id_lock:
+            if time.monotonic() - self._ids_reserved_at > ID_MAX_AGE:
+                self._ids.clear()
+            if not self._ids:
+                self._ids.extend(
+                    await database_sync_to_async(reserve_ids)(ID_BLOCK_SIZE)
+                )
+                self._ids_reserved_at = time.monotonic()
+            return self._ids.popleft()
+
+    async def add(self, event_id, user_id, content):
+        """
+        Queue a message for writing and return it, unsaved but with its
+        id and sent_at set.
+        """
+        from .models import ChatMessage
+
+        message = ChatMessage(
+            id=await self._next_id(),
+            event_id=event_id,
+            user_id=user_id,
+            content=content,
+            sent_at=timezone.now(),
+        )
+        self._pending.append(message)
+        if len(self._pending) >= self.flush_size:
+            await self.flush()
+        else:
+            self._schedule_flush()
+        return message
+
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.flush_interval,
+                lambda: asyncio.ensure_future(self.flush()),
+            )
+
+    async def flush(self):
+        """
+        Write every queued message. On a database error they stay queued
+        for the next flush.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                await database_sync_to_async(write_messages)(batch)
+            except Exception:
+                logger.exception(
+                    "Failed to write %d chat messages", len(batch)
+                )
+                pending = batch + self._pending
+                if len(pending) > MAX_PENDING:
+                    logger.error(
+                        "Dropped %d unwritten chat messages",
+                        len(pending) - MAX_PENDING,
+                    )
+                self._pending = pending[-MAX_PENDING:]
+                self._schedule_flush()
+
+
+_buffers = weakref.WeakKeyDictionary()
+
+
+def get_buffer():
+    """
+    Return the buffer for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    buffer = _buffers.get(loop)
+    if buffer is None:
+        buffer = _buffers[loop] = MessageBuffer()
+    return buffer
+
+
+async def flush_all():
+    for buffer in list(_buffers.values()):
+        await buffer.flush()
+
+
+async def lifespan(scope, receive, send):
+    """
+    ASGI lifespan handler that writes out buffered messages when the
+    server shuts down.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await flush_all()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
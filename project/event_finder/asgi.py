@@ -12,6 +12,7 @@ import os
 import chat.routing
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
+from chat.writebehind import lifespan
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "event_finder.settings")
@@ -20,6 +21,8 @@ django_asgi_app = get_asgi_application()
 application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
+        # writes out buffered chat messages on shutdown
+        "lifespan": lifespan,
         "websocket": AuthMiddlewareStack(
             URLRouter(chat.routing.websocket_urlpatterns)
         ),
@@ -74,6 +74,28 @@ CHANNEL_LAYERS = {
     }
 }
 
+# "write-behind" broadcasts chat messages at once and stores them in
+# batches shortly after; "write-through" stores each message before it
+# is broadcast, for deployments that can't lose one on a crash
+CHAT_WRITE_MODE = os.environ.get("CHAT_WRITE_MODE", "write-behind")
+if CHAT_WRITE_MODE not in ("write-behind", "write-through"):
+    raise ImproperlyConfigured(
+        "CHAT_WRITE_MODE must be 'write-behind' or 'write-through'."
+    )
+
+# encoder for outbound chat frames: "json" (the standard library) or
+# "orjson" (several times faster)
+CHAT_JSON_BACKEND = os.environ.get("CHAT_JSON_BACKEND", "json")
+if CHAT_JSON_BACKEND not in ("json", "orjson"):
+    raise ImproperlyConfigured("CHAT_JSON_BACKEND must be 'json' or 'orjson'.")
+if CHAT_JSON_BACKEND == "orjson":
+    try:
+        import orjson  # noqa: F401
+    except ImportError as exc:
+        raise ImproperlyConfigured(
+            "CHAT_JSON_BACKEND is 'orjson' but orjson can't be imported."
+        ) from exc
+
 AUTH_USER_MODEL = "users.CustomUser"
 
 # Application definition
@@ -86,6 +108,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "events",
     "users",
     "chat",
@@ -141,6 +164,20 @@ else:
         "PORT": os.environ.get("POSTGRES_PORT", "5432"),
     }
 
+# shared cache (event list results etc.); falls back to per-process
+# memory when no Redis is configured
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "KEY_PREFIX": "event_finder",
+    }
+}
+if os.environ.get("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+        "KEY_PREFIX": "event_finder",
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
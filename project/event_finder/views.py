@@ -2,7 +2,8 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render
 from django.utils.timezone import now
-from events.models import Event
+from events.archive import PAST_EVENTS_LIMIT, archived_events_for
+from events.models import Event, Recommendation
 
 
 def home(request):
@@ -32,10 +33,30 @@ def dashboard(request):
             request,
             "You haven't joined any events yet. Explore and join some!",
         )
+    # precomputed by the compute_recommendations command; past events
+    # drop out until the next run replaces them
+    recommended = (
+        Recommendation.objects.filter(
+            user=request.user, event__start_time__gte=now()
+        )
+        .select_related("event")
+        .order_by("rank")
+    )
+    # archived events only when asked for
+    show_past = request.GET.get("past") == "1"
+    past_events = None
+    if show_past:
+        past_events = archived_events_for(request.user)[:PAST_EVENTS_LIMIT]
     return render(
         request,
         "event_finder/dashboard.html",
-        {"joined_events": joined_events, "hosted_events": hosted_events},
+        {
+            "joined_events": joined_events,
+            "hosted_events": hosted_events,
+            "recommended": recommended,
+            "show_past": show_past,
+            "past_events": past_events,
+        },
     )
 
 
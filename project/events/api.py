@@ -0,0 +1,150 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, StringAgg, Subquery, Value
+
+from .cache import current_generation
+from .models import EventCategory
+
+# fields= name -> column (or annotation) it selects
+API_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "description": "description",
+    "start_time": "start_time",
+    "end_time": "end_time",
+    "capacity": "capacity",
+    "going_count": "going_count",
+    "waitlist_count": "waitlist_count",
+    "updated_at": "updated_at",
+    "host": "host__username",
+    "address": "location__formatted_address",
+    "city": "location__city",
+    "country": "location__country",
+    "lat": "location__lat",
+    "lng": "location__long",
+    "categories": "category_names",
+    "distance_km": "distance_km",
+}
+DEFAULT_API_FIELDS = (
+    "id",
+    "title",
+    "start_time",
+    "end_time",
+    "address",
+    "lat",
+    "lng",
+    "going_count",
+)
+# counters are updated in place, without touching updated_at
+COUNTER_FIELDS = {"going_count", "waitlist_count"}
+CATEGORY_SEPARATOR = "\x1f"
+
+DEFAULT_API_LIMIT = 1000
+MAX_API_LIMIT = 10_000
+
+
+def parse_fields(params, near=False):
+    """
+    Return the requested API field names, in order. Raises ValueError
+    for unknown fields.
+    """
+    requested = params.get("fields", "")
+    if not requested:
+        return list(DEFAULT_API_FIELDS)
+    fields = list(dict.fromkeys(f.strip() for f in requested.split(",")))
+    unknown = [
+        f
+        for f in fields
+        if f not in API_FIELDS or (f == "distance_km" and not near)
+    ]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit(params):
+    """
+    Return the `limit` parameter clamped to [1, MAX_API_LIMIT]. Raises
+    ValueError if it isn't a number.
+    """
+    limit = int(params.get("limit") or DEFAULT_API_LIMIT)
+    return min(max(limit, 1), MAX_API_LIMIT)
+
+
+def project(events, fields):
+    """
+    Select only the columns behind `fields` from the events queryset.
+    """
+    if "categories" in fields:
+        events = events.annotate(
+            category_names=Subquery(
+                EventCategory.objects.filter(event=OuterRef("pk"))
+                .order_by()
+                .values("event")
+                .annotate(
+                    names=StringAgg("cat__name", Value(CATEGORY_SEPARATOR))
+                )
+                .values("names")
+            )
+        )
+    return events.values(*(API_FIELDS[f] for f in fields))
+
+
+def results_etag(events, fields, key, limit):
+    """
+    Return the ETag for the first `limit` filtered events, from one
+    narrow query over their ids, update times and (if shown) counters.
+    `key` identifies the request (filters, fields, limit) so different
+    requests never share an ETag.
+    """
+    # per row, as offsetting counter moves (one event losing an
+    # attendee, another gaining one) leave any aggregate unchanged
+    counters = sorted(COUNTER_FIELDS & set(fields))
+    rows = events.values_list("pk", "updated_at", *counters)[:limit]
+    # the generation moves on location/category edits, which the rows
+    # don't show
+    digest = hashlib.sha256(
+        json.dumps(
+            [key, current_generation()], cls=DjangoJSONEncoder, sort_keys=True
+        ).encode()
+    )
+    for pk, updated_at, *counts in rows.iterator(chunk_size=2000):
+        digest.update(f"{pk}:{updated_at.isoformat()}:{counts}\n".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def encode_event(encoder, row, fields):
+    item = {field: row[API_FIELDS[field]] for field in fields}
+    if "categories" in item:
+        names = item["categories"]
+        item["categories"] = names.split(CATEGORY_SEPARATOR) if names else []
+    return encoder.encode(item)
+
+
+def stream_events(rows, fields):
+    """
+    Yield the JSON document for `rows` (from project()) in chunks, so
+    large responses are never held in memory at once.
+    """
+    encoder = DjangoJSONEncoder()
+    yield '{"events": ['
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + encode_event(encoder, row, fields)
+    yield "]}"
+
+
+async def astream_events(rows, fields):
+    """
+    stream_events() for ASGI, where a sync iterator would be read to the
+    end before the first chunk is sent. `rows` is an async iterator,
+    e.g. from QuerySet.aiterator().
+    """
+    encoder = DjangoJSONEncoder()
+    yield '{"events": ['
+    i = 0
+    async for row in rows:
+        yield ("," if i else "") + encode_event(encoder, row, fields)
+        i += 1
+    yield "]}"
@@ -0,0 +1,114 @@
+from itertools import batched
+
+from chat.models import ArchivedChatMessage, ChatMessage
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import (
+    ArchivedEvent,
+    ArchivedEventAttendee,
+    ArchivedEventCategory,
+    Event,
+    EventAttendee,
+    EventCategory,
+    Recommendation,
+)
+
+# events that ended more than this many days ago are archived
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500
+# rows copied per INSERT, and the most held in memory at once
+COPY_CHUNK_SIZE = 1000
+PAST_EVENTS_LIMIT = 20
+
+# live model -> (archive model, fields copied across)
+ARCHIVED_MODELS = [
+    (
+        Event,
+        ArchivedEvent,
+        [
+            field.attname
+            for field in ArchivedEvent._meta.concrete_fields
+            if field.name != "archived_at"
+        ],
+    ),
+    (EventCategory, ArchivedEventCategory, ["cat_id", "event_id"]),
+    (
+        EventAttendee,
+        ArchivedEventAttendee,
+        ["event_id", "user_id", "joined_at", "status"],
+    ),
+    (
+        ChatMessage,
+        ArchivedChatMessage,
+        ["id", "event_id", "user_id", "content", "sent_at"],
+    ),
+]
+
+
+def archive_batch(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move up to `batch_size` events that ended before `before`, with their
+    categories, attendees and chat messages, into the archive tables.
+    Returns the number of events moved.
+
+    The copy and the delete share one transaction, so an event is always
+    in exactly one of the two places.
+    """
+    with transaction.atomic():
+        # skip rows someone is editing; the next run picks them up
+        ids = list(
+            Event.objects.filter(end_time__lt=before)
+            .order_by("pk")
+            .select_for_update(skip_locked=True)
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        for model, archive_model, fields in ARCHIVED_MODELS:
+            lookup = "pk__in" if model is Event else "event__in"
+            rows = model.objects.filter(**{lookup: ids}).values(*fields)
+            for chunk in batched(
+                rows.iterator(COPY_CHUNK_SIZE), COPY_CHUNK_SIZE
+            ):
+                archive_model.objects.bulk_create(
+                    archive_model(**row) for row in chunk
+                )
+        # children first, so the events' cascade has no rows to load.
+        # Attendees skip their delete receiver (the counters it moves go
+        # with the event); messages and recommendations have none, so
+        # each goes in one query; categories are few, and keep theirs
+        # to refresh category suggestions
+        EventAttendee.objects.filter(event__in=ids)._raw_delete(
+            EventAttendee.objects.db
+        )
+        for model in (ChatMessage, Recommendation, EventCategory):
+            model.objects.filter(event__in=ids).delete()
+        Event.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_events(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archive every event that ended before `before`, a batch at a time.
+    Returns the number of events moved.
+    """
+    total = 0
+    while moved := archive_batch(before, batch_size):
+        total += moved
+    return total
+
+
+def archived_events_for(user):
+    """
+    Archived events the user hosted or went to, most recent first.
+    """
+    went = ArchivedEventAttendee.objects.filter(
+        event=OuterRef("pk"), user=user, status="going"
+    )
+    return (
+        ArchivedEvent.objects.filter(Q(host=user) | Exists(went))
+        .select_related("host", "location")
+        .defer("search_vector")
+        .order_by("-start_time", "-id")
+    )
@@ -0,0 +1,293 @@
+import heapq
+import time
+from bisect import bisect_left, insort
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Category, Location
+
+AUTOCOMPLETE_LIMIT = 10
+# full rebuilds pick up values that incremental updates can't see
+# (e.g. a city renamed away from)
+REBUILD_INTERVAL = 60 * 60
+# how often a process looks for other processes' changes
+VERSION_CHECK_INTERVAL = 10
+# every refresh() stores its recounted values as the next numbered
+# delta of its kind, for other processes to apply in order
+VERSION_KEY = "events:autocomplete:{kind}:version"
+DELTA_KEY = "events:autocomplete:{kind}:delta:{version}"
+DELTA_TTL = REBUILD_INTERVAL
+# a process further behind than this rebuilds the kind instead
+MAX_DELTAS = 100
+
+
+def normalize(text):
+    return " ".join(text.split()).casefold()
+
+
+class PrefixIndex:
+    """
+    Popularity-ranked prefix lookups over a set of strings, using a
+    sorted array of normalized keys.
+
+    Prefixes matching more than SCAN_LIMIT keys keep a precomputed top
+    list, so short, broad prefixes cost the same as narrow ones.
+    Spellings that normalize the same ("paris", "Paris ") share one
+    entry, shown with its most popular spelling and weighted by their
+    combined popularity.
+    """
+
+    SCAN_LIMIT = 256
+
+    def __init__(self, weights=()):
+        self._spellings = {}
+        self._weights = {}
+        self._top = {}
+        for value, weight in dict(weights).items():
+            self.set(value, weight, update=False)
+        self._keys = sorted(self._spellings)
+        self._build_top()
+
+    def _rank(self, key):
+        return (-self._weights[key], key)
+
+    def _range(self, prefix):
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + "\U0010ffff", start)
+        return self._keys[start:end]
+
+    def _build_top(self):
+        # a prefix can only be broad if its parent is, so stop at the
+        # first length without any
+        length = 1
+        while True:
+            broad = False
+            for prefix, group in groupby(
+                self._keys, itemgetter(slice(length))
+            ):
+                group = list(group)
+                if len(group) > self.SCAN_LIMIT:
+                    broad = True
+                    self._top[prefix] = heapq.nsmallest(
+                        AUTOCOMPLETE_LIMIT, group, key=self._rank
+                    )
+            if not broad:
+                return
+            length += 1
+
+    def _update_top(self, key, previous):
+        weight = self._weights.get(key, 0)
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            top = self._top.get(prefix)
+            if top is None:
+                continue
+            if key in top and weight < previous:
+                # it may have dropped out: recount from the keys
+                top = self._range(prefix)
+            elif weight:
+                top = {*top, key}
+            self._top[prefix] = heapq.nsmallest(
+                AUTOCOMPLETE_LIMIT, top, key=self._rank
+            )
+
+    def set(self, value, weight, update=True):
+        """
+        Set the popularity of one spelling; zero removes it.
+        """
+        key = normalize(value)
+        if not key:
+            return
+        previous = self._weights.get(key, 0)
+        spellings = self._spellings.get(key)
+        if spellings is None:
+            if weight <= 0:
+                return
+            spellings = self._spellings[key] = {}
+            if update:
+                insort(self._keys, key)
+        if weight > 0:
+            spellings[value] = weight
+        else:
+            spellings.pop(value, None)
+        if spellings:
+            self._weights[key] = sum(spellings.values())
+        else:
+            del self._spellings[key]
+            del self._weights[key]
+            if update:
+                del self._keys[bisect_left(self._keys, key)]
+        if update:
+            self._update_top(key, previous)
+
+    def search(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """
+        Return up to `limit` values starting with `prefix`, most popular
+        first.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if prefix in self._top and limit <= AUTOCOMPLETE_LIMIT:
+            best = self._top[prefix][:limit]
+        else:
+            best = heapq.nsmallest(limit, self._range(prefix), key=self._rank)
+        return [
+            max(self._spellings[key].items(), key=lambda item: item[1])[0]
+            for key in best
+        ]
+
+
+def location_weights(field, values=None):
+    locations = Location.objects.exclude(**{f"{field}__isnull": True})
+    if values is not None:
+        locations = locations.filter(**{f"{field}__in": values})
+    return locations.values_list(field).annotate(weight=Count("events"))
+
+
+def category_weights(values=None):
+    categories = Category.objects.all()
+    if values is not None:
+        categories = categories.filter(name__in=values)
+    return categories.values_list("name").annotate(
+        weight=Count("event_categories")
+    )
+
+
+# kind -> function returning (value, weight) pairs, for every value or
+# just the given ones
+SOURCES = {
+    "city": lambda values=None: location_weights("city", values),
+    "country": lambda values=None: location_weights("country", values),
+    "category": category_weights,
+}
+
+_indexes = {}
+_state = {"built_at": 0.0}
+# kind -> last delta version applied, when it was last checked, and a
+# version found missing at the last check
+_versions = {}
+_checked_at = {}
+_missing = {}
+
+
+def _shared_version(kind):
+    return cache.get_or_set(
+        VERSION_KEY.format(kind=kind), time.time_ns(), None
+    )
+
+
+def _rebuild(kinds=tuple(SOURCES)):
+    for kind in kinds:
+        # read first: deltas stored while building are applied after
+        _versions[kind] = _shared_version(kind)
+        _indexes[kind] = PrefixIndex(SOURCES[kind]())
+        _checked_at[kind] = time.monotonic()
+        _missing.pop(kind, None)
+
+
+def _catch_up(kind):
+    """
+    Apply the deltas other processes stored for `kind` since this
+    process's version, rebuilding it only when too far behind or when
+    a delta has gone missing.
+    """
+    applied, current = _versions[kind], _shared_version(kind)
+    if current == applied:
+        return
+    if not 0 < current - applied <= MAX_DELTAS:
+        _rebuild([kind])
+        return
+    versions = range(applied + 1, current + 1)
+    keys = [DELTA_KEY.format(kind=kind, version=v) for v in versions]
+    deltas = cache.get_many(keys)
+    index = _indexes[kind]
+    for version, key in zip(versions, keys, strict=True):
+        delta = deltas.get(key)
+        if delta is None:
+            # its writer may not have stored it yet; if it's still
+            # missing next time, it's lost (e.g. evicted)
+            if _missing.get(kind) == version:
+                _rebuild([kind])
+            else:
+                _missing[kind] = version
+            return
+        for value, weight in delta.items():
+            index.set(value, weight)
+        _versions[kind] = version
+
+
+def get_index(kind):
+    """
+    Return the prefix index for `kind`, building it when missing or
+    old, and applying other processes' changes every
+    VERSION_CHECK_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    if not _indexes or now - _state["built_at"] > REBUILD_INTERVAL:
+        _rebuild()
+        _state["built_at"] = now
+    elif now - _checked_at[kind] > VERSION_CHECK_INTERVAL:
+        _checked_at[kind] = now
+        _catch_up(kind)
+    return _indexes[kind]
+
+
+def suggest(kind, prefix, limit=AUTOCOMPLETE_LIMIT):
+    return get_index(kind).search(prefix, limit)
+
+
+def refresh(kind, values):
+    """
+    Recount the popularity of `values`, store the new counts as a delta
+    for other processes, and update this process's index in place.
+    """
+    values = {value for value in values if value}
+    if not values:
+        return
+    weights = dict(SOURCES[kind](values))
+    delta = {value: weights.get(value, 0) for value in values}
+    key = VERSION_KEY.format(kind=kind)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        # lost: restart from the clock, so every process rebuilds
+        cache.add(key, time.time_ns(), None)
+        version = cache.incr(key)
+    cache.set(DELTA_KEY.format(kind=kind, version=version), delta, DELTA_TTL)
+    index = _indexes.get(kind)
+    if index is None:
+        return
+    for value, weight in delta.items():
+        index.set(value, weight)
+    # only if nothing came in between; otherwise catching up applies the
+    # deltas in order, this one included
+    if _versions[kind] == version - 1:
+        _versions[kind] = version
+
+
+def refresh_location(location_id):
+    location = Location.objects.filter(pk=location_id).first()
+    if location:
+        refresh("city", [location.city])
+        refresh("country", [location.country])
+
+
+def refresh_category(cat_id):
+    refresh(
+        "category",
+        Category.objects.filter(pk=cat_id).values_list("name", flat=True),
+    )
+
+
+def reset():
+    """
+    Drop the in-process indexes, so the next lookup rebuilds them.
+    """
+    _indexes.clear()
+    _versions.clear()
+    _checked_at.clear()
+    _missing.clear()
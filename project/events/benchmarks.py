@@ -0,0 +1,175 @@
+import json
+import math
+import statistics
+import time
+
+from chat.models import ChatMessage
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Category, Event, EventAttendee, Location
+
+BASELINE_PATH = settings.BASE_DIR / "benchmarks" / "baseline.json"
+# p50 slowdown over the baseline reported as a regression
+TOLERANCE = 0.25
+
+
+def scenarios():
+    """
+    Return (name, url, params) for each view and filter combination to
+    time, picking the busiest rows of the current data so every page
+    has something to render.
+    """
+    event = Event.objects.order_by("-going_count", "pk").values("pk").first()
+    location = (
+        Location.objects.annotate(events_count=Count("events"))
+        .order_by("-events_count", "pk")
+        .values("lat", "long", "city")
+        .first()
+    )
+    categories = list(
+        Category.objects.annotate(events_count=Count("event_categories"))
+        .order_by("-events_count", "pk")
+        .values_list("name", flat=True)[:2]
+    )
+    if event is None or location is None:
+        return []
+    events_url = reverse("events:view_events")
+    near = {
+        "lat": f"{location['lat']:.3f}",
+        "lng": f"{location['long']:.3f}",
+        "radius_km": "25",
+    }
+    return [
+        ("view_events", events_url, {}),
+        ("view_events search", events_url, {"q": "jazz"}),
+        ("view_events city", events_url, {"city": location["city"] or ""}),
+        ("view_events category", events_url, {"category": categories[:1]}),
+        (
+            "view_events all categories",
+            events_url,
+            {"category": categories, "category_mode": "all"},
+        ),
+        ("view_events near", events_url, near),
+        (
+            "view_events deep page",
+            events_url,
+            {"sort": "date_desc", "page": "8"},
+        ),
+        ("view_events past", events_url, {"q": "jazz", "past": "1"}),
+        ("view_event", reverse("events:view_event", args=[event["pk"]]), {}),
+        ("dashboard", reverse("dashboard"), {}),
+        ("chat index", reverse("chat:index"), {}),
+    ]
+
+
+def busiest_user():
+    """
+    The user going to the most events, whose pages do the most work.
+    """
+    user = (
+        EventAttendee.objects.filter(status="going")
+        .values("user")
+        .annotate(going=Count("pk"))
+        .order_by("-going", "user")
+        .values_list("user", flat=True)
+        .first()
+    )
+    return get_user_model().objects.filter(pk=user).first()
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a non-empty list.
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def measure(client, url, params, repeat, cold=False):
+    """
+    Request `url` `repeat` times and return its p50/p95 latency in ms
+    and the median number of queries.
+    """
+    timings, queries = [], []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url, params, secure=True)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        queries.append(len(captured))
+    return {
+        "p50_ms": round(percentile(timings, 0.5), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "queries": int(statistics.median(queries)),
+    }
+
+
+def dataset():
+    """
+    Row counts and database the results were measured against.
+    """
+    return {
+        "vendor": connection.vendor,
+        "events": Event.objects.count(),
+        "attendees": EventAttendee.objects.count(),
+        "messages": ChatMessage.objects.count(),
+    }
+
+
+def run_benchmarks(user, repeat=20, cold=False):
+    """
+    Time every scenario as `user`. Returns {name: measurements}.
+    """
+    client = Client()
+    client.force_login(user)
+    results = {}
+    with override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+    ):
+        for name, url, params in scenarios():
+            results[name] = measure(client, url, params, repeat, cold)
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Return a message for each scenario that got slower than `tolerance`
+    allows at p50, or runs more queries, than in the baseline results.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {result['p50_ms']} ms, was {before['p50_ms']} ms"
+            )
+        if result["queries"] > before["queries"]:
+            regressions.append(
+                f"{name}: {result['queries']} queries, was {before['queries']}"
+            )
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path, encoding="utf-8") as stream:
+        return json.load(stream)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as stream:
+        json.dump({"dataset": dataset(), "results": results}, stream, indent=2)
+        stream.write("\n")
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .facets import category_facets
+
+GENERATION_KEY = "events:generation"
+STATS_KEYS = {"hit": "events:results:hits", "miss": "events:results:misses"}
+
+RESULTS_TTL = 300
+# short, as "upcoming" moves with the clock rather than with writes
+FACETS_TTL = 60
+# ids cached per filter set; pages beyond this are queried directly
+MAX_CACHED_RESULTS = 200
+
+
+def current_generation():
+    """
+    Return the generation counter that versions every cached result.
+    """
+    # seeded from the clock so an evicted counter can't restart at a
+    # value older entries were stored under
+    return cache.get_or_set(GENERATION_KEY, time.time_ns(), None)
+
+
+def bump_generation():
+    """
+    Invalidate every cached result set by moving to a new generation.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate_results():
+    """
+    Bump the generation now and again once the current transaction
+    commits, so nothing cached from pre-commit data outlives the write.
+    """
+    bump_generation()
+    transaction.on_commit(bump_generation)
+
+
+def record(outcome):
+    key = STATS_KEYS[outcome]
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+def stats():
+    """
+    Return the result cache hit/miss counters.
+    """
+    hits = cache.get(STATS_KEYS["hit"], 0)
+    misses = cache.get(STATS_KEYS["miss"], 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many(STATS_KEYS.values())
+
+
+def filters_key(kind, filters):
+    # search text and places match case-insensitively
+    normalized = {
+        **filters,
+        "q": filters["q"].casefold(),
+        "city": filters["city"].casefold(),
+        "country": filters["country"].casefold(),
+    }
+    digest = hashlib.sha256(
+        json.dumps(normalized, sort_keys=True).encode()
+    ).hexdigest()
+    return f"events:{kind}:{current_generation()}:{digest}"
+
+
+def cached_event_ids(filters, events):
+    """
+    Return the ordered ids matching the filtered, ordered queryset,
+    from the cache when possible.
+
+    At most MAX_CACHED_RESULTS + 1 ids are stored; the extra one only
+    signals that more results exist past the cached range.
+    """
+    key = filters_key("results", filters)
+    ids = cache.get(key)
+    if ids is not None:
+        record("hit")
+        return ids
+    record("miss")
+    ids = list(events.values_list("pk", flat=True)[: MAX_CACHED_RESULTS + 1])
+    cache.set(key, ids, RESULTS_TTL)
+    return ids
+
+
+def cached_category_facets(filters, events):
+    """
+    Return category_facets() for `events` (filtered by everything but
+    the categories), cached per filter set.
+    """
+    # the category selection and sort don't change the counts
+    key = filters_key(
+        "facets",
+        {**filters, "categories": [], "category_mode": "any", "sort": ""},
+    )
+    return cache.get_or_set(key, lambda: category_facets(events), FACETS_TTL)
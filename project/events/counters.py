@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models import (
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
+COUNTED_STATUSES = {"going": "going_count", "waitlist": "waitlist_count"}
+
+
+def actual_counts(model):
+    """
+    Subquery expressions counting an event's attendees per counted
+    status, keyed by counter field name.
+    """
+    attendees = model._meta.get_field("attendees").related_model
+    counts = {}
+    for status, field in COUNTED_STATUSES.items():
+        subquery = (
+            attendees.objects.filter(event=OuterRef("pk"), status=status)
+            .order_by()
+            .values("event")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        counts[field] = Coalesce(
+            Subquery(subquery, output_field=IntegerField()), Value(0)
+        )
+    return counts
+
+
+def reconcile_attendee_counts(events, batch_size=1000, dry_run=False):
+    """
+    Recompute the denormalized going/waitlist counters of the given
+    events from their EventAttendee rows, in batches of locked events.
+
+    Returns the ids of the events whose counters had drifted.
+    """
+    counts = actual_counts(events.model)
+    pks = list(events.order_by("pk").values_list("pk", flat=True))
+    drifted = []
+    for start in range(0, len(pks), batch_size):
+        batch = pks[start : start + batch_size]
+        with transaction.atomic(using=events.db):
+            locked = events.model._base_manager.db_manager(events.db).filter(
+                pk__in=batch
+            )
+            # lock the batch so concurrent joins can't interleave
+            list(locked.select_for_update().values_list("pk", flat=True))
+            stale = list(
+                locked.alias(**{f"actual_{f}": c for f, c in counts.items()})
+                .exclude(
+                    **{
+                        field: F(f"actual_{field}")
+                        for field in COUNTED_STATUSES.values()
+                    }
+                )
+                .order_by()
+                .values_list("pk", flat=True)
+            )
+            if stale and not dry_run:
+                locked.filter(pk__in=stale).update(**counts)
+        drifted.extend(stale)
+    return drifted
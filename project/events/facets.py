@@ -0,0 +1,37 @@
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import EventCategory
+
+# categories shown in the filter panel; the rest load on demand
+FACET_LIMIT = 10
+MAX_MORE_FACETS = 100
+
+
+def category_facets(events):
+    """
+    Count the upcoming events in the queryset per category, in a single
+    grouped query. Returns [(name, count), ...], most events first.
+    """
+    upcoming = (
+        events.filter(end_time__gte=timezone.now()).order_by().values("pk")
+    )
+    return list(
+        EventCategory.objects.filter(event__in=upcoming)
+        .values_list("cat__name")
+        .annotate(count=Count("event", distinct=True))
+        .order_by("-count", "cat__name")
+    )
+
+
+def top_facets(facets, selected, limit=FACET_LIMIT):
+    """
+    Return the first `limit` facets plus any selected categories that
+    fall outside them, so checked boxes never disappear.
+    """
+    top = facets[:limit]
+    shown = {name for name, _ in top}
+    counts = dict(facets)
+    return top + [
+        (name, counts.get(name, 0)) for name in selected if name not in shown
+    ]
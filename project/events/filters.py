@@ -0,0 +1,140 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from .geo import filter_within_radius, parse_point
+from .pagination import KEYSET_ORDERINGS
+from .search import filter_by_place, relevance_ordering, search_events
+
+CATEGORY_MODES = ("any", "all")
+
+
+def parse_date(value):
+    """
+    Parse a YYYY-MM-DD filter value into an aware datetime, or None.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").replace(
+            tzinfo=ZoneInfo(settings.TIME_ZONE)
+        )
+    except ValueError:
+        return None
+
+
+def parse_filters(params):
+    """
+    Read and normalise the event list filters from request parameters.
+
+    Invalid dates and points are dropped, categories are de-duplicated
+    and sorted and the point is rounded to ~100m, so equivalent requests
+    produce the same filters (and share cache entries).
+    """
+    query = " ".join(params.get("q", "").split())
+    city = params.get("city", "").strip()
+    country = params.get("country", "").strip()
+    try:
+        near = parse_point(params)
+    except ValueError:
+        near = None
+    if near:
+        near = (round(near[0], 3), round(near[1], 3), near[2])
+
+    # nearest first when searching near a point, else rank by relevance
+    # by default when searching
+    if near:
+        default_sort = "distance"
+    elif query or city or country:
+        default_sort = "relevance"
+    else:
+        default_sort = "date_asc"
+
+    categories = sorted({c for c in params.getlist("category") if c})
+    category_mode = params.get("category_mode")
+    if category_mode not in CATEGORY_MODES or len(categories) < 2:
+        category_mode = "any"
+
+    # archived (long ended) events are only searched when asked for
+    past = params.get("past") == "1"
+
+    start_date = params.get("start_date", "")
+    end_date = params.get("end_date", "")
+    return {
+        "q": query,
+        "city": city,
+        "country": country,
+        "categories": categories,
+        "category_mode": category_mode,
+        "start_date": start_date if parse_date(start_date) else "",
+        "end_date": end_date if parse_date(end_date) else "",
+        "near": near,
+        "past": past,
+        "sort": params.get("sort") or default_sort,
+    }
+
+
+def filter_by_categories(events, names, mode="any"):
+    """
+    Filter events to those in any (or, with mode="all", every) one of
+    the named categories.
+
+    Uses EXISTS semijoins rather than joining EventCategory, so events
+    aren't repeated per matching category and need no DISTINCT. Works
+    for ArchivedEvent too, through its own category table.
+    """
+    event_categories = events.model._meta.get_field(
+        "event_categories"
+    ).related_model
+
+    def in_category(names):
+        return Exists(
+            event_categories.objects.filter(
+                event=OuterRef("pk"), cat__name__in=names
+            )
+        )
+
+    if mode == "all":
+        return events.filter(*(in_category([name]) for name in names))
+    return events.filter(in_category(names))
+
+
+def filter_events(events, filters):
+    """
+    Apply parsed filters to an Event queryset and order it.
+
+    Returns (queryset, sort), where sort is the ordering actually
+    applied: requests for a sort that doesn't apply (e.g. relevance
+    without a search) fall back to date_asc.
+    """
+    if filters["q"]:
+        events = search_events(events, filters["q"])
+    if filters["city"]:
+        events = filter_by_place(events, "city", filters["city"])
+    if filters["country"]:
+        events = filter_by_place(events, "country", filters["country"])
+    if filters["categories"]:
+        events = filter_by_categories(
+            events, filters["categories"], filters["category_mode"]
+        )
+    if filters["near"]:
+        events = filter_within_radius(events, *filters["near"])
+    if filters["start_date"]:
+        events = events.filter(
+            start_time__gte=parse_date(filters["start_date"])
+        )
+    if filters["end_date"]:
+        events = events.filter(end_time__lte=parse_date(filters["end_date"]))
+
+    sort = filters["sort"]
+    if sort == "distance" and filters["near"]:
+        events = events.order_by("distance_km", "start_time", "id")
+    elif sort == "relevance" and relevance_ordering(events):
+        events = events.order_by(
+            *relevance_ordering(events), "start_time", "id"
+        )
+    else:
+        if sort not in KEYSET_ORDERINGS:
+            sort = "date_asc"
+        events = events.order_by(*KEYSET_ORDERINGS[sort])
+    return events, sort
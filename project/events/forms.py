@@ -1,7 +1,9 @@
 from django import forms
+from django.urls import reverse_lazy
 from django.utils import timezone
 
 from .models import Category, Event, EventAttendee, EventCategory, Location
+from .search import refresh_search_vectors
 
 
 class BaseEventForm(forms.ModelForm):
@@ -15,6 +17,10 @@ class BaseEventForm(forms.ModelForm):
             attrs={
                 "class": "form-control",
                 "placeholder": "Categories (comma-separated)",
+                "data-autocomplete": reverse_lazy(
+                    "events:autocomplete", args=["category"]
+                ),
+                "data-autocomplete-multiple": True,
             }
         ),
     )
@@ -70,11 +76,7 @@ class BaseEventForm(forms.ModelForm):
         if start_time and end_time and start_time >= end_time:
             self.add_error("end_time", "End time must be after start time.")
 
-        going_count = 0
-        if getattr(self.instance, "pk", None):
-            going_count = EventAttendee.objects.filter(
-                event=self.instance, status="going"
-            ).count()
+        going_count = self.instance.going_count if self.instance.pk else 0
         capacity = cleaned.get("capacity")
         if capacity is None or capacity < 1:
             self.add_error("capacity", "Capacity must be at least 1.")
@@ -154,5 +156,7 @@ class BaseEventForm(forms.ModelForm):
             for name in [c.strip() for c in cats.split(",") if c.strip()]:
                 category, _ = Category.objects.get_or_create(name=name)
                 EventCategory.objects.get_or_create(cat=category, event=event)
+            # category names are part of the search vector
+            refresh_search_vectors(Event.objects.filter(pk=event.pk))
 
         return event
@@ -0,0 +1,81 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# versioned keys never go stale, so the TTL only bounds memory
+FRAGMENT_TTL = 60 * 60 * 24
+
+
+def fragment_version(event, category_names):
+    """
+    Version of an event's rendered fragments: changes whenever anything
+    they show does. The event's own fields are covered by updated_at;
+    the location, host and categories live on other rows and so are
+    versioned by the values themselves, which are already loaded.
+    """
+    location = event.location
+    parts = [
+        event.updated_at.isoformat(),
+        event.location_id,
+        location.formatted_address if location else None,
+        event.host.username,
+        category_names,
+    ]
+    return hashlib.md5(
+        json.dumps(parts).encode(), usedforsecurity=False
+    ).hexdigest()
+
+
+def fragment_key(kind, event, category_names):
+    return (
+        f"events:{kind}:{event.pk}:{fragment_version(event, category_names)}"
+    )
+
+
+def card_category_names(event):
+    # from the prefetched event_categories__cat
+    return [ec.cat.name for ec in event.event_categories.all()]
+
+
+def render_event_cards(events):
+    """
+    Return [(event, html), ...] with each event's card body, reusing
+    cached HTML and rendering (then caching) only the misses. The whole
+    page costs one cache read and at most one write.
+    """
+    events = list(events)
+    keys = {
+        event.pk: fragment_key("card", event, card_category_names(event))
+        for event in events
+    }
+    cached = cache.get_many(keys.values())
+    rendered = {}
+    for event in events:
+        if keys[event.pk] not in cached:
+            rendered[keys[event.pk]] = render_to_string(
+                "events/event_card.html",
+                {
+                    "event": event,
+                    "category_names": card_category_names(event),
+                },
+            )
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TTL)
+    cached.update(rendered)
+    return [(event, mark_safe(cached[keys[event.pk]])) for event in events]
+
+
+def render_event_header(event):
+    """
+    Return the static header of the event detail page, from the cache
+    when possible. Expects the `category_names` annotation.
+    """
+    key = fragment_key("header", event, event.category_names)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string("events/event_header.html", {"event": event})
+        cache.set(key, html, FRAGMENT_TTL)
+    return mark_safe(html)
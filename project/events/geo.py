@@ -0,0 +1,225 @@
+from math import asin, cos, degrees, pi, radians, sin, sqrt
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import (
+    ASin,
+    Cos,
+    Least,
+    Power,
+    Radians,
+    Sin,
+    Sqrt,
+)
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = pi * EARTH_RADIUS_KM / 180
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 500
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# precision stored on Location (~5m cells); shorter prefixes of it
+# identify the enclosing coarser cells
+GEOHASH_PRECISION = 9
+
+
+def haversine(
+    lat1, lon1, lat2, lon2
+):  # helper function to calculate distance between two lat/long points
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = (
+        sin(dlat / 2) ** 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    )
+    return EARTH_RADIUS_KM * 2 * asin(sqrt(a))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing the circle of
+    `radius_km` around a point, for use as an indexable prefilter.
+
+    Near the poles, or when the box would cross the antimeridian, the
+    longitude range widens to the whole globe.
+    """
+    dlat = degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if min_lat == -90.0 or max_lat == 90.0:
+        return min_lat, max_lat, -180.0, 180.0
+    dlng = degrees(
+        asin(min(1.0, sin(radius_km / EARTH_RADIUS_KM) / cos(radians(lat))))
+    )
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180.0 or max_lng > 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """
+    Encode a point as a geohash string of `precision` characters.
+    """
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True
+    while len(chars) < precision:
+        # even bits bisect longitude, odd bits latitude
+        bounds, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            bounds[0] = mid
+        else:
+            bits = bits * 2
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision):
+    """
+    Return the (height, width) in degrees of a geohash cell.
+    """
+    lat_bits = 5 * precision // 2
+    lng_bits = 5 * precision - lat_bits
+    return 180 / 2**lat_bits, 360 / 2**lng_bits
+
+
+def geohash_neighbors(lat, lng, precision):
+    """
+    Return the geohash of the cell containing the point together with
+    its (up to) eight surrounding cells.
+    """
+    dlat, dlng = geohash_cell_size(precision)
+    cells = set()
+    for i in (-1, 0, 1):
+        cell_lat = lat + i * dlat
+        if not -90 <= cell_lat <= 90:
+            continue
+        for j in (-1, 0, 1):
+            cell_lng = (lng + j * dlng + 180) % 360 - 180
+            cells.add(encode_geohash(cell_lat, cell_lng, precision))
+    return cells
+
+
+def geohash_cells(lat, lng, radius_km):
+    """
+    Return a set of geohash prefixes whose cells together cover the
+    circle of `radius_km` around the point, or None if the circle is too
+    large (or too close to a pole) for a useful cell lookup.
+
+    Uses the finest precision whose cells are at least `radius_km` on
+    each side, so the point's cell and its neighbours always suffice.
+    """
+    # cells narrow towards the poles, so size them at the circle's
+    # latitude furthest from the equator
+    edge_lat = min(90.0, abs(lat) + degrees(radius_km / EARTH_RADIUS_KM))
+    precision = 0
+    for candidate in range(1, GEOHASH_PRECISION + 1):
+        dlat, dlng = geohash_cell_size(candidate)
+        height_km = dlat * KM_PER_DEGREE
+        width_km = dlng * KM_PER_DEGREE * cos(radians(edge_lat))
+        if height_km < radius_km or width_km < radius_km:
+            break
+        precision = candidate
+    if not precision:
+        return None
+    return geohash_neighbors(lat, lng, precision)
+
+
+def within_cells(cells, prefix="location__"):
+    """
+    Q object matching rows whose location geohash lies in any of the
+    given cells. Served by the prefix (LIKE 'abc%') index on geohash.
+    """
+    return Q(
+        *(Q(**{f"{prefix}geohash__startswith": cell}) for cell in cells),
+        _connector=Q.OR,
+    )
+
+
+def backfill_geohashes(locations, batch_size=1000):
+    """
+    Compute and store geohashes for every location in the queryset,
+    in batches. Returns the number of locations updated.
+    """
+    manager = locations.model._base_manager.db_manager(locations.db)
+    updated = 0
+    batch = []
+    for location in locations.only("pk", "lat", "long").iterator(
+        chunk_size=batch_size
+    ):
+        location.geohash = encode_geohash(location.lat, location.long)
+        batch.append(location)
+        if len(batch) >= batch_size:
+            updated += manager.bulk_update(batch, ["geohash"])
+            batch = []
+    if batch:
+        updated += manager.bulk_update(batch, ["geohash"])
+    return updated
+
+
+def distance_km(lat, lng, prefix="location__"):
+    """
+    Database expression for the great-circle distance in km between a
+    point and the `lat`/`long` columns reached through `prefix`.
+    """
+    lat_field = F(f"{prefix}lat")
+    lng_field = F(f"{prefix}long")
+    dlat = Radians(lat_field - Value(lat))
+    dlng = Radians(lng_field - Value(lng))
+    a = Power(Sin(dlat / 2), 2) + Cos(Value(radians(lat))) * Cos(
+        Radians(lat_field)
+    ) * Power(Sin(dlng / 2), 2)
+    # clamp rounding error so asin stays in its domain
+    return Value(2 * EARTH_RADIUS_KM) * ASin(
+        Sqrt(Least(a, Value(1.0))), output_field=FloatField()
+    )
+
+
+def filter_within_radius(queryset, lat, lng, radius_km, prefix="location__"):
+    """
+    Filter events (or, with prefix="", locations) to those within
+    `radius_km` of the point and annotate each with `distance_km`.
+
+    Geohash cells and the bounding box narrow the candidates through
+    indexes before the exact distance is computed for the survivors.
+    """
+    cells = geohash_cells(lat, lng, radius_km)
+    if cells:
+        queryset = queryset.filter(within_cells(cells, prefix))
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    return (
+        queryset.filter(
+            **{
+                f"{prefix}lat__range": (min_lat, max_lat),
+                f"{prefix}long__range": (min_lng, max_lng),
+            }
+        )
+        .annotate(distance_km=distance_km(lat, lng, prefix))
+        .filter(distance_km__lte=radius_km)
+    )
+
+
+def parse_point(params):
+    """
+    Read `lat`, `lng` and `radius_km` from request parameters.
+
+    Returns (lat, lng, radius_km), or None if no point was given. Raises
+    ValueError for malformed or out-of-range values.
+    """
+    lat, lng = params.get("lat", ""), params.get("lng", "")
+    if not lat and not lng:
+        return None
+    lat, lng = float(lat), float(lng)
+    radius_km = float(params.get("radius_km") or DEFAULT_RADIUS_KM)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("lat/lng out of range")
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f"radius_km must be in (0, {MAX_RADIUS_KM}]")
+    return lat, lng, radius_km
@@ -0,0 +1,233 @@
+import csv
+import json
+from functools import partial
+from itertools import batched
+
+from django.db import transaction
+
+from . import autocomplete
+from .cache import invalidate_results
+from .forms import BaseEventForm
+from .geo import encode_geohash
+from .models import Category, Event, EventAttendee, EventCategory, Location
+from .search import refresh_search_vectors
+
+# events validated and written per transaction
+CHUNK_SIZE = 1000
+IMPORT_FORMATS = ("csv", "jsonl")
+CATEGORY_MAX_LENGTH = Category._meta.get_field("name").max_length
+# where events without an address are placed, as BaseEventForm does
+ONLINE = ("Online", 0.0, 0.0)
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (line number, row dict) from a CSV (with a header row) or JSON
+    Lines stream, one row at a time. Unparseable JSON lines are yielded
+    as a row holding only an "_error".
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = {"_error": f"Invalid JSON: {exc}"}
+        if not isinstance(row, dict):
+            row = {"_error": "Expected a JSON object."}
+        yield number, row
+
+
+def validate_row(row):
+    """
+    Validate one input row with BaseEventForm's rules. Returns (cleaned
+    data, None) or (None, list of error messages).
+    """
+    if "_error" in row:
+        return None, [row["_error"]]
+    data = {key: value for key, value in row.items() if key is not None}
+    if isinstance(data.get("categories"), list):
+        data["categories"] = ",".join(map(str, data["categories"]))
+    form = BaseEventForm(data=data)
+    if not form.is_valid():
+        return None, [
+            f"{field}: {message}" if field != "__all__" else message
+            for field, messages in form.errors.items()
+            for message in messages
+        ]
+    cleaned = form.cleaned_data
+    names = [
+        name.strip()
+        for name in (cleaned.get("categories") or "").split(",")
+        if name.strip()
+    ]
+    long_names = [name for name in names if len(name) > CATEGORY_MAX_LENGTH]
+    if long_names:
+        return None, [
+            f"categories: {name!r} is longer than "
+            f"{CATEGORY_MAX_LENGTH} characters."
+            for name in long_names
+        ]
+    # the form's save() treats a missing address or point as online
+    address = cleaned.get("formatted_address") or None
+    lat, long = cleaned.get("lat"), cleaned.get("long")
+    if address and lat is not None and long is not None:
+        location = (address, lat, long)
+        details = {
+            "city": cleaned.get("city") or None,
+            "country": cleaned.get("country") or None,
+            "postcode": cleaned.get("postcode") or None,
+        }
+    else:
+        location = ONLINE
+        details = {"city": None, "country": None, "postcode": None}
+    return {
+        "event": {
+            field: cleaned[field] for field in BaseEventForm.Meta.fields
+        },
+        "location": location,
+        "location_details": details,
+        "categories": list(dict.fromkeys(names)),
+    }, None
+
+
+class EventImporter:
+    """
+    Bulk-create events for one host from validated rows.
+
+    Locations and categories are looked up once per chunk and remembered
+    across chunks, so each chunk costs a fixed handful of queries
+    however many rows share them.
+    """
+
+    def __init__(self, host, chunk_size=CHUNK_SIZE, dry_run=False):
+        self.host = host
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        # (formatted_address, lat, long) -> location id
+        self._locations = {}
+        # category name -> id
+        self._categories = {}
+        self.imported = 0
+        self.rejected = []
+
+    def run(self, rows):
+        """
+        Import (line number, row) pairs, validating as they stream in.
+        Invalid rows are collected in `rejected` as (line number,
+        errors). Returns the number of events imported.
+        """
+        for chunk in batched(self._validated(rows), self.chunk_size):
+            if not self.dry_run:
+                self._write(chunk)
+            self.imported += len(chunk)
+        return self.imported
+
+    def _validated(self, rows):
+        for number, row in rows:
+            cleaned, errors = validate_row(row)
+            if errors:
+                self.rejected.append((number, errors))
+            else:
+                yield cleaned
+
+    def _resolve_locations(self, chunk):
+        details = {
+            row["location"]: row["location_details"]
+            for row in chunk
+            if row["location"] not in self._locations
+        }
+        if not details:
+            return
+        # the first match wins, as in BaseEventForm.save()
+        existing = Location.objects.filter(
+            formatted_address__in={address for address, _, _ in details}
+        ).order_by("-pk")
+        for pk, address, lat, long in existing.values_list(
+            "pk", "formatted_address", "lat", "long"
+        ):
+            if (address, lat, long) in details:
+                self._locations[address, lat, long] = pk
+        # bulk_create skips Location.save(), which sets the geohash
+        created = Location.objects.bulk_create(
+            Location(
+                formatted_address=address,
+                lat=lat,
+                long=long,
+                geohash=encode_geohash(lat, long),
+                **extra,
+            )
+            for (address, lat, long), extra in details.items()
+            if (address, lat, long) not in self._locations
+        )
+        for location in created:
+            key = (location.formatted_address, location.lat, location.long)
+            self._locations[key] = location.pk
+
+    def _resolve_categories(self, chunk):
+        missing = {
+            name
+            for row in chunk
+            for name in row["categories"]
+            if name not in self._categories
+        }
+        if not missing:
+            return
+        existing = Category.objects.filter(name__in=missing).order_by("-pk")
+        self._categories.update(existing.values_list("name", "pk"))
+        created = Category.objects.bulk_create(
+            Category(name=name)
+            for name in sorted(missing - self._categories.keys())
+        )
+        self._categories.update((cat.name, cat.pk) for cat in created)
+
+    def _write(self, chunk):
+        with transaction.atomic():
+            self._resolve_locations(chunk)
+            self._resolve_categories(chunk)
+            # the host goes to their own event, as when created by form
+            events = Event.objects.bulk_create(
+                Event(
+                    **row["event"],
+                    host=self.host,
+                    location_id=self._locations[row["location"]],
+                    going_count=1,
+                )
+                for row in chunk
+            )
+            EventAttendee.objects.bulk_create(
+                EventAttendee(event=event, user=self.host, status="going")
+                for event in events
+            )
+            EventCategory.objects.bulk_create(
+                EventCategory(event=event, cat_id=self._categories[name])
+                for event, row in zip(events, chunk, strict=True)
+                for name in row["categories"]
+            )
+            # bulk_create sends no signals, so do what their receivers
+            # would, once per chunk
+            refresh_search_vectors(
+                Event.objects.filter(pk__in=[event.pk for event in events])
+            )
+            invalidate_results()
+            details = [row["location_details"] for row in chunk]
+            for kind in ("city", "country"):
+                transaction.on_commit(
+                    partial(
+                        autocomplete.refresh,
+                        kind,
+                        {detail[kind] for detail in details},
+                    )
+                )
+            transaction.on_commit(
+                partial(
+                    autocomplete.refresh,
+                    "category",
+                    {name for row in chunk for name in row["categories"]},
+                )
+            )
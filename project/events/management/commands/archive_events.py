@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.archive import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    archive_events,
+)
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Move events that ended long ago, with their attendees and chat "
+        "messages, out of the live tables into the archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=ARCHIVE_AFTER_DAYS,
+            help="Archive events that ended more than this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=ARCHIVE_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many events would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timezone.timedelta(days=options["days"])
+        if options["dry_run"]:
+            count = Event.objects.filter(end_time__lt=before).count()
+            self.stdout.write(f"Would archive {count} events.")
+            return
+        count = archive_events(before, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {count} events."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from events.geo import backfill_geohashes
+from events.models import Location
+
+
+class Command(BaseCommand):
+    help = "Compute the geohash cell of locations that are missing one."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every location, not just missing ones.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        locations = Location.objects.order_by("pk")
+        if not options["all"]:
+            locations = locations.filter(geohash="")
+        updated = backfill_geohashes(locations, options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {updated} location geohashes.")
+        )
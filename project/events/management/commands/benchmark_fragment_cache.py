@@ -0,0 +1,99 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+
+from events.fragments import (
+    card_category_names,
+    fragment_key,
+    render_event_cards,
+)
+from events.models import Category, Event, EventCategory
+from events.pagination import Page
+from events.views import EVENTS_PER_PAGE
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering event list pages with cold and warm event card "
+        "caches. Test rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            host = get_user_model().objects.create_user(
+                username="fragment-benchmark-host"
+            )
+            categories = [
+                Category.objects.create(name=f"Benchmark {i}")
+                for i in range(5)
+            ]
+            start = timezone.now() + timezone.timedelta(days=1)
+            events = Event.objects.bulk_create(
+                Event(
+                    host=host,
+                    title=f"Benchmark event {i}",
+                    description="Lorem ipsum dolor sit amet " * 20,
+                    start_time=start,
+                    end_time=start + timezone.timedelta(hours=2),
+                )
+                for i in range(options["pages"] * EVENTS_PER_PAGE)
+            )
+            EventCategory.objects.bulk_create(
+                EventCategory(event=event, cat=cat)
+                for i, event in enumerate(events)
+                for cat in categories[: i % len(categories) + 1]
+            )
+
+            queryset = (
+                Event.objects.filter(host=host)
+                .select_related("location", "host")
+                .prefetch_related("event_categories__cat")
+                .order_by("pk")
+            )
+            pages = [
+                list(queryset[i : i + EVENTS_PER_PAGE])
+                for i in range(0, len(events), EVENTS_PER_PAGE)
+            ]
+            request = RequestFactory().get("/events/")
+            request.user = AnonymousUser()
+
+            def render_pages():
+                started = time.perf_counter()
+                for events in pages:
+                    page = Page(events, number=1)
+                    render_to_string(
+                        "events/view_events.html",
+                        {
+                            "page_obj": page,
+                            "events": page,
+                            "cards": render_event_cards(events),
+                        },
+                        request=request,
+                    )
+                return (time.perf_counter() - started) * 1000 / len(pages)
+
+            cache.delete_many(
+                fragment_key("card", event, card_category_names(event))
+                for events in pages
+                for event in events
+            )
+            cold_ms = render_pages()
+            warm_ms = render_pages()
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"cold card cache: {cold_ms:.2f} ms/page")
+        self.stdout.write(f"warm card cache: {warm_ms:.2f} ms/page")
+        self.stdout.write(
+            self.style.SUCCESS(f"speedup: {cold_ms / warm_ms:.1f}x")
+        )
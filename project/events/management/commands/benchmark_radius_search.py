@@ -0,0 +1,94 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from events.geo import encode_geohash, filter_within_radius, haversine
+from events.models import Location
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the indexed radius search against a naive Python "
+        "haversine loop over every location. Test rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--locations", type=int, default=100_000)
+        parser.add_argument("--radius-km", type=float, default=25.0)
+        parser.add_argument("--queries", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        radius_km = options["radius_km"]
+
+        with transaction.atomic():
+            self.stdout.write(f"Creating {options['locations']} locations...")
+            coords = [
+                (rng.uniform(-60, 70), rng.uniform(-180, 180))
+                for _ in range(options["locations"])
+            ]
+            # bulk_create skips Location.save, so set the geohash here
+            Location.objects.bulk_create(
+                (
+                    Location(
+                        formatted_address="benchmark",
+                        lat=lat,
+                        long=lng,
+                        geohash=encode_geohash(lat, lng),
+                    )
+                    for lat, lng in coords
+                ),
+                batch_size=5000,
+            )
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE events_location")
+
+            points = [
+                (rng.uniform(-60, 70), rng.uniform(-180, 180))
+                for _ in range(options["queries"])
+            ]
+
+            start = time.perf_counter()
+            indexed = [
+                set(
+                    filter_within_radius(
+                        Location.objects.all(), lat, lng, radius_km, prefix=""
+                    ).values_list("pk", flat=True)
+                )
+                for lat, lng in points
+            ]
+            indexed_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            naive = [
+                {
+                    pk
+                    for pk, loc_lat, loc_lng in Location.objects.values_list(
+                        "pk", "lat", "long"
+                    ).iterator(chunk_size=10_000)
+                    if haversine(lat, lng, loc_lat, loc_lng) <= radius_km
+                }
+                for lat, lng in points
+            ]
+            naive_ms = (time.perf_counter() - start) * 1000
+
+            transaction.set_rollback(True)
+
+        if indexed != naive:
+            self.stderr.write("Result sets differ between the two methods.")
+        queries = len(points)
+        self.stdout.write(
+            f"indexed prefilter + distance:    "
+            f"{indexed_ms / queries:.2f} ms/query"
+        )
+        self.stdout.write(
+            f"naive python haversine loop:     "
+            f"{naive_ms / queries:.2f} ms/query"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"speedup: {naive_ms / indexed_ms:.1f}x")
+        )
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.benchmarks import (
+    BASELINE_PATH,
+    TOLERANCE,
+    busiest_user,
+    compare,
+    dataset,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the event list, event, dashboard and chat index pages across "
+        "filter combinations, reporting p50/p95 latency and query counts. "
+        "Run seed_events first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Clear the cache before every request.",
+        )
+        parser.add_argument(
+            "--compare",
+            nargs="?",
+            const=BASELINE_PATH,
+            type=Path,
+            help="Fail if slower, or running more queries, than the "
+            "baseline file.",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            nargs="?",
+            const=BASELINE_PATH,
+            type=Path,
+            help="Store these results as the baseline.",
+        )
+        parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+
+    def handle(self, *args, **options):
+        user = busiest_user()
+        if user is None:
+            raise CommandError("No attendees to benchmark; run seed_events.")
+        results = run_benchmarks(
+            user, repeat=options["repeat"], cold=options["cold"]
+        )
+
+        baseline = {}
+        if options["compare"]:
+            stored = load_baseline(options["compare"])
+            if stored["dataset"] != dataset():
+                self.stderr.write(
+                    "Warning: the baseline was measured on different data "
+                    f"({stored['dataset']})."
+                )
+            baseline = stored["results"]
+
+        self.stdout.write(
+            f"{'scenario':<30} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8}"
+        )
+        for name, result in results.items():
+            line = (
+                f"{name:<30} {result['p50_ms']:>8.2f} "
+                f"{result['p95_ms']:>8.2f} {result['queries']:>8}"
+            )
+            if name in baseline:
+                line += f"   (baseline {baseline[name]['p50_ms']:.2f} ms)"
+            self.stdout.write(line)
+
+        if options["save_baseline"]:
+            save_baseline(results, options["save_baseline"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Saved baseline to {options['save_baseline']}."
+                )
+            )
+        if baseline:
+            regressions = compare(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    "Regressions against the baseline:\n"
+                    + "\n".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.recommendations import (
+    BATCH_SIZE,
+    TOP_K,
+    compute_recommendations,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute each user's recommended upcoming events from the "
+        "categories and places of the events they have gone to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=TOP_K)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Users scored and written per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = compute_recommendations(
+            k=options["top_k"], batch_size=options["batch_size"]
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recommended events for {users} users in {elapsed:.1f}s."
+            )
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from events.cache import reset_stats, stats
+
+
+class Command(BaseCommand):
+    help = "Report hit/miss counts for the cached event list results."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Zero the counters after reporting them.",
+        )
+
+    def handle(self, *args, **options):
+        counts = stats()
+        self.stdout.write(
+            f"hits: {counts['hits']}  misses: {counts['misses']}  "
+            f"hit rate: {counts['hit_rate']:.1%}"
+        )
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
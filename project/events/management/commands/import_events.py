@@ -0,0 +1,77 @@
+import sys
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from events.importer import (
+    CHUNK_SIZE,
+    IMPORT_FORMATS,
+    EventImporter,
+    read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream events from a CSV or JSON Lines file (or - for stdin) "
+        "into the database, validated like the event form."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--host",
+            required=True,
+            help="Username of the user hosting the imported events.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="Input format; guessed from the file extension if unset.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the input without writing anything.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or Path(path).suffix.lstrip(".").lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError(
+                "Cannot tell the input format; pass --format csv or jsonl."
+            )
+        User = get_user_model()
+        try:
+            host = User.objects.get(username=options["host"])
+        except User.DoesNotExist as exc:
+            raise CommandError(f"No user named {options['host']!r}.") from exc
+
+        importer = EventImporter(
+            host,
+            chunk_size=options["chunk_size"],
+            dry_run=options["dry_run"],
+        )
+        started = time.perf_counter()
+        if path == "-":
+            importer.run(read_rows(sys.stdin, fmt))
+        else:
+            with open(path, newline="", encoding="utf-8") as stream:
+                importer.run(read_rows(stream, fmt))
+        elapsed = time.perf_counter() - started
+
+        for number, errors in importer.rejected:
+            self.stderr.write(f"line {number}: {'; '.join(errors)}")
+        rows = importer.imported + len(importer.rejected)
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {importer.imported} events, rejected "
+                f"{len(importer.rejected)} rows in {elapsed:.1f}s "
+                f"({rows / elapsed if elapsed else 0:.0f} rows/s)."
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from events.counters import reconcile_attendee_counts
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Repair drift in the denormalized going/waitlist counters on "
+        "Event by recounting EventAttendee rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted events without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = reconcile_attendee_counts(
+            Event.objects.all(),
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        verb = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {len(drifted)} events with drifted counters."
+            )
+        )
+        if drifted and options["verbosity"] > 1:
+            self.stdout.write(", ".join(str(pk) for pk in drifted))
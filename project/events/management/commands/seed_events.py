@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.seeding import flush_seed_data, seed_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a reproducible synthetic dataset of users, locations, "
+        "events, categories, attendees and chat messages, with skewed "
+        "popularity, for benchmarking."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--locations", type=int, default=2000)
+        parser.add_argument("--events", type=int, default=20000)
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--attendees", type=int, default=100_000)
+        parser.add_argument("--messages", type=int, default=50_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help="Delete previously seeded data first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["flush"]:
+            flush_seed_data()
+        started = time.perf_counter()
+        created = seed_events(
+            users=options["users"],
+            locations=options["locations"],
+            events=options["events"],
+            categories=options["categories"],
+            attendees=options["attendees"],
+            messages=options["messages"],
+            seed=options["seed"],
+        )
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(
+            f"{count} {kind}" for kind, count in created.items()
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {summary} in {elapsed:.1f}s.")
+        )
@@ -0,0 +1,80 @@
+# Generated by Django 6.0.7 on 2026-10-18 05:22
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, StringAgg, Subquery, Value
+
+# a copy of events.search as of this migration, so later changes there
+# don't alter it
+SEARCH_CONFIG = "english"
+
+
+def refresh_search_vectors(apps, events):
+    EventCategory = apps.get_model("events", "EventCategory")
+    category_names = (
+        EventCategory.objects.filter(event=OuterRef("pk"))
+        .order_by()
+        .values("event")
+        .annotate(names=StringAgg("cat__name", Value(" ")))
+        .values("names")
+    )
+    vector = (
+        SearchVector("title", config=SEARCH_CONFIG, weight="A")
+        + SearchVector(
+            Subquery(category_names), config=SEARCH_CONFIG, weight="B"
+        )
+        + SearchVector(
+            "location__city",
+            "location__formatted_address",
+            config=SEARCH_CONFIG,
+            weight="C",
+        )
+        + SearchVector("description", config=SEARCH_CONFIG, weight="D")
+    )
+    vectors = (
+        events.model.objects.filter(pk=OuterRef("pk"))
+        .order_by()
+        .annotate(vector=vector)
+        .values("vector")
+    )
+    events.order_by().update(search_vector=Subquery(vectors))
+
+
+def create_search_index(apps, schema_editor):
+    # GIN indexes are Postgres-only; other backends fall back to icontains
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS events_event_search_vector_gin "
+        "ON events_event USING gin (search_vector)"
+    )
+    Event = apps.get_model("events", "Event")
+    refresh_search_vectors(
+        apps, Event.objects.using(schema_editor.connection.alias)
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "DROP INDEX IF EXISTS events_event_search_vector_gin"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("events", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
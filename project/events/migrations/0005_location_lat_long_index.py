@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-18 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("events", "0004_location_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["lat", "long"], name="location_lat_long_idx"
+            ),
+        ),
+    ]
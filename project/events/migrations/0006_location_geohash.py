@@ -0,0 +1,67 @@
+# Generated by Django 6.0.7 on 2026-10-18 05:27
+
+from django.db import migrations, models
+
+# a copy of events.geo as of this migration, so later changes there
+# don't alter it
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+BATCH_SIZE = 1000
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True
+    while len(chars) < precision:
+        # even bits bisect longitude, odd bits latitude
+        bounds, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            bounds[0] = mid
+        else:
+            bits = bits * 2
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def backfill(apps, schema_editor):
+    Location = apps.get_model("events", "Location")
+    manager = Location._base_manager.db_manager(schema_editor.connection.alias)
+    batch = []
+    for location in (
+        manager.order_by("pk")
+        .only("pk", "lat", "long")
+        .iterator(chunk_size=BATCH_SIZE)
+    ):
+        location.geohash = encode_geohash(location.lat, location.long)
+        batch.append(location)
+        if len(batch) >= BATCH_SIZE:
+            manager.bulk_update(batch, ["geohash"])
+            batch = []
+    if batch:
+        manager.bulk_update(batch, ["geohash"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("events", "0005_location_lat_long_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="location",
+            name="geohash",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=12
+            ),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.7 on 2026-10-18 05:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("events", "0006_location_geohash"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["start_time", "id"], name="event_start_time_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["title", "start_time", "id"],
+                name="event_title_start_time_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.7 on 2026-10-18 05:34
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# a copy of events.counters as of this migration, so later changes
+# there don't alter it
+COUNTED_STATUSES = {"going": "going_count", "waitlist": "waitlist_count"}
+
+
+def backfill_counts(apps, schema_editor):
+    Event = apps.get_model("events", "Event")
+    EventAttendee = apps.get_model("events", "EventAttendee")
+    alias = schema_editor.connection.alias
+    counts = {}
+    for status, field in COUNTED_STATUSES.items():
+        subquery = (
+            EventAttendee.objects.using(alias)
+            .filter(event=OuterRef("pk"), status=status)
+            .order_by()
+            .values("event")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        counts[field] = Coalesce(
+            Subquery(subquery, output_field=IntegerField()), Value(0)
+        )
+    # the columns are new, so nothing else writes them yet: one update
+    # without the batching and locking of reconcile_attendee_counts
+    Event._base_manager.db_manager(alias).update(**counts)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("events", "0007_event_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="going_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="waitlist_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.7 on 2026-10-18 05:42
+
+from django.db import migrations
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    EventCategory = apps.get_model("events", "EventCategory")
+    rows = EventCategory.objects.using(schema_editor.connection.alias)
+    keep = (
+        rows.values("cat", "event")
+        .annotate(keep=Min("pk"))
+        .values_list("keep", flat=True)
+    )
+    rows.exclude(pk__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("events", "0008_event_attendee_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="eventcategory",
+            unique_together={("cat", "event")},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.7 on 2026-10-18 05:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("events", "0009_eventcategory_unique_cat_event"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="eventattendee",
+            index=models.Index(
+                fields=["event", "status", "user"],
+                name="attendee_event_status_user_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventattendee",
+            index=models.Index(
+                condition=models.Q(("status", "waitlist")),
+                fields=["event", "joined_at", "id"],
+                name="attendee_waitlist_idx",
+            ),
+        ),
+    ]
@@ -1,4 +1,10 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .counters import COUNTED_STATUSES
+from .geo import encode_geohash
 
 
 class Event(models.Model):
@@ -19,13 +25,42 @@ class Event(models.Model):
         blank=True,
     )
     capacity = models.PositiveIntegerField(default=1)
+    # maintained by events.search.refresh_search_vectors; the GIN index
+    # is created in a Postgres-only migration
+    search_vector = SearchVectorField(null=True, editable=False)
+    # denormalized attendee counts, kept in step by EventAttendee.save()
+    # and delete(); see the reconcile_attendee_counts command
+    going_count = models.PositiveIntegerField(default=0, editable=False)
+    waitlist_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # never write the counters from a possibly stale instance; they
+        # only change through F() updates
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in COUNTED_STATUSES.values()
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["start_time"]
         verbose_name_plural = "Events"
+        indexes = [
+            # keyset pagination orderings, see events.pagination
+            models.Index(
+                fields=["start_time", "id"], name="event_start_time_id_idx"
+            ),
+            models.Index(
+                fields=["title", "start_time", "id"],
+                name="event_title_start_time_id_idx",
+            ),
+        ]
 
 
 class Location(models.Model):
@@ -35,12 +70,27 @@ class Location(models.Model):
     postcode = models.CharField(max_length=20, null=True)
     lat = models.FloatField()
     long = models.FloatField()
+    # spatial cell for proximity lookups, see events.geo.geohash_cells
+    geohash = models.CharField(
+        max_length=12, db_index=True, blank=True, editable=False
+    )
 
     def __str__(self):
         return f"{self.formatted_address}"
 
+    def save(self, *args, **kwargs):
+        self.geohash = encode_geohash(self.lat, self.long)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"lat", "long"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geohash"}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = "Locations"
+        indexes = [
+            # bounding-box prefilter for radius searches
+            models.Index(fields=["lat", "long"], name="location_lat_long_idx"),
+        ]
 
 
 class EventCategory(models.Model):
@@ -51,6 +101,11 @@ class EventCategory(models.Model):
         "Event", on_delete=models.CASCADE, related_name="event_categories"
     )
 
+    class Meta:
+        # (cat, event) order so category filters can look events up
+        # from the unique index alone
+        unique_together = ("cat", "event")
+
 
 class Category(models.Model):
     name = models.CharField(max_length=30)
@@ -89,6 +144,171 @@ class EventAttendee(models.Model):
     class Meta:
         unique_together = ("event", "user")
         verbose_name_plural = "Event Attendees"
+        indexes = [
+            # per-status counts, and "is this user going" checks (chat
+            # access), answered from the index alone
+            models.Index(
+                fields=["event", "status", "user"],
+                name="attendee_event_status_user_idx",
+            ),
+            # waitlist in promotion order
+            models.Index(
+                fields=["event", "joined_at", "id"],
+                condition=models.Q(status="waitlist"),
+                name="attendee_waitlist_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} attending {self.event.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored status so save() can move the counters
+        instance._stored_status = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        previous = None
+        if not self._state.adding:
+            previous = getattr(self, "_stored_status", None)
+            if previous is None:
+                previous = (
+                    EventAttendee.objects.filter(pk=self.pk)
+                    .values_list("status", flat=True)
+                    .first()
+                )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.move_count(previous, self.status)
+        self._stored_status = self.status
+
+    def move_count(self, old_status, new_status):
+        """
+        Apply a status transition to the event's denormalized counters.
+        Deletes (of any kind) are counted by a post_delete receiver in
+        events.signals; bulk_create() and update() callers must keep the
+        counters themselves.
+        """
+        deltas = {}
+        for status, delta in ((old_status, -1), (new_status, 1)):
+            field = COUNTED_STATUSES.get(status)
+            if field:
+                deltas[field] = deltas.get(field, 0) + delta
+        changes = {
+            field: Greatest(F(field) + delta, Value(0))
+            for field, delta in deltas.items()
+            if delta
+        }
+        if changes:
+            Event.objects.filter(pk=self.event_id).update(**changes)
+
+
+class ArchivedEvent(models.Model):
+    """
+    An ended event moved out of the Event table by the archive_events
+    command. Keeps the Event field names and ids, so the event list
+    filters and links work on either.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    host = models.ForeignKey(
+        "users.CustomUser",
+        on_delete=models.CASCADE,
+        related_name="archived_events",
+    )
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    location = models.ForeignKey(
+        "Location",
+        on_delete=models.SET_NULL,
+        related_name="archived_events",
+        null=True,
+        blank=True,
+    )
+    capacity = models.PositiveIntegerField(default=1)
+    search_vector = SearchVectorField(null=True, editable=False)
+    going_count = models.PositiveIntegerField(default=0)
+    waitlist_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        ordering = ["start_time"]
+        indexes = [
+            models.Index(
+                fields=["start_time", "id"],
+                name="archivedevent_start_id_idx",
+            ),
+        ]
+
+
+class ArchivedEventCategory(models.Model):
+    cat = models.ForeignKey(
+        "Category",
+        on_delete=models.CASCADE,
+        related_name="archived_event_categories",
+    )
+    event = models.ForeignKey(
+        "ArchivedEvent",
+        on_delete=models.CASCADE,
+        related_name="event_categories",
+    )
+
+    class Meta:
+        unique_together = ("cat", "event")
+
+
+class ArchivedEventAttendee(models.Model):
+    event = models.ForeignKey(
+        "ArchivedEvent", on_delete=models.CASCADE, related_name="attendees"
+    )
+    user = models.ForeignKey(
+        "users.CustomUser",
+        on_delete=models.CASCADE,
+        related_name="archived_attendances",
+    )
+    joined_at = models.DateTimeField()
+    status = models.CharField(max_length=20)
+
+    class Meta:
+        unique_together = ("event", "user")
+        indexes = [
+            # a user's past events (dashboard, chat index)
+            models.Index(
+                fields=["user", "status"],
+                name="archivedattendee_user_idx",
+            ),
+        ]
+
+
+class Recommendation(models.Model):
+    """
+    One of a user's top recommended upcoming events, precomputed by the
+    compute_recommendations command.
+    """
+
+    user = models.ForeignKey(
+        "users.CustomUser",
+        on_delete=models.CASCADE,
+        related_name="recommendations",
+    )
+    event = models.ForeignKey(
+        "Event", on_delete=models.CASCADE, related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        # also the index the dashboard reads a user's list through
+        unique_together = ("user", "rank")
+
+    def __str__(self):
+        return f"#{self.rank} for {self.user_id}: event {self.event_id}"
@@ -0,0 +1,241 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# sorts that support cursor (keyset) pagination, with the unique
+# ordering each one pages over
+KEYSET_ORDERINGS = {
+    "date_asc": ("start_time", "id"),
+    "date_desc": ("-start_time", "-id"),
+    "title_asc": ("title", "start_time", "id"),
+    "title_desc": ("-title", "start_time", "id"),
+}
+
+# deeper than this the page-number links switch to cursors, so OFFSET
+# scans stay short
+MAX_NUMBERED_PAGES = 10
+
+
+class Page:
+    """
+    One page of results plus what's needed to link to its neighbours,
+    either by page number (shallow pages) or by cursor.
+    """
+
+    def __init__(
+        self,
+        object_list,
+        *,
+        number=None,
+        has_next=False,
+        has_previous=False,
+        next_cursor=None,
+        previous_cursor=None,
+    ):
+        self.object_list = object_list
+        self.number = number
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def next_page_number(self):
+        return self.number + 1 if self.number else None
+
+    def previous_page_number(self):
+        return self.number - 1 if self.number else None
+
+
+def encode_cursor(sort, obj):
+    """
+    Build an opaque cursor pointing at `obj` under the given sort.
+    """
+    values = [
+        getattr(obj, field.lstrip("-")) for field in KEYSET_ORDERINGS[sort]
+    ]
+    # full isoformat: DjangoJSONEncoder would truncate microseconds and
+    # break the equality comparisons in keyset_filter()
+    values = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+    data = json.dumps([sort, values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(sort, model, cursor):
+    """
+    Decode a cursor built by encode_cursor() for `sort` back into field
+    values. Raises ValueError if it is malformed or for another sort.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, TypeError, ValueError) as exc:
+        raise ValueError("Malformed cursor.") from exc
+    ordering = KEYSET_ORDERINGS.get(sort)
+    if (
+        cursor_sort != sort
+        or not ordering
+        or not isinstance(values, list)
+        or len(values) != len(ordering)
+    ):
+        raise ValueError("Cursor does not match the current sort.")
+    try:
+        return [
+            model._meta.get_field(field.lstrip("-")).to_python(value)
+            for field, value in zip(ordering, values, strict=True)
+        ]
+    except ValidationError as exc:
+        raise ValueError("Malformed cursor.") from exc
+
+
+def keyset_filter(ordering, values, backwards=False):
+    """
+    Q object selecting the rows strictly after `values` in `ordering`
+    (or strictly before them when `backwards`).
+
+    Expands to (a > x) OR (a = x AND b > y) OR ..., plus a redundant
+    bound on the leading column so an index scan can seek straight to
+    the cursor position.
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values, strict=True):
+        name = field.lstrip("-")
+        ascending = not field.startswith("-")
+        lookup = "gt" if ascending != backwards else "lt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    name = ordering[0].lstrip("-")
+    lookup = "gte" if ordering[0].startswith("-") == backwards else "lte"
+    return Q(**{f"{name}__{lookup}": values[0]}) & condition
+
+
+def reverse_ordering(ordering):
+    return [
+        field[1:] if field.startswith("-") else f"-{field}"
+        for field in ordering
+    ]
+
+
+def page_number(params):
+    try:
+        return max(int(params.get("page", 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def paginate(queryset, params, sort, per_page):
+    """
+    Return a Page of the queryset, which must already be ordered by
+    KEYSET_ORDERINGS[sort] when the sort supports cursors.
+
+    `after`/`before` cursors in `params` seek directly to the position
+    (constant cost however deep), otherwise `page` selects a page by
+    number. No COUNT query is issued either way: one extra row is
+    fetched to tell whether there is a next page.
+    """
+    ordering = KEYSET_ORDERINGS.get(sort)
+    cursor = params.get("after") or params.get("before")
+    if ordering and cursor:
+        backwards = not params.get("after")
+        try:
+            values = decode_cursor(sort, queryset.model, cursor)
+        except ValueError:
+            values = None
+        if values is not None:
+            queryset = queryset.filter(
+                keyset_filter(ordering, values, backwards)
+            )
+            if backwards:
+                queryset = queryset.order_by(*reverse_ordering(ordering))
+            rows = list(queryset[: per_page + 1])
+            more = len(rows) > per_page
+            rows = rows[:per_page]
+            if backwards:
+                rows.reverse()
+            return Page(
+                rows,
+                has_next=bool(rows) and (backwards or more),
+                has_previous=bool(rows) and (more or not backwards),
+                next_cursor=encode_cursor(sort, rows[-1]) if rows else None,
+                previous_cursor=encode_cursor(sort, rows[0]) if rows else None,
+            )
+
+    number = page_number(params)
+    offset = (number - 1) * per_page
+    rows = list(queryset[offset : offset + per_page + 1])
+    page = Page(
+        rows[:per_page],
+        number=number,
+        has_next=len(rows) > per_page,
+        has_previous=number > 1,
+    )
+    if ordering and page.has_next and number >= MAX_NUMBERED_PAGES:
+        page.next_cursor = encode_cursor(sort, page.object_list[-1])
+    return page
+
+
+def paginate_cached(queryset, ids, complete, params, sort, per_page):
+    """
+    Like paginate(), but slice the page out of a cached, ordered list of
+    ids and load only those rows from the queryset. `complete` says
+    whether `ids` holds every result or just a leading portion.
+
+    Returns None when the requested page lies outside the cached ids
+    (or the cursor's row isn't among them); the caller then falls back
+    to paginate().
+    """
+    ordering = KEYSET_ORDERINGS.get(sort)
+    cursor = params.get("after") or params.get("before")
+    values = None
+    if ordering and cursor:
+        try:
+            values = decode_cursor(sort, queryset.model, cursor)
+        except ValueError:
+            pass
+
+    number = None
+    if values is not None:
+        # every keyset ordering ends with the id
+        try:
+            position = ids.index(values[-1])
+        except ValueError:
+            return None
+        if params.get("after"):
+            start, end = position + 1, position + 1 + per_page
+        else:
+            start, end = max(position - per_page, 0), position
+    else:
+        number = page_number(params)
+        start = (number - 1) * per_page
+        end = start + per_page
+    if end > len(ids) and not complete:
+        return None
+
+    page_ids = ids[start:end]
+    rows = queryset.in_bulk(page_ids)
+    page = Page(
+        [rows[pk] for pk in page_ids if pk in rows],
+        number=number,
+        has_next=end < len(ids) or not complete,
+        has_previous=start > 0,
+    )
+    if page.object_list and ordering:
+        if number is None:
+            page.next_cursor = encode_cursor(sort, page.object_list[-1])
+            page.previous_cursor = encode_cursor(sort, page.object_list[0])
+        elif page.has_next and number >= MAX_NUMBERED_PAGES:
+            page.next_cursor = encode_cursor(sort, page.object_list[-1])
+    return page
@@ -0,0 +1,234 @@
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .geo import EARTH_RADIUS_KM
+from .models import (
+    ArchivedEventAttendee,
+    ArchivedEventCategory,
+    Event,
+    EventAttendee,
+    EventCategory,
+    Recommendation,
+)
+
+# live and archived attendees and categories; archived events keep
+# their ids, so the two never overlap
+ATTENDEE_MODELS = (EventAttendee, ArchivedEventAttendee)
+CATEGORY_MODELS = (EventCategory, ArchivedEventCategory)
+
+TOP_K = 10
+# users scored per pass; memory grows with this times the number of
+# upcoming events
+BATCH_SIZE = 200
+# weight of category affinity vs. closeness in the final score
+CATEGORY_WEIGHT = 0.7
+DISTANCE_WEIGHT = 0.3
+# closeness halves every this many km from the user's usual area
+DISTANCE_HALF_LIFE_KM = 50
+# scores below this (nothing in common, far away) aren't worth showing
+MIN_SCORE = 0.01
+
+
+def unit_vectors(lat, lng):
+    """
+    Points on the unit sphere for arrays of lat/lng in degrees.
+    """
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.stack(
+        [np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)],
+        axis=-1,
+    )
+
+
+def category_matrix(event_ids, category_ids):
+    """
+    Binary (events x categories) matrix of which event has which
+    category.
+    """
+    event_index = {pk: i for i, pk in enumerate(event_ids)}
+    category_index = {pk: i for i, pk in enumerate(category_ids)}
+    matrix = np.zeros((len(event_ids), len(category_ids)), dtype=np.float32)
+    for model in CATEGORY_MODELS:
+        pairs = model.objects.filter(event__in=event_ids).values_list(
+            "event_id", "cat_id"
+        )
+        for event_id, cat_id in pairs.iterator(chunk_size=5000):
+            matrix[event_index[event_id], category_index[cat_id]] = 1
+    return matrix
+
+
+def cooccurrence(matrix):
+    """
+    Cosine-normalized category co-occurrence from an (events x
+    categories) matrix: how often two categories appear together,
+    relative to how common each is.
+    """
+    counts = matrix.T @ matrix
+    norms = np.sqrt(np.diag(counts))
+    norms[norms == 0] = 1
+    return counts / np.outer(norms, norms)
+
+
+def score_users(history, centers, candidates, locations, has_location):
+    """
+    Score every candidate event for each user.
+
+    `history` is the (users x categories) affinity of each user,
+    `centers` the unit vector at the centre of their past event
+    locations (zero if unknown), `candidates` the (events x categories)
+    matrix of upcoming events and `locations` their unit vectors.
+    Returns a (users x events) array of scores in [0, 1].
+    """
+    affinity = history @ candidates.T
+    peak = affinity.max(axis=1, keepdims=True)
+    peak[peak == 0] = 1
+    category_score = affinity / peak
+
+    # great-circle distance from each user's centre to each event
+    cosines = np.clip(centers @ locations.T, -1, 1)
+    distance = np.arccos(cosines) * EARTH_RADIUS_KM
+    closeness = np.exp2(-distance / DISTANCE_HALF_LIFE_KM)
+    known = centers.any(axis=1, keepdims=True) & has_location[np.newaxis, :]
+    closeness = np.where(known, closeness, 0)
+
+    return CATEGORY_WEIGHT * category_score + DISTANCE_WEIGHT * closeness
+
+
+def top_k(scores, k):
+    """
+    Return (indices, scores) of the k best columns of each row, best
+    first.
+    """
+    k = min(k, scores.shape[1])
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(best, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+def compute_recommendations(k=TOP_K, batch_size=BATCH_SIZE, now=None):
+    """
+    Rebuild the Recommendation table: the top `k` upcoming events for
+    every user who has gone to events. Users are scored in batches of
+    `batch_size`, each batch replaced in its own transaction. Returns
+    the number of users given recommendations.
+    """
+    now = now or timezone.now()
+    # history: every event a user has said they're going to, including
+    # ones since archived
+    attended = defaultdict(list)
+    for model in ATTENDEE_MODELS:
+        for user_id, event_id, lat, lng in (
+            model.objects.filter(status="going")
+            .values_list(
+                "user_id",
+                "event_id",
+                "event__location__lat",
+                "event__location__long",
+            )
+            .iterator(chunk_size=5000)
+        ):
+            attended[user_id].append((event_id, lat, lng))
+    stale = Recommendation.objects.all()
+    for model in ATTENDEE_MODELS:
+        stale = stale.exclude(
+            user__in=model.objects.filter(status="going").values("user")
+        )
+    stale.delete()
+
+    upcoming = list(
+        Event.objects.filter(start_time__gte=now)
+        .order_by("pk")
+        .values_list("pk", "host_id", "location__lat", "location__long")
+    )
+    if not upcoming:
+        Recommendation.objects.all().delete()
+        return 0
+    event_ids = [row[0] for row in upcoming]
+    hosts = np.array([row[1] for row in upcoming])
+    has_location = np.array([row[2] is not None for row in upcoming])
+    locations = unit_vectors(
+        np.array([row[2] or 0 for row in upcoming], dtype=np.float64),
+        np.array([row[3] or 0 for row in upcoming], dtype=np.float64),
+    )
+
+    # one category matrix over upcoming and attended events alike;
+    # co-occurrence is learned from all of them
+    all_ids = sorted(
+        {*event_ids}.union(
+            event_id for rows in attended.values() for event_id, *_ in rows
+        )
+    )
+    category_ids = sorted(
+        {
+            cat_id
+            for model in CATEGORY_MODELS
+            for cat_id in model.objects.filter(event__in=all_ids)
+            .values_list("cat_id", flat=True)
+            .distinct()
+        }
+    )
+    matrix = category_matrix(all_ids, category_ids)
+    related = cooccurrence(matrix)
+    position = {pk: i for i, pk in enumerate(all_ids)}
+    candidates = matrix[[position[pk] for pk in event_ids]]
+    candidate_index = {pk: i for i, pk in enumerate(event_ids)}
+
+    user_ids = sorted(attended)
+    written = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start : start + batch_size]
+        history = np.zeros((len(batch), len(category_ids)), np.float32)
+        centers = np.zeros((len(batch), 3))
+        excluded = hosts[np.newaxis, :] == np.array(batch)[:, np.newaxis]
+        for row, user_id in enumerate(batch):
+            for event_id, lat, lng in attended[user_id]:
+                history[row] += matrix[position[event_id]]
+                if lat is not None:
+                    centers[row] += unit_vectors(lat, lng)
+        # any reply, not only going: waitlisted or not-going users
+        # already know the event
+        batch_row = {user_id: row for row, user_id in enumerate(batch)}
+        for user_id, event_id in EventAttendee.objects.filter(
+            user__in=batch, event__start_time__gte=now
+        ).values_list("user_id", "event_id"):
+            if event_id in candidate_index:
+                excluded[batch_row[user_id], candidate_index[event_id]] = True
+        norms = np.linalg.norm(centers, axis=1, keepdims=True)
+        centers = np.divide(
+            centers, norms, out=np.zeros_like(centers), where=norms > 0
+        )
+
+        # spread each user's categories to the ones they co-occur with
+        scores = score_users(
+            history @ related, centers, candidates, locations, has_location
+        )
+        scores[excluded] = -np.inf
+        best, best_scores = top_k(scores, k)
+
+        rows = [
+            Recommendation(
+                user_id=user_id,
+                event_id=event_ids[index],
+                rank=rank,
+                score=float(score),
+            )
+            for user_id, indices, user_scores in zip(
+                batch, best, best_scores, strict=True
+            )
+            for rank, (index, score) in enumerate(
+                zip(indices, user_scores, strict=True), start=1
+            )
+            if score >= MIN_SCORE
+        ]
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=batch).delete()
+            Recommendation.objects.bulk_create(rows)
+        written += len({row.user_id for row in rows})
+    return written
@@ -0,0 +1,156 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+    TrigramWordSimilarity,
+)
+from django.db import connections
+from django.db.models import F, OuterRef, Q, StringAgg, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Location
+
+SEARCH_CONFIG = "english"
+
+# annotations that make up the "relevance" sort, strongest first
+RELEVANCE_ANNOTATIONS = ("rank", "city_similarity", "country_similarity")
+
+
+def is_postgres(queryset):
+    """
+    Return True if the queryset will run against PostgreSQL.
+    """
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def search_vector(model):
+    """
+    Build the weighted search vector expression for an Event model.
+
+    Title ranks highest, then category names, then the address/city,
+    then the description.
+    """
+    event_categories = model._meta.get_field("event_categories").related_model
+    category_names = (
+        event_categories.objects.filter(event=OuterRef("pk"))
+        .order_by()
+        .values("event")
+        .annotate(names=StringAgg("cat__name", Value(" ")))
+        .values("names")
+    )
+    return (
+        SearchVector("title", config=SEARCH_CONFIG, weight="A")
+        + SearchVector(
+            Subquery(category_names), config=SEARCH_CONFIG, weight="B"
+        )
+        + SearchVector(
+            "location__city",
+            "location__formatted_address",
+            config=SEARCH_CONFIG,
+            weight="C",
+        )
+        + SearchVector("description", config=SEARCH_CONFIG, weight="D")
+    )
+
+
+def refresh_search_vectors(events):
+    """
+    Recompute the stored search vector for every event in the queryset.
+
+    No-op outside PostgreSQL, where searching falls back to icontains.
+    """
+    if not is_postgres(events):
+        return
+    vectors = (
+        events.model.objects.filter(pk=OuterRef("pk"))
+        .order_by()
+        .annotate(vector=search_vector(events.model))
+        .values("vector")
+    )
+    events.order_by().update(search_vector=Subquery(vectors))
+
+
+def build_search_query(text):
+    """
+    Turn free text into a prefix-matching tsquery, so partially typed
+    words still match. Returns None if the text has no searchable terms.
+    """
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return None
+    return SearchQuery(
+        " & ".join(f"{term}:*" for term in terms),
+        config=SEARCH_CONFIG,
+        search_type="raw",
+    )
+
+
+def search_events(events, text):
+    """
+    Filter events by free text.
+
+    On PostgreSQL this matches against the stored search vector (GIN
+    indexed) and annotates a `rank` for relevance ordering. Other
+    backends fall back to title/address icontains matching.
+    """
+    if not is_postgres(events):
+        return events.filter(
+            Q(title__icontains=text)
+            | Q(location__formatted_address__icontains=text)
+        )
+    query = build_search_query(text)
+    if query is None:
+        return events
+    return events.filter(search_vector=query).annotate(
+        rank=SearchRank(F("search_vector"), query)
+    )
+
+
+def filter_by_place(events, field, text):
+    """
+    Filter events by the `city` or `country` of their location.
+
+    On PostgreSQL this is a typo-tolerant trigram match (served by the
+    gin_trgm_ops indexes) that falls back to the formatted address when
+    the field is empty, and annotates `<field>_similarity` for
+    ordering. Other backends use a plain icontains match.
+    """
+    if not is_postgres(events):
+        return events.filter(**{f"location__{field}__icontains": text})
+
+    # resolve matching locations first so the planner can use the
+    # trigram indexes on Location before joining back to events. iregex
+    # rather than icontains: Django compiles icontains to UPPER(col) LIKE,
+    # which the gin_trgm_ops index can't serve, while ~* can use it
+    locations = Location.objects.filter(
+        Q(**{f"{field}__iregex": re.escape(text)})
+        | Q(**{f"{field}__trigram_similar": text})
+        | Q(
+            **{
+                f"{field}__isnull": True,
+                "formatted_address__trigram_word_similar": text,
+            }
+        )
+    )
+    return events.filter(location__in=locations).annotate(
+        **{
+            f"{field}_similarity": Coalesce(
+                TrigramSimilarity(f"location__{field}", text),
+                TrigramWordSimilarity(text, "location__formatted_address"),
+            )
+        }
+    )
+
+
+def relevance_ordering(events):
+    """
+    Return the order_by() terms for sorting by relevance, based on the
+    search/similarity annotations present on the queryset.
+    """
+    annotations = events.query.annotations
+    return [
+        f"-{name}" for name in RELEVANCE_ANNOTATIONS if name in annotations
+    ]
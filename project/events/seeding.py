@@ -0,0 +1,265 @@
+import random
+from itertools import accumulate
+
+from chat.models import ChatMessage
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_results
+from .geo import encode_geohash
+from .models import Category, Event, EventAttendee, EventCategory, Location
+from .search import refresh_search_vectors
+
+# seeded rows are recognisable by these, so they can be flushed
+SEED_USERNAME = "seed-user-{:06d}"
+SEED_USERNAME_PREFIX = "seed-user-"
+SEED_ADDRESS = "Seed location {}"
+SEED_ADDRESS_PREFIX = "Seed location "
+SEED_CATEGORY = "Seed topic {}"
+SEED_CATEGORY_PREFIX = "Seed topic "
+
+BATCH_SIZE = 2000
+# events start between this many days ago and DAYS_AHEAD from now
+DAYS_BEHIND = 90
+DAYS_AHEAD = 180
+CITIES = 40
+# zipf exponent: a few cities, hosts, categories and events get most of
+# the activity, as in real traffic
+SKEW = 1.1
+WORDS = [
+    word
+    for line in (
+        "music jazz rock festival night market food wine tasting tour walk",
+        "run yoga meetup talk workshop coding design art gallery film",
+        "theatre comedy quiz games family kids outdoor hike cycle river",
+        "park garden history museum science book club language exchange",
+        "dance salsa party open air concert choir startup networking",
+    )
+    for word in line.split()
+]
+
+
+class Skewed:
+    """
+    Zipf-distributed choices over range(n): 0 is the most popular.
+    """
+
+    def __init__(self, rng, n, skew=SKEW):
+        self.rng = rng
+        self.n = n
+        self.cumulative = list(
+            accumulate(1 / (rank + 1) ** skew for rank in range(n))
+        )
+
+    def pick(self, k=None):
+        picks = self.rng.choices(
+            range(self.n), cum_weights=self.cumulative, k=k or 1
+        )
+        return picks if k else picks[0]
+
+
+def flush_seed_data():
+    """
+    Delete everything seed_events created: its users (with their events,
+    attendees and messages), locations and categories.
+    """
+    User = get_user_model()
+    # events first: their attendees then go without counter updates
+    Event.objects.filter(
+        host__username__startswith=SEED_USERNAME_PREFIX
+    ).delete()
+    User.objects.filter(username__startswith=SEED_USERNAME_PREFIX).delete()
+    Location.objects.filter(
+        formatted_address__startswith=SEED_ADDRESS_PREFIX
+    ).delete()
+    Category.objects.filter(name__startswith=SEED_CATEGORY_PREFIX).delete()
+    invalidate_results()
+
+
+def seed_events(
+    *,
+    users=1000,
+    locations=2000,
+    events=20000,
+    categories=50,
+    attendees=100_000,
+    messages=50_000,
+    seed=0,
+    now=None,
+):
+    """
+    Create a reproducible synthetic dataset: the same arguments and seed
+    always give the same rows (apart from ids and timestamps set on
+    insert). Returns a dict of the number of rows created per kind.
+    """
+    rng = random.Random(seed)
+    now = now or timezone.now()
+    User = get_user_model()
+    created = {}
+
+    with transaction.atomic():
+        # unusable passwords: hashing thousands would dominate the run
+        seeded_users = User.objects.bulk_create(
+            (
+                User(
+                    username=SEED_USERNAME.format(i),
+                    email=f"{SEED_USERNAME.format(i)}@example.com",
+                    password="!",
+                )
+                for i in range(users)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        created["users"] = len(seeded_users)
+
+        # locations cluster around a few cities of skewed popularity
+        centres = [
+            (rng.uniform(-40, 60), rng.uniform(-120, 140))
+            for _ in range(CITIES)
+        ]
+        city_picker = Skewed(rng, CITIES)
+        seeded_locations = []
+        for i in range(locations):
+            city = city_picker.pick()
+            lat = centres[city][0] + rng.gauss(0, 0.1)
+            lng = centres[city][1] + rng.gauss(0, 0.1)
+            seeded_locations.append(
+                Location(
+                    formatted_address=SEED_ADDRESS.format(i),
+                    city=f"City {city:02d}",
+                    country=f"Country {city % 8}",
+                    lat=lat,
+                    long=lng,
+                    geohash=encode_geohash(lat, lng),
+                )
+            )
+        seeded_locations = Location.objects.bulk_create(
+            seeded_locations, batch_size=BATCH_SIZE
+        )
+        created["locations"] = len(seeded_locations)
+
+        seeded_categories = Category.objects.bulk_create(
+            Category(name=SEED_CATEGORY.format(i)) for i in range(categories)
+        )
+        created["categories"] = len(seeded_categories)
+
+        # event shapes first, so attendee counts are known before insert
+        host_picker = Skewed(rng, users)
+        location_picker = Skewed(rng, locations)
+        category_picker = Skewed(rng, categories)
+        specs = []
+        for i in range(events):
+            start = now + timezone.timedelta(
+                minutes=rng.randrange(-DAYS_BEHIND, DAYS_AHEAD) * 24 * 60
+                + rng.randrange(24 * 60)
+            )
+            specs.append(
+                {
+                    "host": host_picker.pick(),
+                    "location": location_picker.pick(),
+                    "categories": set(category_picker.pick(rng.randint(1, 3))),
+                    "title": f"Event {i} {rng.choice(WORDS)}",
+                    "description": " ".join(rng.choices(WORDS, k=30)),
+                    "start_time": start,
+                    "capacity": rng.choice((10, 20, 50, 100, 500)),
+                }
+            )
+
+        # hosts go to their own events; everyone else picks popular
+        # events more often
+        statuses = [{spec["host"]: "going"} for spec in specs]
+        going = [1] * events
+        event_picker = Skewed(rng, events)
+        user_picker = Skewed(rng, users, skew=0.8)
+        target = min(attendees, events * users)
+        total, tries = events, 0
+        while total < target and tries < target * 3:
+            tries += 1
+            event, user = event_picker.pick(), user_picker.pick()
+            if user in statuses[event]:
+                continue
+            total += 1
+            if rng.random() < 0.05:
+                statuses[event][user] = "not_going"
+            elif going[event] < specs[event]["capacity"]:
+                statuses[event][user] = "going"
+                going[event] += 1
+            else:
+                statuses[event][user] = "waitlist"
+
+        seeded_events = Event.objects.bulk_create(
+            (
+                Event(
+                    host=seeded_users[spec["host"]],
+                    location=seeded_locations[spec["location"]],
+                    title=spec["title"],
+                    description=spec["description"],
+                    start_time=spec["start_time"],
+                    end_time=spec["start_time"]
+                    + timezone.timedelta(hours=rng.choice((1, 2, 3, 6))),
+                    capacity=spec["capacity"],
+                    going_count=going[i],
+                    waitlist_count=list(statuses[i].values()).count(
+                        "waitlist"
+                    ),
+                )
+                for i, spec in enumerate(specs)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        created["events"] = len(seeded_events)
+
+        EventCategory.objects.bulk_create(
+            (
+                EventCategory(event=event, cat=seeded_categories[cat])
+                for event, spec in zip(seeded_events, specs, strict=True)
+                for cat in sorted(spec["categories"])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        created["attendees"] = len(
+            EventAttendee.objects.bulk_create(
+                (
+                    EventAttendee(
+                        event=event, user=seeded_users[user], status=status
+                    )
+                    for event, by_user in zip(
+                        seeded_events, statuses, strict=True
+                    )
+                    for user, status in by_user.items()
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        )
+
+        # chat happens in busy rooms, among the people going
+        rooms = [
+            (event, [u for u, s in by_user.items() if s == "going"])
+            for event, by_user in zip(seeded_events, statuses, strict=True)
+        ]
+        rooms.sort(key=lambda room: -len(room[1]))
+        room_picker = Skewed(rng, len(rooms))
+        created["messages"] = len(
+            ChatMessage.objects.bulk_create(
+                (
+                    ChatMessage(
+                        event=rooms[room][0],
+                        user=seeded_users[rng.choice(rooms[room][1])],
+                        content=" ".join(rng.choices(WORDS, k=8)),
+                    )
+                    for room in room_picker.pick(messages)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            if messages and rooms
+            else []
+        )
+
+        refresh_search_vectors(
+            Event.objects.filter(
+                host__username__startswith=SEED_USERNAME_PREFIX
+            )
+        )
+        invalidate_results()
+    return created
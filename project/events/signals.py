@@ -0,0 +1,98 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete
+from .cache import invalidate_results
+from .models import Category, Event, EventAttendee, EventCategory, Location
+from .search import refresh_search_vectors
+
+SEARCHABLE_EVENT_FIELDS = {"title", "description", "location"}
+
+
+@receiver(post_save, sender=Event)
+def refresh_event_search_vector(sender, instance, update_fields=None, **kw):
+    """
+    Keep the stored search vector current when an event is saved.
+    """
+    if update_fields and not SEARCHABLE_EVENT_FIELDS & set(update_fields):
+        return
+    refresh_search_vectors(Event.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Location)
+def refresh_location_search_vectors(sender, instance, created, **kwargs):
+    """
+    Address and city are part of the event search vector, so re-index
+    every event at a location when it changes.
+    """
+    if created:
+        return
+    refresh_search_vectors(instance.events.all())
+
+
+@receiver(post_delete, sender=EventAttendee)
+def release_attendee_count(sender, instance, origin=None, **kwargs):
+    """
+    Take a deleted attendee off its event's counters, however it was
+    deleted: on its own, in a queryset, or in a cascade from its user.
+    """
+    # the counters are going with the event
+    if isinstance(origin, Event) or getattr(origin, "model", None) is Event:
+        return
+    status = getattr(instance, "_stored_status", None) or instance.status
+    instance.move_count(status, None)
+
+
+# attendee changes don't alter which events match a filter or their
+# order (cached pages are hydrated with live counts), so EventAttendee
+# writes deliberately don't invalidate result ids
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=EventCategory)
+@receiver(post_delete, sender=EventCategory)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_event_results(sender, **kwargs):
+    """
+    Drop cached event list results after any write that can change them.
+    """
+    invalidate_results()
+
+
+# autocomplete counts are refreshed after commit, and passed on to
+# other processes' indexes (see autocomplete.refresh)
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def refresh_location_suggestions(sender, instance, **kwargs):
+    """
+    Cities and countries are ranked by their number of events.
+    """
+    location_id = instance.pk if sender is Location else instance.location_id
+    if location_id:
+        transaction.on_commit(
+            partial(autocomplete.refresh_location, location_id)
+        )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=EventCategory)
+@receiver(post_delete, sender=EventCategory)
+def refresh_category_suggestions(sender, instance, **kwargs):
+    """
+    Categories are ranked by their number of events.
+    """
+    cat_id = instance.pk if sender is Category else instance.cat_id
+    transaction.on_commit(partial(autocomplete.refresh_category, cat_id))
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestion(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(autocomplete.refresh, "category", [instance.name])
+    )
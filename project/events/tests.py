@@ -1,10 +1,59 @@
+import json
+import time
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
+
+import numpy
+from chat.models import ArchivedChatMessage, ChatMessage
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import http_date
 
+from events import autocomplete
+from events.api import DEFAULT_API_FIELDS
+from events.archive import archive_events
+from events.autocomplete import PrefixIndex, suggest
+from events.benchmarks import busiest_user, compare, run_benchmarks
+from events.cache import stats as cache_stats
+from events.counters import reconcile_attendee_counts
+from events.facets import FACET_LIMIT, category_facets
+from events.filters import filter_by_categories
 from events.forms import BaseEventForm
-from events.models import Event, EventAttendee, Location
+from events.fragments import render_event_cards
+from events.geo import (
+    bounding_box,
+    encode_geohash,
+    geohash_cells,
+    haversine,
+)
+from events.importer import EventImporter, read_rows
+from events.models import (
+    ArchivedEvent,
+    ArchivedEventAttendee,
+    Category,
+    Event,
+    EventAttendee,
+    EventCategory,
+    Location,
+    Recommendation,
+)
+from events.pagination import (
+    KEYSET_ORDERINGS,
+    MAX_NUMBERED_PAGES,
+    encode_cursor,
+    paginate,
+)
+from events.recommendations import compute_recommendations, top_k
+from events.seeding import flush_seed_data, seed_events
+from events.tiles import EVENTS_ZOOM, build_tiles, viewport_tiles
 
 
 class SmokeTests(TestCase):
@@ -257,3 +306,1822 @@ class EventBehaviorTests(TestCase):
         self,
     ):
         pass
+
+
+class EventSearchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.host)
+
+    def create_event(self, **kwargs):
+        kwargs.setdefault("host", self.host)
+        kwargs.setdefault("description", "Desc")
+        kwargs.setdefault(
+            "start_time", timezone.now() + timezone.timedelta(days=1)
+        )
+        kwargs.setdefault(
+            "end_time", timezone.now() + timezone.timedelta(days=2)
+        )
+        return Event.objects.create(**kwargs)
+
+    def test_search_matches_title_and_address(self):
+        location = Location.objects.create(
+            formatted_address="1 Harbour Street",
+            city="Harbourtown",
+            lat=1,
+            long=1,
+        )
+        self.create_event(title="Jazz night")
+        self.create_event(title="Quiz", location=location)
+        self.create_event(title="Unrelated")
+
+        response = self.client.get(f"{reverse('events:view_events')}?q=jazz")
+        self.assertContains(response, "Jazz night")
+        self.assertNotContains(response, "Unrelated")
+
+        response = self.client.get(
+            f"{reverse('events:view_events')}?q=harbour"
+        )
+        self.assertContains(response, "Quiz")
+        self.assertNotContains(response, "Jazz night")
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_search_ranks_title_matches_above_description_matches(self):
+        self.create_event(title="Board games", description="Chess club")
+        self.create_event(title="Chess tournament")
+
+        response = self.client.get(f"{reverse('events:view_events')}?q=ches")
+        content = response.content.decode()
+        self.assertLess(
+            content.find("Chess tournament"), content.find("Board games")
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_search_vector_includes_categories_and_tracks_location(self):
+        form = BaseEventForm(
+            data={
+                "title": "Meetup",
+                "description": "Desc",
+                "start_time": (
+                    timezone.now() + timezone.timedelta(days=1)
+                ).strftime("%Y-%m-%dT%H:%M"),
+                "end_time": (
+                    timezone.now() + timezone.timedelta(days=2)
+                ).strftime("%Y-%m-%dT%H:%M"),
+                "capacity": 1,
+                "categories": "Photography",
+                "formatted_address": "Old address",
+                "lat": 1,
+                "long": 1,
+            }
+        )
+        self.assertTrue(form.is_valid())
+        event = form.save(commit=True, host=self.host)
+
+        response = self.client.get(
+            f"{reverse('events:view_events')}?q=photography"
+        )
+        self.assertContains(response, "Meetup")
+
+        event.location.city = "Lisbon"
+        event.location.save()
+        response = self.client.get(f"{reverse('events:view_events')}?q=lisbon")
+        self.assertContains(response, "Meetup")
+
+    def test_city_and_country_filters_match_substrings(self):
+        london = Location.objects.create(
+            formatted_address="1 Road",
+            city="London",
+            country="United Kingdom",
+            lat=1,
+            long=1,
+        )
+        paris = Location.objects.create(
+            formatted_address="2 Rue",
+            city="Paris",
+            country="France",
+            lat=2,
+            long=2,
+        )
+        self.create_event(title="London event", location=london)
+        self.create_event(title="Paris event", location=paris)
+
+        response = self.client.get(
+            f"{reverse('events:view_events')}?city=ondo"
+        )
+        self.assertContains(response, "London event")
+        self.assertNotContains(response, "Paris event")
+
+        response = self.client.get(
+            f"{reverse('events:view_events')}?country=franc"
+        )
+        self.assertContains(response, "Paris event")
+        self.assertNotContains(response, "London event")
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_city_filter_tolerates_typos_and_orders_by_similarity(self):
+        exact = Location.objects.create(
+            formatted_address="1 Road", city="Londen", lat=1, long=1
+        )
+        close = Location.objects.create(
+            formatted_address="2 Road", city="London", lat=2, long=2
+        )
+        self.create_event(
+            title="Close match",
+            location=close,
+            start_time=timezone.now() + timezone.timedelta(hours=1),
+        )
+        self.create_event(title="Exact match", location=exact)
+
+        response = self.client.get(
+            f"{reverse('events:view_events')}?city=londen"
+        )
+        content = response.content.decode()
+        self.assertIn("Close match", content)
+        self.assertLess(
+            content.find("Exact match"), content.find("Close match")
+        )
+
+
+class RadiusSearchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.host)
+        # central London, ~5 km away in Camden, and Paris (~340 km)
+        for title, lat, lng in [
+            ("Centre event", 51.5074, -0.1278),
+            ("Camden event", 51.5517, -0.1588),
+            ("Paris event", 48.8566, 2.3522),
+        ]:
+            Event.objects.create(
+                host=self.host,
+                title=title,
+                description="Desc",
+                start_time=timezone.now() + timezone.timedelta(days=1),
+                end_time=timezone.now() + timezone.timedelta(days=2),
+                location=Location.objects.create(
+                    formatted_address=title, lat=lat, long=lng
+                ),
+            )
+
+    def test_bounding_box_contains_radius(self):
+        min_lat, max_lat, min_lng, max_lng = bounding_box(51.5, -0.1, 10)
+        self.assertAlmostEqual(haversine(51.5, -0.1, min_lat, -0.1), 10)
+        self.assertAlmostEqual(haversine(51.5, -0.1, max_lat, -0.1), 10)
+        # the box is at least as wide as the circle at the centre latitude
+        self.assertGreaterEqual(haversine(51.5, -0.1, 51.5, min_lng), 10)
+        self.assertGreaterEqual(haversine(51.5, -0.1, 51.5, max_lng), 10)
+        self.assertEqual(bounding_box(89.99, 0, 10)[2:], (-180.0, 180.0))
+
+    def test_view_events_filters_and_sorts_by_distance(self):
+        response = self.client.get(
+            reverse("events:view_events"),
+            {"lat": 51.55, "lng": -0.16, "radius_km": 10},
+        )
+        content = response.content.decode()
+        self.assertNotIn("Paris event", content)
+        self.assertLess(
+            content.find("Camden event"), content.find("Centre event")
+        )
+
+    def test_nearby_events_endpoint(self):
+        response = self.client.get(
+            reverse("events:nearby_events"),
+            {"lat": 51.5074, "lng": -0.1278, "radius_km": 400},
+        )
+        self.assertEqual(response.status_code, 200)
+        events = response.json()["events"]
+        self.assertEqual(
+            [event["title"] for event in events],
+            ["Centre event", "Camden event", "Paris event"],
+        )
+        self.assertAlmostEqual(events[2]["distance_km"], 343.5, delta=1)
+
+        response = self.client.get(
+            reverse("events:nearby_events"), {"lat": 100, "lng": 0}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_location_geohash_maintained_on_save(self):
+        location = Location.objects.get(formatted_address="Centre event")
+        self.assertEqual(location.geohash, encode_geohash(51.5074, -0.1278))
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+
+        location.lat, location.long = 48.8566, 2.3522
+        location.save(update_fields=["lat", "long"])
+        location.refresh_from_db()
+        self.assertTrue(location.geohash.startswith("u09t"))
+
+        Location.objects.update(geohash="")
+        call_command("backfill_geohashes", stdout=StringIO())
+        self.assertFalse(Location.objects.filter(geohash="").exists())
+
+    def test_geohash_cells_cover_radius(self):
+        lat, lng, radius_km = 51.5074, -0.1278, 5
+        cells = geohash_cells(lat, lng, radius_km)
+        for bearing_lat, bearing_lng in [
+            (0.0449, 0),
+            (-0.0449, 0),
+            (0, 0.0722),
+            (0, -0.0722),
+        ]:
+            point_lat, point_lng = lat + bearing_lat, lng + bearing_lng
+            self.assertLess(
+                haversine(lat, lng, point_lat, point_lng), radius_km
+            )
+            self.assertTrue(
+                any(
+                    encode_geohash(point_lat, point_lng).startswith(cell)
+                    for cell in cells
+                )
+            )
+        # across the antimeridian the neighbouring cells wrap around
+        cells = geohash_cells(0, 179.99, 5)
+        self.assertTrue(
+            any(encode_geohash(0, -179.99).startswith(c) for c in cells)
+        )
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        start = timezone.now() + timezone.timedelta(days=1)
+        # pairs of events share a start time to exercise the id tiebreak
+        self.events = [
+            Event.objects.create(
+                host=self.host,
+                title=f"Event {i:02d}",
+                description="Desc",
+                start_time=start + timezone.timedelta(hours=i // 2),
+                end_time=start + timezone.timedelta(days=1),
+            )
+            for i in range(25)
+        ]
+
+    def walk(self, sort, per_page=10):
+        pages = []
+        page = paginate(
+            Event.objects.order_by(*KEYSET_ORDERINGS[sort]),
+            {},
+            sort,
+            per_page,
+        )
+        pages.append(page)
+        while page.has_next:
+            page = paginate(
+                Event.objects.order_by(*KEYSET_ORDERINGS[sort]),
+                {"after": encode_cursor(sort, page.object_list[-1])},
+                sort,
+                per_page,
+            )
+            pages.append(page)
+        return pages
+
+    def test_cursor_pages_match_offset_order(self):
+        for sort in KEYSET_ORDERINGS:
+            with self.subTest(sort=sort):
+                expected = list(
+                    Event.objects.order_by(*KEYSET_ORDERINGS[sort])
+                )
+                pages = self.walk(sort)
+                self.assertEqual(
+                    [event for page in pages for event in page], expected
+                )
+                self.assertEqual([len(page) for page in pages], [10, 10, 5])
+
+                # stepping back from the last page returns the middle one
+                previous = paginate(
+                    Event.objects.order_by(*KEYSET_ORDERINGS[sort]),
+                    {"before": pages[2].previous_cursor},
+                    sort,
+                    10,
+                )
+                self.assertEqual(previous.object_list, pages[1].object_list)
+                self.assertTrue(previous.has_previous)
+
+    def test_cursor_page_skips_count_and_offset(self):
+        self.client.force_login(self.host)
+        cursor = encode_cursor("date_asc", self.events[9])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("events:view_events"),
+                {"sort": "date_asc", "after": cursor},
+            )
+        self.assertContains(response, "Event 10")
+        self.assertNotContains(response, "Event 09")
+        sql = " ".join(query["sql"] for query in queries).upper()
+        self.assertNotIn("COUNT(*)", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self.client.force_login(self.host)
+        response = self.client.get(
+            reverse("events:view_events"), {"after": "not-a-cursor"}
+        )
+        self.assertContains(response, "Event 00")
+        self.assertContains(response, "page=2")
+
+    def test_deep_numbered_pages_switch_to_cursors(self):
+        page = paginate(
+            Event.objects.order_by(*KEYSET_ORDERINGS["date_asc"]),
+            {"page": MAX_NUMBERED_PAGES},
+            "date_asc",
+            2,
+        )
+        self.assertEqual(page.number, MAX_NUMBERED_PAGES)
+        self.assertIsNotNone(page.next_cursor)
+
+
+class AttendeeCounterTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f"user{i}",
+                email=f"user{i}@example.com",
+                password="pass12345",
+            )
+            for i in range(3)
+        ]
+        self.event = Event.objects.create(
+            host=self.host,
+            title="Test event",
+            description="Desc",
+            start_time=timezone.now() + timezone.timedelta(days=1),
+            end_time=timezone.now() + timezone.timedelta(days=2),
+            capacity=2,
+        )
+
+    def assertCounts(self, going, waitlist):
+        self.event.refresh_from_db()
+        self.assertEqual(
+            (self.event.going_count, self.event.waitlist_count),
+            (going, waitlist),
+        )
+
+    def test_counters_follow_status_transitions(self):
+        for user in self.users:
+            self.client.force_login(user)
+            self.client.post(
+                reverse(
+                    "events:join_event", kwargs={"event_id": self.event.pk}
+                )
+            )
+        self.assertCounts(2, 1)
+
+        self.client.force_login(self.users[0])
+        self.client.post(
+            reverse("events:leave_event", kwargs={"event_id": self.event.pk})
+        )
+        # the waitlisted user took the free place
+        self.assertCounts(2, 0)
+
+        self.client.force_login(self.host)
+        url = reverse(
+            "events:change_attendee_status",
+            kwargs={"event_id": self.event.pk},
+        )
+        attendee = EventAttendee.objects.get(
+            event=self.event, user=self.users[1]
+        )
+        self.client.post(
+            url, {"attendee_id": attendee.pk, "status": "waitlist"}
+        )
+        self.assertCounts(1, 1)
+        self.client.post(url, {"attendee_id": attendee.pk, "action": "remove"})
+        self.assertCounts(1, 0)
+
+    def test_cascade_and_queryset_deletes_move_counters(self):
+        for user, status in zip(
+            self.users, ["going", "going", "waitlist"], strict=True
+        ):
+            EventAttendee.objects.create(
+                event=self.event, user=user, status=status
+            )
+        self.users[0].delete()
+        self.assertCounts(1, 1)
+        EventAttendee.objects.filter(status="waitlist").delete()
+        self.assertCounts(1, 0)
+
+    def test_event_save_does_not_overwrite_counters(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        EventAttendee.objects.create(
+            event=self.event, user=self.users[0], status="going"
+        )
+        stale.title = "Renamed"
+        stale.save()
+        self.assertCounts(1, 0)
+
+    def test_reconcile_command_repairs_drift(self):
+        EventAttendee.objects.create(
+            event=self.event, user=self.users[0], status="going"
+        )
+        EventAttendee.objects.create(
+            event=self.event, user=self.users[1], status="waitlist"
+        )
+        Event.objects.filter(pk=self.event.pk).update(
+            going_count=5, waitlist_count=0
+        )
+        out = StringIO()
+        call_command("reconcile_attendee_counts", stdout=out)
+        self.assertIn("Repaired 1 events", out.getvalue())
+        self.assertCounts(1, 1)
+
+    def test_event_list_shows_going_count_without_aggregating(self):
+        EventAttendee.objects.create(
+            event=self.event, user=self.users[0], status="going"
+        )
+        EventAttendee.objects.create(
+            event=self.event, user=self.users[1], status="waitlist"
+        )
+        EventAttendee.objects.create(
+            event=self.event, user=self.users[2], status="not_going"
+        )
+        self.client.force_login(self.host)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("events:view_events"))
+        self.assertContains(response, "<strong>Attendees:</strong> 1<")
+
+        # the result ids query and the page's rows query
+        list_queries = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('SELECT "events_event"."id"')
+        ]
+        self.assertTrue(list_queries)
+        for list_sql in list_queries:
+            self.assertNotIn("GROUP BY", list_sql)
+            self.assertNotIn("events_eventattendee", list_sql)
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN {list_sql}")
+                plan = " ".join(str(row) for row in cursor.fetchall())
+            self.assertNotIn("Aggregate", plan)
+            self.assertNotIn("GROUP BY", plan)
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        start = timezone.now() + timezone.timedelta(days=1)
+        self.events = [
+            Event.objects.create(
+                host=self.host,
+                title=f"Event {i:02d}",
+                description="Desc",
+                start_time=start + timezone.timedelta(hours=i),
+                end_time=start + timezone.timedelta(days=1),
+            )
+            for i in range(15)
+        ]
+        self.client.force_login(self.host)
+        self.url = reverse("events:view_events")
+
+    def test_repeat_request_hits_cache(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"page": 2})
+        self.assertEqual(len(response.context["events"]), 5)
+        self.assertEqual(
+            [e.title for e in response.context["events"]],
+            [f"Event {i:02d}" for i in range(10, 15)],
+        )
+        # no ordered scan of the filtered events, just the page by id
+        self.assertFalse(
+            any(
+                query["sql"].startswith('SELECT "events_event"."id"')
+                and " LIMIT " in query["sql"]
+                for query in queries
+            )
+        )
+        counts = cache_stats()
+        self.assertEqual((counts["hits"], counts["misses"]), (1, 1))
+
+    def test_equivalent_filters_share_an_entry(self):
+        self.client.get(self.url, {"q": "event", "city": " Paris "})
+        self.client.get(self.url, {"q": "  EVENT ", "city": "paris"})
+        self.assertEqual(cache_stats()["hits"], 1)
+
+    def test_cursor_pages_served_from_cache(self):
+        first = self.client.get(self.url).context["page_obj"]
+        self.assertTrue(first.has_next)
+        page = paginate(
+            Event.objects.order_by(*KEYSET_ORDERINGS["date_asc"]),
+            {"page": 1},
+            "date_asc",
+            10,
+        )
+        response = self.client.get(
+            self.url,
+            {"after": encode_cursor("date_asc", page.object_list[-1])},
+        )
+        page_obj = response.context["page_obj"]
+        self.assertEqual(
+            [e.title for e in page_obj],
+            [f"Event {i:02d}" for i in range(10, 15)],
+        )
+        self.assertFalse(page_obj.has_next)
+        self.assertTrue(page_obj.has_previous)
+        self.assertEqual(cache_stats()["hits"], 1)
+
+    def test_event_writes_invalidate_results(self):
+        self.client.get(self.url)
+        self.events[0].title = "Renamed"
+        self.events[0].save()
+        response = self.client.get(self.url)
+        self.assertContains(response, "Renamed")
+        self.assertEqual(cache_stats()["misses"], 2)
+
+        self.events[1].delete()
+        response = self.client.get(self.url)
+        self.assertNotContains(response, "Event 01")
+        self.assertEqual(cache_stats()["misses"], 3)
+
+    def test_attendee_writes_keep_results_cached(self):
+        self.client.get(self.url)
+        EventAttendee.objects.create(
+            event=self.events[0], user=self.host, status="going"
+        )
+        response = self.client.get(self.url)
+        # counts are read live from the hydrated rows
+        self.assertContains(response, "<strong>Attendees:</strong> 1<")
+        self.assertEqual(cache_stats()["hits"], 1)
+
+    def test_stats_command(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        out = StringIO()
+        call_command("event_cache_stats", "--reset", stdout=out)
+        self.assertIn("hits: 1  misses: 1  hit rate: 50.0%", out.getvalue())
+        self.assertEqual(cache_stats()["hits"], 0)
+
+
+class CategoryFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.host)
+        now = timezone.now()
+        self.categories = [
+            Category.objects.create(name=f"Cat {i:02d}") for i in range(12)
+        ]
+        # category i is on events 0..i, so later categories count higher
+        for i in range(12):
+            event = Event.objects.create(
+                host=self.host,
+                title=f"Event {i:02d}",
+                description="Desc",
+                start_time=now + timezone.timedelta(days=1),
+                end_time=now + timezone.timedelta(days=2),
+            )
+            for cat in self.categories[i:]:
+                EventCategory.objects.create(event=event, cat=cat)
+        past = Event.objects.create(
+            host=self.host,
+            title="Past",
+            description="Desc",
+            start_time=now - timezone.timedelta(days=2),
+            end_time=now - timezone.timedelta(days=1),
+        )
+        EventCategory.objects.create(event=past, cat=self.categories[0])
+
+    def test_counts_upcoming_events_in_one_query(self):
+        with self.assertNumQueries(1):
+            facets = category_facets(Event.objects.all())
+        self.assertEqual(facets[0], ("Cat 11", 12))
+        # the past event isn't counted
+        self.assertEqual(facets[-1], ("Cat 00", 1))
+
+    def test_counts_follow_other_filters_but_not_categories(self):
+        response = self.client.get(
+            reverse("events:view_events"),
+            {"q": "Event 00", "category": "Cat 00"},
+        )
+        self.assertEqual(
+            response.context["categories"][:2],
+            [("Cat 00", 1), ("Cat 01", 1)],
+        )
+
+    def test_panel_shows_top_categories_and_selected(self):
+        response = self.client.get(
+            reverse("events:view_events"), {"category": "Cat 00"}
+        )
+        names = [name for name, _ in response.context["categories"]]
+        self.assertEqual(
+            names[:FACET_LIMIT], [f"Cat {i:02d}" for i in range(11, 1, -1)]
+        )
+        self.assertEqual(names[FACET_LIMIT:], ["Cat 00"])
+        self.assertTrue(response.context["more_categories"])
+        self.assertContains(response, "Cat 11 (12)")
+
+    def test_more_endpoint_returns_remaining_categories(self):
+        response = self.client.get(reverse("events:category_facets"))
+        self.assertEqual(
+            response.json(),
+            {
+                "categories": [
+                    {"name": "Cat 01", "count": 2},
+                    {"name": "Cat 00", "count": 1},
+                ],
+                "next_offset": None,
+            },
+        )
+
+    def test_counts_are_cached_until_categories_change(self):
+        self.client.get(reverse("events:view_events"))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("events:view_events"))
+        self.assertFalse(any("COUNT(DISTINCT" in q["sql"] for q in queries))
+
+        EventCategory.objects.filter(cat=self.categories[11]).delete()
+        response = self.client.get(reverse("events:view_events"))
+        self.assertEqual(response.context["categories"][0], ("Cat 10", 11))
+
+
+class CategoryFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.host)
+        music = Category.objects.create(name="Music")
+        food = Category.objects.create(name="Food")
+        for title, cats in [
+            ("Gig", [music]),
+            ("Feast", [food]),
+            ("Festival", [music, food]),
+            ("Lecture", []),
+        ]:
+            event = Event.objects.create(
+                host=self.host,
+                title=title,
+                description="Desc",
+                start_time=timezone.now() + timezone.timedelta(days=1),
+                end_time=timezone.now() + timezone.timedelta(days=2),
+            )
+            for cat in cats:
+                EventCategory.objects.create(event=event, cat=cat)
+
+    def titles(self, mode):
+        events = filter_by_categories(
+            Event.objects.order_by("title"), ["Food", "Music"], mode
+        )
+        return [event.title for event in events]
+
+    def test_any_and_all_modes(self):
+        self.assertEqual(self.titles("any"), ["Feast", "Festival", "Gig"])
+        self.assertEqual(self.titles("all"), ["Festival"])
+
+    def test_uses_semijoin_without_distinct(self):
+        events = filter_by_categories(Event.objects.all(), ["Food", "Music"])
+        sql = str(events.query)
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn("DISTINCT", sql)
+
+    def test_view_category_mode(self):
+        response = self.client.get(
+            reverse("events:view_events"),
+            {"category": ["Music", "Food"], "category_mode": "all"},
+        )
+        self.assertEqual(
+            [event.title for event in response.context["events"]],
+            ["Festival"],
+        )
+
+    def test_event_category_pairs_are_unique(self):
+        event = Event.objects.get(title="Gig")
+        with self.assertRaises(IntegrityError):
+            EventCategory.objects.create(
+                event=event, cat=Category.objects.get(name="Music")
+            )
+
+
+class EventDetailQueryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f"user{i}",
+                email=f"user{i}@example.com",
+                password="pass12345",
+            )
+            for i in range(4)
+        ]
+        self.event = Event.objects.create(
+            host=self.host,
+            title="Test event",
+            description="Desc",
+            start_time=timezone.now() + timezone.timedelta(days=1),
+            end_time=timezone.now() + timezone.timedelta(days=2),
+            location=Location.objects.create(
+                formatted_address="1 Main St", lat=51.5, long=-0.1
+            ),
+            capacity=2,
+        )
+        for name in ["Music", "Food"]:
+            EventCategory.objects.create(
+                event=self.event, cat=Category.objects.create(name=name)
+            )
+        for user, status in zip(
+            self.users, ["going", "going", "waitlist"], strict=False
+        ):
+            EventAttendee.objects.create(
+                event=self.event, user=user, status=status
+            )
+        self.url = reverse(
+            "events:view_event", kwargs={"event_id": self.event.pk}
+        )
+
+    def get(self, user, queries):
+        self.client.force_login(user)
+        # +2 for the session and user lookups
+        with self.assertNumQueries(queries + 2):
+            return self.client.get(self.url)
+
+    def test_visitor_page_budget(self):
+        response = self.get(self.users[3], 2)
+        self.assertContains(response, "Music, Food")
+        self.assertContains(response, "user0")
+        # waitlisted attendees aren't listed
+        self.assertNotContains(response, "user2")
+        self.assertContains(response, "Join Event")
+
+    def test_attendee_page_budget(self):
+        response = self.get(self.users[0], 2)
+        self.assertContains(response, "Leave Event")
+        self.assertContains(response, "Open Event Chat")
+
+    def test_host_page_budget(self):
+        response = self.get(self.host, 1)
+        self.assertContains(response, "Loading attendees")
+        self.assertNotContains(response, "user0")
+
+    def test_host_panel_loads_separately(self):
+        url = reverse(
+            "events:event_attendees", kwargs={"event_id": self.event.pk}
+        )
+        self.client.force_login(self.host)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, "user0")
+        self.assertContains(response, "Waitlist (up to 5 oldest)")
+
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.host)
+        self.location = Location.objects.create(
+            formatted_address="1 Main St", lat=51.5, long=-0.1
+        )
+        self.event = Event.objects.create(
+            host=self.host,
+            title="Test event",
+            description="Desc",
+            start_time=timezone.now() + timezone.timedelta(days=1),
+            end_time=timezone.now() + timezone.timedelta(days=2),
+            location=self.location,
+        )
+        self.category = Category.objects.create(name="Music")
+        EventCategory.objects.create(event=self.event, cat=self.category)
+
+    def cards(self):
+        return render_event_cards(
+            Event.objects.select_related("location", "host")
+            .prefetch_related("event_categories__cat")
+            .filter(pk=self.event.pk)
+        )
+
+    def test_cards_are_rendered_once(self):
+        [(_, html)] = self.cards()
+        self.assertIn("Music", html)
+        with mock.patch("events.fragments.render_to_string") as render:
+            [(_, cached)] = self.cards()
+        render.assert_not_called()
+        self.assertEqual(cached, html)
+
+    def test_cards_change_with_event_location_and_categories(self):
+        self.cards()
+        self.event.title = "Renamed"
+        self.event.save()
+        self.assertIn("Renamed", self.cards()[0][1])
+
+        self.location.formatted_address = "2 High St"
+        self.location.save()
+        self.assertIn("2 High St", self.cards()[0][1])
+
+        self.category.name = "Jazz"
+        self.category.save()
+        self.assertIn("Jazz", self.cards()[0][1])
+
+    def test_list_page_keeps_live_values_outside_the_card(self):
+        self.client.get(reverse("events:view_events"))
+        EventAttendee.objects.create(
+            event=self.event, user=self.host, status="going"
+        )
+        response = self.client.get(reverse("events:view_events"))
+        self.assertContains(response, "<strong>Attendees:</strong> 1<")
+
+    def test_detail_header_is_cached(self):
+        url = reverse("events:view_event", kwargs={"event_id": self.event.pk})
+        self.assertContains(self.client.get(url), "Music")
+        with mock.patch("events.fragments.render_to_string") as render:
+            response = self.client.get(url)
+        render.assert_not_called()
+        self.assertContains(response, "1 Main St")
+
+
+class EventsApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.host)
+        start = timezone.now() + timezone.timedelta(days=1)
+        self.events = [
+            Event.objects.create(
+                host=self.host,
+                title=title,
+                description="Desc",
+                start_time=start + timezone.timedelta(hours=i),
+                end_time=start + timezone.timedelta(days=1),
+                location=Location.objects.create(
+                    formatted_address=f"{i} Main St", lat=51.5, long=-0.1
+                ),
+            )
+            for i, title in enumerate(["Jazz night", "Chess club"])
+        ]
+        EventCategory.objects.create(
+            event=self.events[0], cat=Category.objects.create(name="Music")
+        )
+        self.url = reverse("events:events_api")
+
+    def get(self, params=None, **headers):
+        response = self.client.get(self.url, params or {}, headers=headers)
+        if response.streaming:
+            response.json_body = json.loads(
+                b"".join(response.streaming_content)
+            )
+        return response
+
+    def test_lists_filtered_events_with_default_fields(self):
+        response = self.get({"q": "jazz"})
+        self.assertEqual(response["Content-Type"], "application/json")
+        [event] = response.json_body["events"]
+        self.assertEqual(set(event), set(DEFAULT_API_FIELDS))
+        self.assertEqual(event["title"], "Jazz night")
+
+    def test_fields_projection_selects_only_those_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get({"fields": "id,title,categories"})
+        self.assertEqual(
+            response.json_body["events"],
+            [
+                {
+                    "id": self.events[0].pk,
+                    "title": "Jazz night",
+                    "categories": ["Music"],
+                },
+                {
+                    "id": self.events[1].pk,
+                    "title": "Chess club",
+                    "categories": [],
+                },
+            ],
+        )
+        [select] = [
+            q["sql"]
+            for q in queries
+            if "LIMIT 1000" in q["sql"] and '"title"' in q["sql"]
+        ]
+        self.assertNotIn('"description"', select)
+        self.assertNotIn("events_location", select)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.get({"fields": "title,password"})
+        self.assertEqual(response.status_code, 400)
+        # distance only exists for near-me searches
+        response = self.get({"fields": "distance_km"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_results_get_304_without_fetching_rows(self):
+        response = self.get()
+        etag = response["ETag"]
+        self.assertFalse(response.has_header("Last-Modified"))
+        # session, user and the narrow ETag query
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                self.url, headers={"if-none-match": etag}
+            )
+        self.assertEqual(response.status_code, 304)
+
+        self.events[1].title = "Chess championship"
+        self.events[1].save()
+        response = self.get(**{"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_tracks_counters_and_deletes(self):
+        etag = self.get()["ETag"]
+        EventAttendee.objects.create(
+            event=self.events[0], user=self.host, status="going"
+        )
+        new_etag = self.get()["ETag"]
+        self.assertNotEqual(new_etag, etag)
+
+        self.events[1].delete()
+        self.assertNotEqual(self.get()["ETag"], new_etag)
+
+    def test_if_modified_since_alone_never_gets_304(self):
+        since = http_date(time.time() + 60)
+        self.assertEqual(
+            self.get(**{"if-modified-since": since}).status_code, 200
+        )
+        # neither change moves any remaining event's updated_at
+        EventAttendee.objects.create(
+            event=self.events[0], user=self.host, status="going"
+        )
+        self.events[1].delete()
+        response = self.get(**{"if-modified-since": since})
+        self.assertEqual(response.status_code, 200)
+        [event] = response.json_body["events"]
+        self.assertEqual(event["going_count"], 1)
+
+    def test_etag_tracks_offsetting_counter_moves(self):
+        guest = get_user_model().objects.create_user(
+            username="guest", email="guest@example.com", password="pass12345"
+        )
+        leaving = EventAttendee.objects.create(
+            event=self.events[0], user=guest, status="going"
+        )
+        etag = self.get()["ETag"]
+        # one event loses an attendee as the other gains one
+        leaving.delete()
+        EventAttendee.objects.create(
+            event=self.events[1], user=guest, status="going"
+        )
+        response = self.get(**{"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [event["going_count"] for event in response.json_body["events"]],
+            [0, 1],
+        )
+
+    async def test_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.host)
+        response = await self.async_client.get(self.url, {"fields": "id"})
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response])
+        self.assertEqual(
+            json.loads(body)["events"],
+            [{"id": event.pk} for event in self.events],
+        )
+
+    def test_etag_depends_on_fields(self):
+        self.assertNotEqual(
+            self.get({"fields": "id"})["ETag"],
+            self.get({"fields": "id,title"})["ETag"],
+        )
+
+
+class MapViewportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.host)
+        points = [(51.5 + i * 0.001, -0.12) for i in range(10)]
+        points += [(48.85, 2.35 + i * 0.001) for i in range(3)]
+        start = timezone.now() + timezone.timedelta(days=1)
+        for i, (lat, lng) in enumerate(points):
+            Event.objects.create(
+                host=self.host,
+                title=f"Event {i:02d}",
+                description="Desc",
+                start_time=start,
+                end_time=start + timezone.timedelta(days=1),
+                location=Location.objects.create(
+                    formatted_address="Somewhere", lat=lat, long=lng
+                ),
+            )
+        self.url = reverse("events:map_events")
+        self.europe = {"south": 35, "west": -15, "north": 60, "east": 20}
+
+    def test_clusters_dense_areas(self):
+        response = self.client.get(self.url, {**self.europe, "zoom": 5})
+        data = response.json()
+        self.assertEqual(data["events"], [])
+        counts = sorted(cluster["count"] for cluster in data["clusters"])
+        self.assertEqual(counts, [3, 10])
+        london = max(data["clusters"], key=lambda c: c["count"])
+        self.assertAlmostEqual(london["lat"], 51.5045, places=3)
+
+    def test_lists_events_when_zoomed_in(self):
+        response = self.client.get(
+            self.url,
+            {
+                "south": 51.499,
+                "west": -0.125,
+                "north": 51.503,
+                "east": -0.115,
+                "zoom": EVENTS_ZOOM,
+            },
+        )
+        data = response.json()
+        self.assertEqual(data["clusters"], [])
+        # whole tiles are returned, so neighbours just outside the
+        # viewport come too, but not Paris
+        titles = {event["title"] for event in data["events"]}
+        self.assertLessEqual(
+            {"Event 00", "Event 01", "Event 02", "Event 03"}, titles
+        )
+        self.assertNotIn("Event 10", titles)
+
+    def test_filters_apply(self):
+        response = self.client.get(
+            self.url, {**self.europe, "zoom": 5, "q": "Event 12"}
+        )
+        [cluster] = response.json()["clusters"]
+        self.assertEqual(cluster["count"], 1)
+
+    def test_panning_builds_only_new_tiles(self):
+        params = {"south": 45, "west": -5, "north": 55, "east": 5, "zoom": 6}
+        self.client.get(self.url, params)
+        with mock.patch(
+            "events.tiles.build_tiles", wraps=build_tiles
+        ) as build:
+            self.client.get(self.url, params)
+            build.assert_not_called()
+            response = self.client.get(
+                self.url, {**params, "west": 0, "east": 10}
+            )
+        [(_, tiles, _)] = [call.args for call in build.call_args_list]
+        already = set(viewport_tiles(45, -5, 55, 5, 6))
+        self.assertTrue(tiles)
+        self.assertFalse(already & set(tiles))
+        # London (-0.12) is now out of view, only Paris remains
+        [paris] = response.json()["clusters"]
+        self.assertEqual(paris["count"], 3)
+
+    def test_viewport_across_antimeridian(self):
+        start = timezone.now() + timezone.timedelta(days=1)
+        for i, lng in enumerate([179.5, -179.5, 0]):
+            Event.objects.create(
+                host=self.host,
+                title=f"Pacific {i}",
+                description="Desc",
+                start_time=start,
+                end_time=start + timezone.timedelta(days=1),
+                location=Location.objects.create(
+                    formatted_address="Somewhere", lat=-17, long=lng
+                ),
+            )
+        response = self.client.get(
+            self.url,
+            {"south": -20, "west": 170, "north": -10, "east": -170, "zoom": 4},
+        )
+        self.assertEqual(response.status_code, 200)
+        counts = [cluster["count"] for cluster in response.json()["clusters"]]
+        self.assertEqual(sum(counts), 2)
+
+    def test_truncated_tiles_are_not_cached(self):
+        params = {
+            "south": 51.499,
+            "west": -0.125,
+            "north": 51.503,
+            "east": -0.115,
+            "zoom": EVENTS_ZOOM,
+        }
+        with mock.patch("events.tiles.MAX_VIEWPORT_EVENTS", 2):
+            data = self.client.get(self.url, params).json()
+            self.assertTrue(data["truncated"])
+            self.assertEqual(len(data["events"]), 2)
+            with mock.patch(
+                "events.tiles.build_tiles", wraps=build_tiles
+            ) as build:
+                self.client.get(self.url, params)
+            build.assert_called_once()
+        data = self.client.get(self.url, params).json()
+        self.assertFalse(data["truncated"])
+        with mock.patch(
+            "events.tiles.build_tiles", wraps=build_tiles
+        ) as build:
+            self.client.get(self.url, params)
+        build.assert_not_called()
+
+    def test_rejects_bad_viewports(self):
+        for params in [
+            {**self.europe},
+            {**self.europe, "zoom": 30},
+            {**self.europe, "zoom": 12},
+            {**self.europe, "south": 70, "zoom": 3},
+            {**self.europe, "east": 200, "zoom": 3},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete.reset()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.host)
+        for city, events in [
+            ("Paris", 3),
+            ("paris ", 1),
+            ("Parma", 2),
+            ("Porto", 5),
+        ]:
+            self.add_events(city, "France", events)
+
+    def add_events(self, city, country, count):
+        location = Location.objects.create(
+            formatted_address=city, city=city, country=country, lat=0, long=0
+        )
+        for i in range(count):
+            Event.objects.create(
+                host=self.host,
+                title=f"{city} {i}",
+                description="Desc",
+                start_time=timezone.now() + timezone.timedelta(days=1),
+                end_time=timezone.now() + timezone.timedelta(days=2),
+                location=location,
+            )
+
+    def test_prefix_index_ranks_by_popularity(self):
+        index = PrefixIndex({"Paris": 3, "paris": 1, "Parma": 5, "Porto": 9})
+        self.assertEqual(index.search("par"), ["Parma", "Paris"])
+        self.assertEqual(index.search("P", limit=1), ["Porto"])
+        self.assertEqual(index.search(""), [])
+        # spellings of one value merge their popularity
+        index.set("PARIS", 2)
+        self.assertEqual(index.search("par"), ["Paris", "Parma"])
+        index.set("Parma", 0)
+        self.assertEqual(index.search("parm"), [])
+
+    def test_broad_prefixes_use_top_lists(self):
+        with mock.patch.object(PrefixIndex, "SCAN_LIMIT", 2):
+            index = PrefixIndex({"Paris": 3, "Parma": 5, "Porto": 9})
+            self.assertEqual(index.search("p", limit=2), ["Porto", "Parma"])
+            index.set("Pisa", 7)
+            self.assertEqual(index.search("p", limit=2), ["Porto", "Pisa"])
+            index.set("Porto", 0)
+            self.assertEqual(index.search("p", limit=2), ["Pisa", "Parma"])
+            index.set("Pisa", 1)
+            self.assertEqual(index.search("p"), ["Parma", "Paris", "Pisa"])
+
+    def test_lookups_are_fast(self):
+        index = PrefixIndex({f"City {i:05d}": i for i in range(50_000)})
+        started = time.perf_counter()
+        for i in range(1000):
+            index.search(["c", "city 1", "city 12", "city 123"][i % 4])
+        per_lookup = (time.perf_counter() - started) / 1000
+        self.assertLess(per_lookup, 0.001)
+
+    def test_endpoint_suggests_cities_and_categories(self):
+        url = reverse("events:autocomplete", kwargs={"kind": "city"})
+        response = self.client.get(url, {"q": "pa"})
+        self.assertEqual(response.json(), {"results": ["Paris", "Parma"]})
+
+        event = Event.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ["Jazz", "Java"]:
+                EventCategory.objects.create(
+                    event=event, cat=Category.objects.create(name=name)
+                )
+        url = reverse("events:autocomplete", kwargs={"kind": "category"})
+        self.assertEqual(
+            self.client.get(url, {"q": "ja"}).json()["results"],
+            ["Java", "Jazz"],
+        )
+
+        url = reverse("events:autocomplete", kwargs={"kind": "password"})
+        self.assertEqual(self.client.get(url, {"q": "a"}).status_code, 404)
+
+    def test_index_updates_incrementally_on_write(self):
+        self.assertEqual(suggest("city", "p"), ["Porto", "Paris", "Parma"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_events("Parma", "Italy", 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest("city", "p"), ["Parma", "Porto", "Paris"])
+            self.assertEqual(suggest("country", "i"), ["Italy"])
+
+    def test_other_processes_apply_changes_without_rebuilding(self):
+        self.assertEqual(suggest("city", "p"), ["Porto", "Paris", "Parma"])
+        # another process's write, which this one hasn't seen
+        with (
+            mock.patch.dict(autocomplete._indexes, clear=True),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            self.add_events("Parma", "Italy", 4)
+        self.assertEqual(suggest("city", "p"), ["Porto", "Paris", "Parma"])
+
+        with (
+            mock.patch.object(autocomplete, "VERSION_CHECK_INTERVAL", -1),
+            mock.patch.object(
+                autocomplete, "_rebuild", side_effect=AssertionError
+            ),
+        ):
+            self.assertEqual(suggest("city", "p"), ["Parma", "Porto", "Paris"])
+            self.assertEqual(suggest("country", "i"), ["Italy"])
+
+    def test_lost_delta_rebuilds_only_its_kind(self):
+        suggest("city", "p")
+        cache.incr(autocomplete.VERSION_KEY.format(kind="city"))
+        with (
+            mock.patch.object(autocomplete, "VERSION_CHECK_INTERVAL", -1),
+            mock.patch.object(
+                autocomplete, "_rebuild", wraps=autocomplete._rebuild
+            ) as rebuild,
+        ):
+            # the first check waits for the delta to be stored
+            suggest("city", "p")
+            rebuild.assert_not_called()
+            suggest("city", "p")
+            rebuild.assert_called_once_with(["city"])
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            username="fan", email="fan@example.com", password="pass12345"
+        )
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.client.force_login(self.user)
+        self.paris = Location.objects.create(
+            formatted_address="Paris", city="Paris", lat=48.86, long=2.35
+        )
+        self.tokyo = Location.objects.create(
+            formatted_address="Tokyo", city="Tokyo", lat=35.68, long=139.69
+        )
+        # the fan has been to a jazz night in Paris; jazz and blues were
+        # on the bill together elsewhere
+        past = self.make_event("Jazz night", ["Jazz"], self.paris, days=-3)
+        EventAttendee.objects.create(
+            event=past, user=self.user, status="going"
+        )
+        self.make_event("Jazz & blues", ["Jazz", "Blues"], self.tokyo, -5)
+
+    def make_event(self, title, categories, location, days=3, host=None):
+        start = timezone.now() + timezone.timedelta(days=days)
+        event = Event.objects.create(
+            host=host or self.host,
+            title=title,
+            description="Desc",
+            start_time=start,
+            end_time=start + timezone.timedelta(hours=2),
+            location=location,
+        )
+        for name in categories:
+            category, _ = Category.objects.get_or_create(name=name)
+            EventCategory.objects.create(event=event, cat=category)
+        return event
+
+    def recommended(self):
+        return list(
+            Recommendation.objects.filter(user=self.user)
+            .order_by("rank")
+            .values_list("event__title", flat=True)
+        )
+
+    def test_ranks_by_category_and_proximity(self):
+        self.make_event("Jazz in Paris", ["Jazz"], self.paris)
+        self.make_event("Jazz in Tokyo", ["Jazz"], self.tokyo)
+        self.make_event("Blues in Paris", ["Blues"], self.paris)
+        self.make_event("Cooking in Tokyo", ["Cooking"], self.tokyo)
+        self.assertEqual(compute_recommendations(), 1)
+        recommended = self.recommended()
+        self.assertEqual(recommended[0], "Jazz in Paris")
+        self.assertCountEqual(
+            recommended[1:], ["Jazz in Tokyo", "Blues in Paris"]
+        )
+
+    def test_learns_from_archived_attendance(self):
+        self.make_event("Jazz in Paris", ["Jazz"], self.paris)
+        self.make_event("Cooking in Tokyo", ["Cooking"], self.tokyo)
+        # the jazz night the fan went to is no longer a live event
+        self.assertEqual(archive_events(timezone.now()), 2)
+        self.assertFalse(EventAttendee.objects.filter(user=self.user))
+        self.assertEqual(compute_recommendations(), 1)
+        self.assertEqual(self.recommended()[0], "Jazz in Paris")
+
+    def test_skips_joined_and_hosted_events(self):
+        joined = self.make_event("Joined jazz", ["Jazz"], self.paris)
+        EventAttendee.objects.create(
+            event=joined, user=self.user, status="going"
+        )
+        self.make_event("Own jazz", ["Jazz"], self.paris, host=self.user)
+        self.make_event("Other jazz", ["Jazz"], self.paris)
+        compute_recommendations()
+        self.assertEqual(self.recommended(), ["Other jazz"])
+
+    def test_skips_events_replied_to_in_any_status(self):
+        for status in ("waitlist", "not_going"):
+            event = self.make_event(f"Jazz ({status})", ["Jazz"], self.paris)
+            EventAttendee.objects.create(
+                event=event, user=self.user, status=status
+            )
+        self.make_event("Other jazz", ["Jazz"], self.paris)
+        compute_recommendations()
+        self.assertEqual(self.recommended(), ["Other jazz"])
+
+    def test_rerun_replaces_rows(self):
+        self.make_event("Jazz in Paris", ["Jazz"], self.paris)
+        compute_recommendations(batch_size=1)
+        Event.objects.filter(title="Jazz in Paris").update(
+            start_time=timezone.now() - timezone.timedelta(days=1)
+        )
+        self.make_event("More jazz", ["Jazz"], self.paris)
+        compute_recommendations(batch_size=1)
+        self.assertEqual(self.recommended(), ["More jazz"])
+
+        EventAttendee.objects.filter(user=self.user).delete()
+        compute_recommendations()
+        self.assertEqual(self.recommended(), [])
+
+    def test_top_k_orders_best_first(self):
+        scores = numpy.array([[0.1, 0.9, -numpy.inf, 0.5]])
+        indices, best = top_k(scores, 2)
+        self.assertEqual(indices.tolist(), [[1, 3]])
+        self.assertEqual(best.tolist(), [[0.9, 0.5]])
+
+    def test_dashboard_reads_recommendations_in_one_query(self):
+        self.make_event("Jazz in Paris", ["Jazz"], self.paris)
+        self.make_event("Jazz in Tokyo", ["Jazz"], self.tokyo)
+        compute_recommendations()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("dashboard"))
+        self.assertContains(response, "Recommended for You")
+        self.assertContains(response, "Jazz in Paris")
+        reads = [
+            query
+            for query in queries
+            if "events_recommendation" in query["sql"]
+        ]
+        self.assertEqual(len(reads), 1)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.host = User.objects.create_user(
+            username="host", email="host@example.com", password="pass12345"
+        )
+        self.fan = User.objects.create_user(
+            username="fan", email="fan@example.com", password="pass12345"
+        )
+        self.client.force_login(self.fan)
+        self.old = self.make_event("Old jazz night", days=-60)
+        EventCategory.objects.create(
+            event=self.old, cat=Category.objects.create(name="Jazz")
+        )
+        EventAttendee.objects.create(
+            event=self.old, user=self.fan, status="going"
+        )
+        self.message = ChatMessage.objects.create(
+            event=self.old, user=self.fan, content="See you there"
+        )
+        self.recent = self.make_event("Last night", days=-1)
+        self.upcoming = self.make_event("Next week", days=7)
+
+    def make_event(self, title, days):
+        start = timezone.now() + timezone.timedelta(days=days)
+        return Event.objects.create(
+            host=self.host,
+            title=title,
+            description="Desc",
+            start_time=start,
+            end_time=start + timezone.timedelta(hours=3),
+        )
+
+    def archive(self):
+        return archive_events(
+            timezone.now() - timezone.timedelta(days=30), batch_size=1
+        )
+
+    def test_moves_event_with_its_rows(self):
+        self.assertEqual(self.archive(), 1)
+        self.assertFalse(Event.objects.filter(pk=self.old.pk).exists())
+        self.assertFalse(EventAttendee.objects.filter(user=self.fan).exists())
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertEqual(
+            set(Event.objects.values_list("title", flat=True)),
+            {"Last night", "Next week"},
+        )
+
+        archived = ArchivedEvent.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.title, "Old jazz night")
+        self.assertEqual(archived.going_count, 1)
+        self.assertEqual(archived.created_at, self.old.created_at)
+        self.assertEqual(
+            list(archived.event_categories.values_list("cat__name")),
+            [("Jazz",)],
+        )
+        self.assertTrue(
+            ArchivedEventAttendee.objects.filter(
+                event=archived, user=self.fan, status="going"
+            ).exists()
+        )
+        message = ArchivedChatMessage.objects.get()
+        self.assertEqual(message.pk, self.message.pk)
+        self.assertEqual(message.content, "See you there")
+        # nothing left to move
+        self.assertEqual(self.archive(), 0)
+
+    def test_copies_in_chunks_and_deletes_children_directly(self):
+        for i in range(4):
+            ChatMessage.objects.create(
+                event=self.old, user=self.fan, content=f"Message {i}"
+            )
+        with (
+            mock.patch("events.archive.COPY_CHUNK_SIZE", 2),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            self.archive()
+        sql = [q["sql"] for q in queries]
+        inserts = [
+            q for q in sql if q.startswith('INSERT INTO "chat_archived')
+        ]
+        self.assertEqual(len(inserts), 3)
+        # read once for the copy, never loaded for the delete
+        reads = [
+            q
+            for q in sql
+            if q.startswith("SELECT") and 'FROM "chat_chatmessage"' in q
+        ]
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(ArchivedChatMessage.objects.count(), 5)
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertEqual(ArchivedEvent.objects.get().going_count, 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("archive_events", "--dry-run", stdout=out)
+        self.assertIn("Would archive 1 events.", out.getvalue())
+        self.assertTrue(Event.objects.filter(pk=self.old.pk).exists())
+        call_command("archive_events", "--days", "0", stdout=out)
+        self.assertIn("Archived 2 events.", out.getvalue())
+        self.assertEqual(ArchivedEvent.objects.count(), 2)
+
+    def test_event_list_searches_archive_only_when_asked(self):
+        self.archive()
+        url = reverse("events:view_events")
+        response = self.client.get(url, {"category": "Jazz"})
+        self.assertNotContains(response, "Old jazz night")
+        self.assertNotContains(response, "Past Events")
+
+        response = self.client.get(url, {"category": "Jazz", "past": "1"})
+        self.assertContains(response, "Past Events")
+        self.assertContains(response, "Old jazz night")
+        response = self.client.get(url, {"category": "Rock", "past": "1"})
+        self.assertContains(response, "No past events found.")
+
+    def test_archived_event_page(self):
+        self.archive()
+        response = self.client.get(
+            reverse("events:view_event", args=[self.old.pk])
+        )
+        self.assertContains(response, "Old jazz night")
+        self.assertContains(response, "archived")
+        self.assertContains(response, reverse("chat:room", args=[self.old.pk]))
+        response = self.client.get(reverse("events:view_event", args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_dashboard_lists_past_events_when_asked(self):
+        self.archive()
+        response = self.client.get(reverse("dashboard"))
+        self.assertNotContains(response, "Old jazz night")
+        response = self.client.get(reverse("dashboard"), {"past": "1"})
+        self.assertContains(response, "Old jazz night")
+
+
+class ImportEventsTests(TestCase):
+    HEADER = (
+        "title,description,start_time,end_time,capacity,categories,"
+        "formatted_address,lat,long,city,country\n"
+    )
+
+    def setUp(self):
+        self.host = get_user_model().objects.create_user(
+            username="partner", email="p@example.com", password="pass12345"
+        )
+        start = timezone.now() + timezone.timedelta(days=3)
+        self.start = start.strftime("%Y-%m-%d %H:%M")
+        self.end = (start + timezone.timedelta(hours=2)).strftime(
+            "%Y-%m-%d %H:%M"
+        )
+
+    def csv_row(self, title, start=None, categories="Jazz, Blues"):
+        return (
+            f'{title},Desc,{start or self.start},{self.end},50,"{categories}",'
+            "1 Rue X,48.86,2.35,Paris,France\n"
+        )
+
+    def write_csv(self, content):
+        path = Path(self.enterContext(TemporaryDirectory())) / "feed.csv"
+        path.write_text(content)
+        return str(path)
+
+    def test_imports_csv_and_reports_rejects(self):
+        Category.objects.create(name="Jazz")
+        before = Location.objects.create(
+            formatted_address="1 Rue X", lat=48.86, long=2.35
+        )
+        past = (timezone.now() - timezone.timedelta(days=1)).strftime(
+            "%Y-%m-%d %H:%M"
+        )
+        path = self.write_csv(
+            self.HEADER
+            + self.csv_row("First")
+            + self.csv_row("Second", categories="Blues")
+            + self.csv_row("Too late", start=past)
+            + "Online one,Desc,"
+            + f"{self.start},{self.end},5,,,,,,\n"
+        )
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "import_events",
+                path,
+                "--host",
+                "partner",
+                stdout=out,
+                stderr=err,
+            )
+        self.assertIn("Imported 3 events, rejected 1 rows", out.getvalue())
+        self.assertIn(
+            "line 4: start_time: Start time cannot be in the past",
+            err.getvalue(),
+        )
+
+        first, second, online = Event.objects.order_by("pk")
+        self.assertEqual(first.location, before)
+        self.assertEqual(second.location, before)
+        self.assertEqual(online.location.formatted_address, "Online")
+        self.assertTrue(online.location.geohash)
+        self.assertEqual(Category.objects.filter(name="Jazz").count(), 1)
+        self.assertEqual(Category.objects.filter(name="Blues").count(), 1)
+        self.assertEqual(
+            sorted(first.event_categories.values_list("cat__name", flat=True)),
+            ["Blues", "Jazz"],
+        )
+        self.assertEqual(first.going_count, 1)
+        self.assertTrue(
+            EventAttendee.objects.filter(
+                event=online, user=self.host, status="going"
+            ).exists()
+        )
+
+    def test_queries_do_not_grow_with_rows(self):
+        def run(count):
+            rows = "".join(
+                json.dumps(
+                    {
+                        "title": f"Event {i}",
+                        "description": "Desc",
+                        "start_time": self.start,
+                        "end_time": self.end,
+                        "capacity": 10,
+                        "categories": [f"Cat {count}-{i % 3}"],
+                        "formatted_address": f"Street {count}-{i % 5}",
+                        "lat": i % 5,
+                        "long": 1,
+                    }
+                )
+                + "\n"
+                for i in range(count)
+            )
+            importer = EventImporter(self.host)
+            with CaptureQueriesContext(connection) as queries:
+                importer.run(read_rows(StringIO(rows), "jsonl"))
+            self.assertEqual(importer.imported, count)
+            return len(queries)
+
+        self.assertEqual(run(10), run(200))
+        self.assertEqual(Location.objects.count(), 10)
+        self.assertEqual(EventCategory.objects.count(), 210)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write_csv(self.HEADER + self.csv_row("First"))
+        out = StringIO()
+        call_command(
+            "import_events",
+            path,
+            "--host",
+            "partner",
+            "--dry-run",
+            stdout=out,
+        )
+        self.assertIn("Validated 1 events", out.getvalue())
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(Location.objects.exists())
+
+    def test_rejects_bad_input(self):
+        importer = EventImporter(self.host)
+        rows = "{not json\n[1]\n" + json.dumps({"title": "No dates"})
+        importer.run(read_rows(StringIO(rows), "jsonl"))
+        self.assertEqual(importer.imported, 0)
+        self.assertEqual(
+            [number for number, _ in importer.rejected], [1, 2, 3]
+        )
+
+
+class SeedAndBenchmarkTests(TestCase):
+    SIZES = {
+        "users": 20,
+        "locations": 10,
+        "events": 40,
+        "categories": 5,
+        "attendees": 150,
+        "messages": 60,
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    def snapshot(self):
+        return (
+            sorted(Event.objects.values_list("title", "capacity")),
+            sorted(
+                EventAttendee.objects.values_list(
+                    "event__title", "user__username", "status"
+                )
+            ),
+            sorted(ChatMessage.objects.values_list("event__title", "content")),
+        )
+
+    def test_seed_is_reproducible_and_consistent(self):
+        created = seed_events(**self.SIZES, seed=3)
+        self.assertEqual(created["events"], 40)
+        self.assertEqual(created["attendees"], 150)
+        self.assertEqual(created["messages"], 60)
+        self.assertFalse(Location.objects.filter(geohash="").exists())
+        self.assertEqual(
+            reconcile_attendee_counts(Event.objects.all(), dry_run=True), []
+        )
+        first = self.snapshot()
+
+        flush_seed_data()
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(Location.objects.exists())
+        self.assertFalse(Category.objects.exists())
+        seed_events(**self.SIZES, seed=3)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_benchmarks_time_every_view(self):
+        seed_events(**self.SIZES)
+        results = run_benchmarks(busiest_user(), repeat=2)
+        self.assertIn("view_events near", results)
+        self.assertIn("dashboard", results)
+        self.assertIn("chat index", results)
+        for result in results.values():
+            self.assertGreater(result["queries"], 0)
+            self.assertGreaterEqual(result["p95_ms"], result["p50_ms"])
+
+        self.assertEqual(compare(results, results), [])
+        faster = {
+            name: {**result, "p50_ms": result["p50_ms"] / 10}
+            for name, result in results.items()
+        }
+        self.assertEqual(len(compare(results, faster)), len(results))
+        fewer = {"dashboard": {**results["dashboard"], "queries": 1}}
+        self.assertEqual(
+            compare(results, fewer, tolerance=1000),
+            [f"dashboard: {results['dashboard']['queries']} queries, was 1"],
+        )
+
+    def test_command_saves_and_compares_baselines(self):
+        seed_events(**self.SIZES)
+        path = Path(self.enterContext(TemporaryDirectory())) / "base.json"
+        out = StringIO()
+        call_command(
+            "benchmark_views",
+            "--repeat",
+            "1",
+            "--save-baseline",
+            path,
+            stdout=out,
+        )
+        self.assertEqual(json.loads(path.read_text())["dataset"]["events"], 40)
+        call_command(
+            "benchmark_views",
+            "--repeat",
+            "1",
+            "--compare",
+            path,
+            "--tolerance",
+            "1000",
+            stdout=out,
+        )
+        self.assertIn("No regressions.", out.getvalue())
+
+
+@skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+class AttendeeIndexPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = User.objects.bulk_create(
+            User(username=f"user{i}", email=f"user{i}@example.com")
+            for i in range(25)
+        )
+        start = timezone.now() + timezone.timedelta(days=1)
+        cls.events = Event.objects.bulk_create(
+            Event(
+                host=cls.users[0],
+                title=f"Event {i}",
+                description="Desc",
+                start_time=start,
+                end_time=start + timezone.timedelta(days=1),
+            )
+            for i in range(200)
+        )
+        statuses = ["going", "waitlist", "not_going"]
+        EventAttendee.objects.bulk_create(
+            EventAttendee(event=event, user=user, status=statuses[(i + j) % 3])
+            for i, event in enumerate(cls.events)
+            for j, user in enumerate(cls.users)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE events_eventattendee")
+
+    def plan(self, run):
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {queries[-1]['sql']}")
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def test_status_count_uses_composite_index(self):
+        plan = self.plan(
+            EventAttendee.objects.filter(
+                event=self.events[7], status="going"
+            ).count
+        )
+        self.assertIn("attendee_event_status_user_idx", plan)
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_going_check_uses_index(self):
+        plan = self.plan(
+            EventAttendee.objects.filter(
+                event=self.events[7], user=self.users[3], status="going"
+            ).exists
+        )
+        self.assertIn("Index", plan)
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_waitlist_order_uses_partial_index(self):
+        plan = self.plan(
+            lambda: (
+                EventAttendee.objects.filter(
+                    event=self.events[7], status="waitlist"
+                )
+                .order_by("joined_at", "pk")
+                .first()
+            )
+        )
+        self.assertIn("attendee_waitlist_idx", plan)
+        self.assertNotIn("Sort", plan)
@@ -0,0 +1,242 @@
+from math import atan, cos, degrees, floor, log, pi, radians, sinh, tan
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, FloatField, Q, Value
+from django.db.models.functions import (
+    Cos,
+    Floor,
+    Greatest,
+    Least,
+    Ln,
+    Radians,
+    Tan,
+)
+
+from .cache import filters_key
+
+# Web Mercator latitude limit: tiles are square up to here
+MAX_LATITUDE = 85.05112878
+MAX_ZOOM = 20
+# from this zoom on, tiles list individual events instead of clusters
+EVENTS_ZOOM = 15
+# each tile is clustered on a CELLS_PER_TILE x CELLS_PER_TILE grid
+CELL_BITS = 2
+CELLS_PER_TILE = 2**CELL_BITS
+MAX_VIEWPORT_TILES = 64
+MAX_VIEWPORT_EVENTS = 2000
+
+TILE_TTL = 300
+
+
+def mercator(lat, lng):
+    """
+    Project a point to Web Mercator, as fractions of the world in [0, 1]
+    (x grows east, y grows south).
+    """
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = (lng + 180) / 360
+    y = (1 - log(tan(radians(lat)) + 1 / cos(radians(lat))) / pi) / 2
+    return x, y
+
+
+def tile_at(lat, lng, zoom):
+    n = 2**zoom
+    x, y = mercator(lat, lng)
+    return min(floor(x * n), n - 1), min(floor(y * n), n - 1)
+
+
+def parse_viewport(params):
+    """
+    Read `south`, `west`, `north`, `east` and `zoom` from request
+    parameters. `west` is greater than `east` for a viewport crossing
+    the antimeridian. Raises ValueError for missing or out-of-range
+    values.
+    """
+    try:
+        south, west, north, east = (
+            float(params[name]) for name in ("south", "west", "north", "east")
+        )
+        zoom = int(params["zoom"])
+    except KeyError as exc:
+        raise ValueError(f"{exc.args[0]} is required") from exc
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"zoom must be in [0, {MAX_ZOOM}]")
+    if not (
+        -90 <= south <= north <= 90
+        and -180 <= west <= 180
+        and -180 <= east <= 180
+    ):
+        raise ValueError("Invalid viewport bounds.")
+    return south, west, north, east, zoom
+
+
+def viewport_tiles(south, west, north, east, zoom):
+    """
+    Return the (x, y) of every tile at `zoom` overlapping the viewport,
+    taking a viewport across the antimeridian as the two ranges either
+    side of it. Raises ValueError if that is more than
+    MAX_VIEWPORT_TILES.
+    """
+    spans = [(west, east)] if west <= east else [(west, 180), (-180, east)]
+    ranges = []
+    for span_west, span_east in spans:
+        min_x, min_y = tile_at(north, span_west, zoom)
+        max_x, max_y = tile_at(south, span_east, zoom)
+        ranges.append((min_x, max_x, min_y, max_y))
+    count = sum((x2 - x1 + 1) * (y2 - y1 + 1) for x1, x2, y1, y2 in ranges)
+    if count > MAX_VIEWPORT_TILES:
+        raise ValueError("Viewport too large for this zoom level.")
+    # at low zooms both ranges can cover the same tiles
+    return list(
+        dict.fromkeys(
+            (x, y)
+            for min_x, max_x, min_y, max_y in ranges
+            for x in range(min_x, max_x + 1)
+            for y in range(min_y, max_y + 1)
+        )
+    )
+
+
+def tile_bounds(x, y, zoom):
+    """
+    Return (south, west, north, east) of a tile.
+    """
+    n = 2**zoom
+
+    def lat(row):
+        return degrees(atan(sinh(pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360 - 180, lat(y), (x + 1) / n * 360 - 180
+
+
+def cell_expressions(zoom, prefix="location__"):
+    """
+    Database expressions for the clustering grid cell (x, y) of each
+    row's location at `zoom`, matching mercator() in Python.
+    """
+    scale = Value(float(2 ** (zoom + CELL_BITS)))
+    lat = Radians(
+        Greatest(
+            Least(F(f"{prefix}lat"), Value(MAX_LATITUDE)),
+            Value(-MAX_LATITUDE),
+        )
+    )
+    x = (F(f"{prefix}long") + Value(180.0)) / Value(360.0)
+    y = (
+        Value(1.0)
+        - Ln(Tan(lat) + Value(1.0) / Cos(lat), output_field=FloatField())
+        / Value(pi)
+    ) / Value(2.0)
+    return Floor(x * scale), Floor(y * scale)
+
+
+def build_tiles(events, tiles, zoom):
+    """
+    Compute the markers for each of `tiles` from the filtered events, in
+    one query over their combined bounds. Returns ({(x, y): markers},
+    truncated), where `truncated` says the events listed when zoomed in
+    were cut off at MAX_VIEWPORT_EVENTS, so some tiles may lack some.
+    """
+    bounds = [tile_bounds(x, y, zoom) for x, y in tiles]
+    # one longitude range per run of adjacent columns, so tiles either
+    # side of the antimeridian don't span the whole world between them
+    runs = []
+    for x in sorted({x for x, _ in tiles}):
+        if runs and x == runs[-1][1] + 1:
+            runs[-1][1] = x
+        else:
+            runs.append([x, x])
+    n = 2**zoom
+    longitude = Q()
+    for first, last in runs:
+        longitude |= Q(
+            location__long__range=(
+                first / n * 360 - 180,
+                (last + 1) / n * 360 - 180,
+            )
+        )
+    events = events.order_by().filter(
+        longitude,
+        location__lat__range=(
+            min(b[0] for b in bounds),
+            max(b[2] for b in bounds),
+        ),
+    )
+    result = {tile: {"clusters": [], "events": []} for tile in tiles}
+
+    if zoom >= EVENTS_ZOOM:
+        rows = list(
+            events.values(
+                "id", "title", "start_time", "location__lat", "location__long"
+            )[: MAX_VIEWPORT_EVENTS + 1]
+        )
+        truncated = len(rows) > MAX_VIEWPORT_EVENTS
+        for row in rows[:MAX_VIEWPORT_EVENTS]:
+            lat, lng = row["location__lat"], row["location__long"]
+            tile = tile_at(lat, lng, zoom)
+            if tile in result:
+                result[tile]["events"].append(
+                    {
+                        "id": row["id"],
+                        "title": row["title"],
+                        "start_time": row["start_time"].isoformat(),
+                        "lat": lat,
+                        "lng": lng,
+                    }
+                )
+        return result, truncated
+
+    cell_x, cell_y = cell_expressions(zoom)
+    rows = (
+        events.annotate(cell_x=cell_x, cell_y=cell_y)
+        .values("cell_x", "cell_y")
+        .annotate(
+            count=Count("pk"),
+            lat=Avg("location__lat"),
+            lng=Avg("location__long"),
+        )
+    )
+    last = 2**zoom - 1
+    for row in rows:
+        tile = (
+            min(int(row["cell_x"]) >> CELL_BITS, last),
+            min(int(row["cell_y"]) >> CELL_BITS, last),
+        )
+        if tile in result:
+            result[tile]["clusters"].append(
+                {"lat": row["lat"], "lng": row["lng"], "count": row["count"]}
+            )
+    return result, False
+
+
+def viewport_markers(events, filters, tiles, zoom):
+    """
+    Return the clusters (or events, when zoomed in) for the tiles,
+    reusing cached tiles and building only the missing ones.
+
+    `truncated` is set when events had to be left out; the tiles built
+    then aren't cached, as any of them may be incomplete.
+    """
+    # the sort doesn't change what is on the map
+    base = filters_key("tiles", {**filters, "sort": ""})
+    keys = {tile: f"{base}:{zoom}:{tile[0]}:{tile[1]}" for tile in tiles}
+    cached = cache.get_many(keys.values())
+    missing = [tile for tile in tiles if keys[tile] not in cached]
+    truncated = False
+    if missing:
+        built, truncated = build_tiles(events, missing, zoom)
+        fresh = {keys[tile]: markers for tile, markers in built.items()}
+        if not truncated:
+            cache.set_many(fresh, TILE_TTL)
+        cached.update(fresh)
+
+    clusters, listed = [], []
+    for tile in tiles:
+        clusters.extend(cached[keys[tile]]["clusters"])
+        listed.extend(cached[keys[tile]]["events"])
+    return {
+        "zoom": zoom,
+        "clusters": clusters,
+        "events": listed,
+        "truncated": truncated,
+    }
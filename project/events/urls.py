@@ -8,9 +8,23 @@ urlpatterns = [
     path("create/", views.create_event, name="create_event"),
     path("edit/<int:event_id>/", views.edit_event, name="edit_event"),
     path("view/<int:event_id>/", views.view_event, name="view_event"),
+    path(
+        "view/<int:event_id>/attendees/",
+        views.event_attendees,
+        name="event_attendees",
+    ),
     path("join/<int:event_id>/", views.join_event, name="join_event"),
     path("leave/<int:event_id>/", views.leave_event, name="leave_event"),
     path("", views.view_events, name="view_events"),
+    path("nearby/", views.nearby_events, name="nearby_events"),
+    path("categories/", views.category_facets, name="category_facets"),
+    path("api/events/", views.events_api, name="events_api"),
+    path("map/", views.map_events, name="map_events"),
+    path(
+        "autocomplete/<str:kind>/",
+        views.autocomplete,
+        name="autocomplete",
+    ),
     path(
         "<int:event_id>/attendee/change/",
         views.change_attendee_status,
@@ -1,22 +1,52 @@
-from datetime import datetime
-from math import asin, cos, radians, sin, sqrt
-from zoneinfo import ZoneInfo
-
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import Count, Q
-from django.http import HttpResponseForbidden
+from django.db.models import OuterRef, StringAgg, Subquery, Value
+from django.http import (
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.http import require_POST
-
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET, require_POST
+
+from .api import (
+    astream_events,
+    parse_fields,
+    parse_limit,
+    project,
+    results_etag,
+    stream_events,
+)
+from .autocomplete import SOURCES, suggest
+from .cache import (
+    MAX_CACHED_RESULTS,
+    cached_category_facets,
+    cached_event_ids,
+)
+from .facets import FACET_LIMIT, MAX_MORE_FACETS, top_facets
+from .filters import filter_events, parse_filters
 from .forms import BaseEventForm
-from .models import Category, Event, EventAttendee
+from .fragments import render_event_cards, render_event_header
+from .geo import filter_within_radius, parse_point
+from .models import (
+    ArchivedEvent,
+    ArchivedEventCategory,
+    Event,
+    EventAttendee,
+    EventCategory,
+)
+from .pagination import paginate, paginate_cached
+from .tiles import parse_viewport, viewport_markers, viewport_tiles
 
 # Create your views here.
 
+EVENTS_PER_PAGE = 10
+NEARBY_EVENTS_LIMIT = 50
+
 
 @login_required
 def create_event(request):
@@ -75,122 +105,314 @@ def edit_event(request, event_id):
 
 def view_events(request):
     # fetch all events initially
-    events = (
+    base = (
         Event.objects.select_related("location", "host")
         .prefetch_related("event_categories__cat")
-        .annotate(attendee_count=Count("attendees"))
-        .all()
+        .defer("search_vector")
     )
 
     # fetch filter/sort params and apply them
-    query = request.GET.get("q", "")
-    city_filter = request.GET.get("city", "")
-    country_filter = request.GET.get("country", "")
-    category_filters = request.GET.getlist("category")
-    start_date = request.GET.get("start_date", "")
-    end_date = request.GET.get("end_date", "")
-    sort_order = request.GET.get("sort", "date_asc")
-
-    if query:
-        events = events.filter(
-            Q(title__icontains=query)
-            | Q(location__formatted_address__icontains=query)
+    filters = parse_filters(request.GET)
+    events, sort_order = filter_events(base, filters)
+
+    # page out of the cached result ids when the page is covered by them
+    ids = cached_event_ids(filters, events)
+    page_obj = paginate_cached(
+        events,
+        ids[:MAX_CACHED_RESULTS],
+        len(ids) <= MAX_CACHED_RESULTS,
+        request.GET,
+        sort_order,
+        EVENTS_PER_PAGE,
+    )
+    if page_obj is None:
+        page_obj = paginate(events, request.GET, sort_order, EVENTS_PER_PAGE)
+
+    # archived events only when asked for, as a separately paged list
+    past_page = None
+    if filters["past"]:
+        archived, past_sort = filter_events(
+            ArchivedEvent.objects.select_related("location", "host")
+            .prefetch_related("event_categories__cat")
+            .defer("search_vector"),
+            filters,
+        )
+        past_page = paginate(
+            archived,
+            {"page": request.GET.get("past_page")},
+            past_sort,
+            EVENTS_PER_PAGE,
         )
-    if city_filter:
-        events = events.filter(location__city__icontains=city_filter)
-    if country_filter:
-        events = events.filter(location__country__icontains=country_filter)
-    if category_filters:
-        events = events.filter(
-            event_categories__cat__name__in=category_filters
-        ).distinct()
-    if start_date:
-        try:
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d").replace(
-                tzinfo=ZoneInfo(settings.TIME_ZONE)
-            )
-            events = events.filter(start_time__gte=start_dt)
-        except ValueError:
-            pass
-    if end_date:
-        try:
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(
-                tzinfo=ZoneInfo(settings.TIME_ZONE)
-            )
-            events = events.filter(end_time__lte=end_dt)
-        except ValueError:
-            pass
-    if sort_order == "date_desc":
-        events = events.order_by("-start_time")
-    elif sort_order == "title_asc":
-        events = events.order_by("title", "start_time")
-    elif sort_order == "title_desc":
-        events = events.order_by("-title", "start_time")
-    else:
-        events = events.order_by("start_time")
 
-    categories = Category.objects.all()
-    paginator = Paginator(events, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # category counts under every filter except the categories themselves
+    facet_events, _ = filter_events(base, {**filters, "categories": []})
+    facets = cached_category_facets(filters, facet_events)
 
     context = {
         "events": page_obj,
-        "query": query,
-        "city_filter": city_filter,
-        "country_filter": country_filter,
-        "category_filters": category_filters,
-        "start_date": start_date,
-        "end_date": end_date,
-        "categories": categories,
+        "cards": render_event_cards(page_obj),
+        "query": filters["q"],
+        "city_filter": filters["city"],
+        "country_filter": filters["country"],
+        "category_filters": filters["categories"],
+        "category_mode": filters["category_mode"],
+        "start_date": filters["start_date"],
+        "end_date": filters["end_date"],
+        "categories": top_facets(facets, filters["categories"]),
+        "more_categories": len(facets) > FACET_LIMIT,
         "sort_order": sort_order,
-        "paginator": paginator,
+        "near": filters["near"],
         "page_obj": page_obj,
+        "past": filters["past"],
+        "past_page": past_page,
+        "past_cards": render_event_cards(past_page) if past_page else [],
     }
     return render(request, "events/view_events.html", context)
 
 
-def view_event(request, event_id):
-    event = get_object_or_404(
-        Event.objects.select_related("host", "location"), pk=event_id
+@require_GET
+def nearby_events(request):
+    """
+    JSON list of upcoming events within `radius_km` of `lat`/`lng`,
+    nearest first.
+    """
+    try:
+        near = parse_point(request.GET)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    if near is None:
+        return JsonResponse({"error": "lat and lng are required."}, status=400)
+
+    events = (
+        filter_within_radius(
+            Event.objects.filter(end_time__gte=timezone.now()), *near
+        )
+        .order_by("distance_km", "start_time")
+        .values(
+            "id",
+            "title",
+            "start_time",
+            "location__formatted_address",
+            "location__lat",
+            "location__long",
+            "distance_km",
+        )[:NEARBY_EVENTS_LIMIT]
+    )
+    return JsonResponse(
+        {
+            "events": [
+                {
+                    "id": event["id"],
+                    "title": event["title"],
+                    "start_time": event["start_time"],
+                    "address": event["location__formatted_address"],
+                    "lat": event["location__lat"],
+                    "lng": event["location__long"],
+                    "distance_km": round(event["distance_km"], 2),
+                }
+                for event in events
+            ]
+        }
+    )
+
+
+@require_GET
+def category_facets(request):
+    """
+    JSON category counts beyond the ones shown in the filter panel, for
+    the same filters as the event list.
+    """
+    filters = parse_filters(request.GET)
+    events, _ = filter_events(
+        Event.objects.all(), {**filters, "categories": []}
+    )
+    facets = cached_category_facets(filters, events)
+    try:
+        offset = max(int(request.GET.get("offset", FACET_LIMIT)), 0)
+    except ValueError:
+        offset = FACET_LIMIT
+    return JsonResponse(
+        {
+            "categories": [
+                {"name": name, "count": count}
+                for name, count in facets[offset : offset + MAX_MORE_FACETS]
+            ],
+            "next_offset": (
+                offset + MAX_MORE_FACETS
+                if offset + MAX_MORE_FACETS < len(facets)
+                else None
+            ),
+        }
+    )
+
+
+@require_GET
+def events_api(request):
+    """
+    Read-only JSON list of events, taking the same filters as the event
+    list plus `fields` (comma-separated) and `limit`.
+
+    Responses carry an ETag, so unchanged results are answered with a
+    304 before any rows are fetched or serialized. There's no
+    Last-Modified: counter moves, deletes and events leaving a filter
+    change the results without any update time moving forward.
+    """
+    filters = parse_filters(request.GET)
+    try:
+        fields = parse_fields(request.GET, near=bool(filters["near"]))
+        limit = parse_limit(request.GET)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    events, _ = filter_events(Event.objects.all(), filters)
+
+    etag = results_etag(events, fields, [filters, fields, limit], limit)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified.headers["ETag"] = etag
+        return not_modified
+
+    rows = project(events, fields)[:limit]
+    if isinstance(request, ASGIRequest):
+        content = astream_events(rows.aiterator(chunk_size=500), fields)
+    else:
+        content = stream_events(rows.iterator(chunk_size=500), fields)
+    response = StreamingHttpResponse(content, content_type="application/json")
+    response.headers["ETag"] = etag
+    return response
+
+
+@require_GET
+def map_events(request):
+    """
+    JSON markers for the map viewport given by `south`, `west`, `north`,
+    `east` and `zoom`, taking the same filters as the event list.
+
+    Events are clustered on a grid per map tile, and listed one by one
+    only when zoomed in. Tiles are cached, so panning only computes the
+    newly visible ones.
+    """
+    try:
+        *bounds, zoom = parse_viewport(request.GET)
+        tiles = viewport_tiles(*bounds, zoom)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    filters = parse_filters(request.GET)
+    events, _ = filter_events(Event.objects.all(), filters)
+    return JsonResponse(viewport_markers(events, filters, tiles, zoom))
+
+
+@require_GET
+def autocomplete(request, kind):
+    """
+    JSON suggestions for a city, country or category prefix `q`.
+    """
+    if kind not in SOURCES:
+        return JsonResponse({"error": "Unknown kind."}, status=404)
+    return JsonResponse({"results": suggest(kind, request.GET.get("q", ""))})
+
+
+def category_names(event_categories):
+    """
+    Subquery of an event's comma-separated category names.
+    """
+    return Subquery(
+        event_categories.objects.filter(event=OuterRef("pk"))
+        .order_by()
+        .values("event")
+        .annotate(names=StringAgg("cat__name", Value(", ")))
+        .values("names")
     )
 
-    # visitor attendee record (if any)
-    user_attendee = None
+
+def view_event(request, event_id):
+    events = (
+        Event.objects.select_related("host", "location")
+        .defer("search_vector")
+        .annotate(category_names=category_names(EventCategory))
+    )
+    # fold the visitor's own status into the same query
     if request.user.is_authenticated:
-        user_attendee = EventAttendee.objects.filter(
-            event=event, user=request.user
-        ).first()
-
-    # waitlisted users for host (kept as before)
-    waitlisted_users = []
-    attendees_for_host = []
-    if request.user == event.host:
-        qs = EventAttendee.objects.filter(
-            event=event, status="waitlist"
-        ).select_related("user")
-        # order by join timestamp if available, otherwise fallback to pk
-        qs = qs.order_by("joined_at")
-        waitlisted_users = list(qs[:5])
-
-        attendees_for_host = (
-            EventAttendee.objects.filter(event=event)
-            .select_related("user")
-            .order_by("joined_at")
+        events = events.annotate(
+            viewer_status=Subquery(
+                EventAttendee.objects.filter(
+                    event=OuterRef("pk"), user=request.user
+                ).values("status")[:1]
+            )
+        )
+    event = events.filter(pk=event_id).first()
+    if event is None:
+        return view_archived_event(request, event_id)
+
+    # the host's attendee panel is loaded separately (event_attendees)
+    going = []
+    if request.user != event.host and event.going_count:
+        going = (
+            EventAttendee.objects.filter(event=event, status="going")
+            .order_by("joined_at", "pk")
+            .values("user_id", "user__username")
         )
-    going_count = EventAttendee.objects.filter(
-        event=event, status="going"
-    ).count()
 
     return render(
         request,
         "events/view_event.html",
         {
             "event": event,
-            "user_attendee": user_attendee,
+            "header": render_event_header(event),
+            "viewer_status": getattr(event, "viewer_status", None),
+            "going": going,
+            "going_count": event.going_count,
+        },
+    )
+
+
+def view_archived_event(request, event_id):
+    """
+    Read-only page for an event that has been moved to the archive.
+    """
+    event = get_object_or_404(
+        ArchivedEvent.objects.select_related("host", "location")
+        .defer("search_vector")
+        .annotate(category_names=category_names(ArchivedEventCategory)),
+        pk=event_id,
+    )
+    took_part = request.user.is_authenticated and (
+        request.user.pk == event.host_id
+        or event.attendees.filter(user=request.user, status="going").exists()
+    )
+    return render(
+        request,
+        "events/archived_event.html",
+        {
+            "event": event,
+            "header": render_event_header(event),
+            "took_part": took_part,
+        },
+    )
+
+
+@require_GET
+def event_attendees(request, event_id):
+    """
+    Host-only attendee management panel for the event page, fetched on
+    demand so ordinary page views don't load it.
+    """
+    event = get_object_or_404(Event.objects.only("pk", "host"), pk=event_id)
+    if request.user.pk != event.host_id:
+        return HttpResponseForbidden()
+
+    attendees = list(
+        EventAttendee.objects.filter(event=event)
+        .select_related("user")
+        .order_by("joined_at", "pk")
+    )
+    waitlisted_users = [a for a in attendees if a.status == "waitlist"][:5]
+    return render(
+        request,
+        "events/host_attendees.html",
+        {
+            "event": event,
+            "attendees_for_host": attendees,
             "waitlisted_users": waitlisted_users,
-            "attendees_for_host": attendees_for_host,
-            "going_count": going_count,
         },
     )
 
@@ -218,7 +440,16 @@ def change_attendee_status(request, event_id):
         "status"
     )  # support simple forms
     if action == "remove":  # remove attendee record
-        attendee.delete()
+        with transaction.atomic():
+            # re-read under a lock, so the counters move for the status
+            # it has now
+            locked = (
+                EventAttendee.objects.select_for_update()
+                .filter(pk=attendee.pk)
+                .first()
+            )
+            if locked:
+                locked.delete()
         messages.success(
             request, f"Removed {attendee.user.username} from the event."
         )
@@ -230,18 +461,25 @@ def change_attendee_status(request, event_id):
     if desired_status not in allowed:
         messages.error(request, "Invalid status.")
         return redirect("events:view_event", event_id=event.pk)
-    if desired_status == "going":
-        going_count = EventAttendee.objects.filter(
-            event=event, status="going"
-        ).count()
-        if going_count >= event.capacity:
+    with transaction.atomic():
+        locked_event = Event.objects.select_for_update().get(pk=event.pk)
+        # re-read under the lock: the status may have moved since
+        attendee = get_object_or_404(
+            EventAttendee.objects.select_for_update().select_related("user"),
+            pk=attendee.pk,
+        )
+        if (
+            desired_status == "going"
+            and attendee.status != "going"
+            and locked_event.going_count >= locked_event.capacity
+        ):
             messages.error(
                 request,
                 "Cannot set status to 'going': event is at full capacity.",
             )
             return redirect("events:view_event", event_id=event.pk)
-    attendee.status = desired_status
-    attendee.save()
+        attendee.status = desired_status
+        attendee.save()
     messages.success(
         request, f"Set {attendee.user.username} status to {desired_status}."
     )
@@ -275,9 +513,7 @@ def join_event(request, event_id):
 
     with transaction.atomic():  # ensure atomic update to avoid race conditions
         locked_event = Event.objects.select_for_update().get(pk=event.pk)
-        going_count = EventAttendee.objects.filter(
-            event=locked_event, status="going"
-        ).count()
+        going_count = locked_event.going_count
         capacity = getattr(locked_event, "capacity", None)
 
         if capacity is not None and going_count >= capacity:
@@ -315,17 +551,25 @@ def leave_event(request, event_id):
 
     try:
         with transaction.atomic():
+            locked_event = Event.objects.select_for_update().get(pk=event.pk)
             attendee = EventAttendee.objects.select_for_update().get(
                 event=event, user=request.user
             )
             attendee.status = "not_going"
             attendee.save()
-            first_waitlisted = EventAttendee.objects.filter(
-                event=event, status="waitlist"
-            ).first()
-        if first_waitlisted:
-            first_waitlisted.status = "going"
-            first_waitlisted.save()
+            # promote the longest-waiting user if a place opened up
+            locked_event.refresh_from_db(fields=["going_count"])
+            if locked_event.going_count < locked_event.capacity:
+                first_waitlisted = (
+                    EventAttendee.objects.filter(
+                        event=event, status="waitlist"
+                    )
+                    .order_by("joined_at", "pk")
+                    .first()
+                )
+                if first_waitlisted:
+                    first_waitlisted.status = "going"
+                    first_waitlisted.save()
         messages.success(request, "You have left the event")
 
     except EventAttendee.DoesNotExist:
@@ -337,16 +581,3 @@ def leave_event(request, event_id):
         )
 
     return redirect("events:view_event", event_id=event_id)
-
-
-def haversine(
-    lat1, lon1, lat2, lon2
-):  # helper function to calculate distance between two lat/long points
-    R = 6371
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = (
-        sin(dlat / 2) ** 2
-        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    )
-    return R * 2 * asin(sqrt(a))
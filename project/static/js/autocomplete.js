@@ -0,0 +1,43 @@
+// Suggest values for text inputs marked with data-autocomplete="<url>".
+// With data-autocomplete-multiple the input holds a comma-separated list
+// and only the last entry is completed.
+document.querySelectorAll('input[data-autocomplete]').forEach((input) => {
+    const list = document.createElement('datalist');
+    list.id = `${input.name}-suggestions`;
+    input.after(list);
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+
+    const multiple = input.hasAttribute('data-autocomplete-multiple');
+    let timer = null;
+    let controller = null;
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            const parts = multiple ? input.value.split(',') : [input.value];
+            const prefix = parts.pop().trim();
+            const head = parts.map((part) => part.trim()).filter(Boolean);
+            if (!prefix) {
+                list.replaceChildren();
+                return;
+            }
+            if (controller) controller.abort();
+            controller = new AbortController();
+            const url = new URL(input.dataset.autocomplete, window.location);
+            url.searchParams.set('q', prefix);
+            try {
+                const response = await fetch(url, { signal: controller.signal });
+                if (!response.ok) return;
+                const data = await response.json();
+                list.replaceChildren(...data.results.map((value) => {
+                    const option = document.createElement('option');
+                    option.value = [...head, value].join(', ');
+                    return option;
+                }));
+            } catch (error) {
+                if (error.name !== 'AbortError') throw error;
+            }
+        }, 150);
+    });
+});